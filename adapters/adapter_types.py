@@ -1,15 +1,33 @@
-from typing import Protocol, Iterable
-from pydantic import BaseModel
+"""
+Record types exchanged between ERP adapters and the loaders.
+
+Records are plain slotted dataclasses: adapters build them from trusted parser
+output without per-field validation, which is a visible share of the
+per-voucher cost. Pass a record through validated() (adapters do this in
+strict mode) to check and coerce every field with pydantic.
+
+Adapters expose records either one at a time (ERPAdapter) or as columnar
+RecordBatches (BatchERPAdapter) that bulk loaders can COPY directly;
+RowAdapterBatches adapts the former to the latter.
+"""
+import asyncio
+from dataclasses import dataclass, field, fields
+from functools import lru_cache
+from itertools import islice
+from typing import AsyncIterator, Iterator, Protocol, Iterable, TypeVar
+from pydantic import TypeAdapter
 from datetime import date
 
-class Customer(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class Customer:
     customer_id: str
     name: str
     gstin: str | None = None
     city: str | None = None
     pincode: str | None = None
 
-class Item(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class Item:
     item_id: str
     sku: str | None = None
     name: str
@@ -17,14 +35,16 @@ class Item(BaseModel):
     hsn: str | None = None
     uom: str | None = None
 
-class InvoiceLine(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class InvoiceLine:
     item_id: str
     qty: float
     rate: float
     line_total: float
     tax: float | None = None
 
-class Invoice(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class Invoice:
     invoice_id: str
     voucher_key: str
     vchtype: str                 # <-- NEW: store voucher type
@@ -35,13 +55,48 @@ class Invoice(BaseModel):
     tax: float
     total: float
     roundoff: float | None = 0.0
-    lines: list[InvoiceLine]
+    lines: list[InvoiceLine] = field(default_factory=list)
+    # Party master details carried on the voucher, for dim_customer
+    customer_gstin: str | None = None
+    customer_pincode: str | None = None
+    customer_city: str | None = None
+
+@dataclass(slots=True, kw_only=True)
+class VoucherLine:
+    invoice_id: str              # voucher key of the invoice the line belongs to
+    stock_item_name: str
+    billed_qty: str              # as exported, e.g. "2 Nos"
+    rate: str                    # e.g. "25.00/Nos"
+    amount: float
+    discount: float
 
-class Receipt(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class Receipt:
     receipt_key: str
     date: date
     customer_id: str
     amount: float
+    customer_gstin: str | None = None
+    customer_pincode: str | None = None
+    customer_city: str | None = None
+
+R = TypeVar("R")
+
+@lru_cache(maxsize=None)
+def _type_adapter(cls: type) -> TypeAdapter:
+    return TypeAdapter(cls)
+
+def validated(record: R) -> R:
+    """
+    Validate every field of a record (coercing where pydantic would).
+
+    Returns:
+        A new, validated record of the same type
+    Raises:
+        pydantic.ValidationError if a field does not match its type
+    """
+    values = {f.name: getattr(record, f.name) for f in fields(record)}
+    return _type_adapter(type(record)).validate_python(values)
 
 class ERPAdapter(Protocol):
     def fetch_customers(self, since: date | None) -> Iterable[Customer]: ...
@@ -49,3 +104,101 @@ class ERPAdapter(Protocol):
     def fetch_invoices(self, since: date, to: date) -> Iterable[Invoice]: ...
     def fetch_receipts(self, since: date, to: date) -> Iterable[Receipt]: ...
 
+
+
+# -- batch contract -------------------------------------------------------------
+
+DEFAULT_BATCH_SIZE = 5000
+
+@dataclass(frozen=True, slots=True)
+class BatchSchema:
+    """Record type of a batch and the order of its columns."""
+    record_type: type
+    columns: tuple[str, ...]
+
+    @classmethod
+    def for_record(cls, record_type: type, exclude: tuple[str, ...] = ()) -> "BatchSchema":
+        return cls(record_type, tuple(f.name for f in fields(record_type) if f.name not in exclude))
+
+INVOICE_SCHEMA = BatchSchema.for_record(Invoice, exclude=("lines",))
+RECEIPT_SCHEMA = BatchSchema.for_record(Receipt)
+VOUCHER_LINE_SCHEMA = BatchSchema.for_record(VoucherLine)
+SCHEMAS = {s.record_type: s for s in (INVOICE_SCHEMA, RECEIPT_SCHEMA, VOUCHER_LINE_SCHEMA)}
+
+@dataclass(slots=True)
+class RecordBatch:
+    """
+    Records of one type, stored column-wise (every list has len(batch) values).
+
+    watermark is set by incremental adapters: passing it as `since` to the next
+    fetch_batches call resumes after this batch.
+    """
+    schema: BatchSchema
+    columns: dict[str, list]
+    watermark: object | None = None
+
+    @classmethod
+    def from_records(cls, records: list, schema: BatchSchema | None = None) -> "RecordBatch":
+        schema = schema or SCHEMAS[type(records[0])]
+        return cls(schema, {c: [getattr(r, c) for r in records] for c in schema.columns})
+
+    def __len__(self) -> int:
+        return len(self.columns[self.schema.columns[0]]) if self.schema.columns else 0
+
+    def rows(self, columns: Iterable[str] | None = None) -> Iterator[tuple]:
+        """Row tuples over the given columns (default: all, in schema order), e.g. for COPY."""
+        return zip(*(self.columns[c] for c in (columns or self.schema.columns)))
+
+    def records(self) -> Iterator:
+        """Rebuild the records, for per-row consumers."""
+        names = self.schema.columns
+        for row in self.rows():
+            yield self.schema.record_type(**dict(zip(names, row)))
+
+async def batch_records(records: Iterable, batch_size: int = DEFAULT_BATCH_SIZE) -> AsyncIterator[RecordBatch]:
+    """
+    Group a (blocking) record iterator into RecordBatches, one record type per batch.
+
+    The iterator is advanced in a worker thread, so a slow ERP request or parse
+    doesn't block the event loop.
+    """
+    it = iter(records)
+    pending: dict[type, list] = {}
+    while chunk := await asyncio.to_thread(lambda: list(islice(it, batch_size))):
+        for record in chunk:
+            buf = pending.setdefault(type(record), [])
+            buf.append(record)
+            if len(buf) >= batch_size:
+                yield RecordBatch.from_records(buf)
+                pending[type(record)] = []
+    for buf in pending.values():
+        if buf:
+            yield RecordBatch.from_records(buf)
+
+class BatchERPAdapter(Protocol):
+    # True if fetch_batches(since=<watermark>) returns only records changed
+    # after that watermark (batches carry the next one); False for adapters that
+    # refetch whole date windows
+    supports_incremental: bool
+
+    def fetch_batches(
+        self, since: date, to: date, *, batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> AsyncIterator[RecordBatch]: ...
+
+class RowAdapterBatches:
+    """BatchERPAdapter over a per-row ERPAdapter (compatibility shim)."""
+
+    supports_incremental = False
+
+    def __init__(self, adapter: ERPAdapter):
+        self.adapter = adapter
+
+    async def fetch_batches(
+        self, since: date, to: date, *, batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> AsyncIterator[RecordBatch]:
+        # Adapters may implement only some of the row methods
+        for name in ("fetch_invoices", "fetch_receipts"):
+            fetch = getattr(self.adapter, name, None)
+            if fetch is not None:
+                async for batch in batch_records(fetch(since, to), batch_size):
+                    yield batch
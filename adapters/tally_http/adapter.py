@@ -1,9 +1,12 @@
 from __future__ import annotations
 from datetime import date
+from typing import AsyncIterator, Callable, Iterable, Iterator
 from jinja2 import Template
-from adapters.adapter_types import Invoice, Receipt
+from adapters.adapter_types import (
+    DEFAULT_BATCH_SIZE, Invoice, Receipt, RecordBatch, VoucherLine, batch_records, validated,
+)
 from .client import TallyClient
-from .parser import parse_daybook
+from .parser import iter_daybook
 import hashlib
 
 def _render(template_str: str, *, from_date: date, to_date: date, company: str) -> str:
@@ -41,96 +44,164 @@ def _voucher_key(d: dict) -> str:
     hash_suffix = hashlib.sha256(key_data.encode()).hexdigest()[:16]
     return f"{d.get('vchtype','')}/{d.get('date','')}/{d.get('party','')}#{hash_suffix}"
 
+def invoice_from_voucher(d: dict, strict: bool = False) -> Invoice:
+    """
+    Build an Invoice (sign-normalized amounts, customer details attached) from a parse_daybook() dict.
+
+    The parser output is trusted; strict=True validates every field as well.
+    """
+    # Extract subtotal (pre-tax) and total (post-tax) with natural signs from Tally
+    subtotal = float(d.get("subtotal") or 0.0)
+    total = float(d.get("total") or 0.0)
+    
+    # Normalize signs based on voucher type to ensure subtotal and total have same sign
+    # This accounts for Tally's accounting conventions where party ledger amounts
+    # have different signs for different voucher types
+    
+    if d["vchtype"] in ("Invoice", "Sales", "Debit Note"):
+        # For sales-type vouchers:
+        # - Inventory (subtotal) is positive in Tally
+        # - Party ledger (total) is negative in Tally
+        # → Negate total to make it positive (revenue/income)
+        if subtotal < 0:
+            subtotal = -subtotal
+        if total < 0:
+            total = -total
+            
+    elif d["vchtype"] in ("Purchase", "Purchase Return"):
+        # For purchase-type vouchers:
+        # - Inventory (subtotal) is negative in Tally
+        # - Party ledger (total) is positive in Tally
+        # → Negate total to make it negative (expense)
+        if subtotal > 0:
+            subtotal = -subtotal
+        if total > 0:
+            total = -total
+            
+    elif d["vchtype"] in ("Credit Note", "Sales Return"):
+        # For credit notes:
+        # - Both subtotal and total are naturally negative in Tally
+        # → Ensure both are negative (returns/refunds)
+        if subtotal > 0:
+            subtotal = -subtotal
+        if total > 0:
+            total = -total
+    
+    # Calculate tax AFTER sign normalization
+    # Now both subtotal and total have consistent signs
+    tax = total - subtotal
+    
+    # Create invoice with embedded customer details (used by upsert_customer)
+    key = _voucher_key(d)
+    invoice = Invoice(
+        invoice_id=key,
+        voucher_key=key,
+        vchtype=d["vchtype"],
+        date=d["date"],
+        customer_id=d.get("party","") or "UNKNOWN",
+        sp_id=None,
+        subtotal=subtotal,
+        tax=tax,
+        total=total,
+        roundoff=0.0,
+        customer_gstin=d.get("party_gstin"),
+        customer_pincode=d.get("party_pincode"),
+        customer_city=d.get("party_city"),
+    )
+    return validated(invoice) if strict else invoice
+
+
+def lines_from_voucher(d: dict, invoice_id: str, strict: bool = False) -> list[VoucherLine]:
+    """VoucherLines for the inventory entries of a parse_daybook() dict."""
+    lines = [VoucherLine(invoice_id=invoice_id, **e) for e in d.get("inventory_entries", [])]
+    return [validated(line) for line in lines] if strict else lines
+
+
+def receipt_from_voucher(d: dict, strict: bool = False) -> Receipt:
+    """Build a Receipt (customer details attached) from a parse_daybook() dict."""
+    # For receipts, use the total amount
+    amount = float(d.get("total") or 0.0)
+    
+    # Create receipt with customer details
+    receipt = Receipt(
+        receipt_key=_voucher_key(d),
+        date=d["date"],
+        customer_id=d.get("party","") or "UNKNOWN",
+        amount=amount,
+        customer_gstin=d.get("party_gstin"),
+        customer_pincode=d.get("party_pincode"),
+        customer_city=d.get("party_city"),
+    )
+    return validated(receipt) if strict else receipt
+
 class TallyHTTPAdapter:
-    def __init__(self, url: str, company: str, daybook_template: str, include_types: set[str] | None = None):
+    # DayBook exports are by date window, not by change since a watermark
+    supports_incremental = False
+
+    def __init__(
+        self,
+        url: str,
+        company: str,
+        daybook_template: str,
+        include_types: set[str] | None = None,
+        strict: bool = False,
+    ):
         self.client = TallyClient(url, company)
         self.daybook_template = daybook_template
+        # Validate every record field (debugging parser output); off by default
+        self.strict = strict
         # If None, include ALL voucher types. If set provided, filter by those types.
         # Default: include common sales document types
         if include_types is None:
             self.include_types = {"Sales", "Credit Note", "Sales Return"}
         else:
             self.include_types = include_types
-        # Cache for storing last fetched vouchers (to reuse for receipts)
-        self._last_vouchers_cache = []
+        # Receipts seen by the last fetch_invoices call (see get_receipts_from_last_fetch)
+        self._last_receipts: list[Receipt] = []
 
-    def fetch_invoices(self, since: date, to: date):
+    def stream_vouchers(self, since: date, to: date, *, lines: bool = False) -> Iterator[Invoice | Receipt | VoucherLine]:
+        """
+        Yield typed records for the window as each voucher is parsed (one Tally request).
+
+        Per voucher: an Invoice if its type is included (followed by its
+        VoucherLines when lines=True), and a Receipt if it is a Receipt voucher.
+        Nothing is kept once a record is yielded; send the records to their
+        sinks by type, e.g. with route_records().
+        """
         xml = _render(self.daybook_template, from_date=since, to_date=to, company=self.client.company)
-        # Parse and cache vouchers for potential reuse (e.g., for receipts)
-        self._last_vouchers_cache = list(parse_daybook(self.client.post_xml(xml)))
-        
-        for d in self._last_vouchers_cache:
+        for d in iter_daybook(self.client.post_xml(xml)):
             # Skip filtering if include_types is empty (include all)
-            if self.include_types and d["vchtype"] not in self.include_types:
-                continue
-            
-            # Extract subtotal (pre-tax) and total (post-tax) with natural signs from Tally
-            subtotal = float(d.get("subtotal") or 0.0)
-            total = float(d.get("total") or 0.0)
-            
-            # Normalize signs based on voucher type to ensure subtotal and total have same sign
-            # This accounts for Tally's accounting conventions where party ledger amounts
-            # have different signs for different voucher types
-            
-            if d["vchtype"] in ("Invoice", "Sales", "Debit Note"):
-                # For sales-type vouchers:
-                # - Inventory (subtotal) is positive in Tally
-                # - Party ledger (total) is negative in Tally
-                # → Negate total to make it positive (revenue/income)
-                if subtotal < 0:
-                    subtotal = -subtotal
-                if total < 0:
-                    total = -total
-                    
-            elif d["vchtype"] in ("Purchase", "Purchase Return"):
-                # For purchase-type vouchers:
-                # - Inventory (subtotal) is negative in Tally
-                # - Party ledger (total) is positive in Tally
-                # → Negate total to make it negative (expense)
-                if subtotal > 0:
-                    subtotal = -subtotal
-                if total > 0:
-                    total = -total
-                    
-            elif d["vchtype"] in ("Credit Note", "Sales Return"):
-                # For credit notes:
-                # - Both subtotal and total are naturally negative in Tally
-                # → Ensure both are negative (returns/refunds)
-                if subtotal > 0:
-                    subtotal = -subtotal
-                if total > 0:
-                    total = -total
-            
-            # Calculate tax AFTER sign normalization
-            # Now both subtotal and total have consistent signs
-            tax = total - subtotal
-            
-            # Create invoice with embedded customer details
-            # Store customer details in a special attribute for upsert
-            invoice = Invoice(
-                invoice_id=_voucher_key(d),
-                voucher_key=_voucher_key(d),
-                vchtype=d["vchtype"],
-                date=d["date"],
-                customer_id=d.get("party","") or "UNKNOWN",
-                sp_id=None,
-                subtotal=subtotal,
-                tax=tax,
-                total=total,
-                roundoff=0.0,
-                lines=[],
-            )
-            
-            # Attach customer master data as extra attributes (not part of Invoice model)
-            # This will be used by upsert_customer function
-            invoice.__dict__["_customer_gstin"] = d.get("party_gstin")
-            invoice.__dict__["_customer_pincode"] = d.get("party_pincode")
-            invoice.__dict__["_customer_city"] = d.get("party_city")
-            
-            yield invoice
+            if not self.include_types or d["vchtype"] in self.include_types:
+                invoice = invoice_from_voucher(d, self.strict)
+                yield invoice
+                if lines:
+                    yield from lines_from_voucher(d, invoice.invoice_id, self.strict)
+            if d["vchtype"] == "Receipt":
+                yield receipt_from_voucher(d, self.strict)
+
+    async def fetch_batches(
+        self, since: date, to: date, *, batch_size: int = DEFAULT_BATCH_SIZE, lines: bool = False
+    ) -> AsyncIterator[RecordBatch]:
+        """stream_vouchers() as columnar batches (BatchERPAdapter), one record type per batch."""
+        async for batch in batch_records(self.stream_vouchers(since, to, lines=lines), batch_size):
+            yield batch
+
+    def fetch_invoices(self, since: date, to: date):
+        """
+        Invoices for the window.
+
+        Only the Receipt records met along the way are kept, for
+        get_receipts_from_last_fetch(); prefer stream_vouchers() for new code.
+        """
+        self._last_receipts = []
+        for record in self.stream_vouchers(since, to):
+            if isinstance(record, Receipt):
+                self._last_receipts.append(record)
+            else:
+                yield record
     
     def get_receipts_from_last_fetch(self):
-        """Extract Receipt vouchers from the cached data (last fetch_invoices call).
+        """Receipts from the last (fully consumed) fetch_invoices call.
         
         This reuses the XML response that was already fetched by fetch_invoices(),
         avoiding an additional Tally request.
@@ -138,25 +209,28 @@ class TallyHTTPAdapter:
         Yields:
             Receipt: Receipt objects for vouchers with vchtype='Receipt'
         """
-        for d in self._last_vouchers_cache:
-            # Only process Receipt voucher types
-            if d["vchtype"] != "Receipt":
-                continue
-            
-            # For receipts, use the total amount
-            amount = float(d.get("total") or 0.0)
-            
-            # Create receipt with customer details
-            receipt = Receipt(
-                receipt_key=_voucher_key(d),
-                date=d["date"],
-                customer_id=d.get("party","") or "UNKNOWN",
-                amount=amount,
-            )
-            
-            # Attach customer master data (same pattern as invoices)
-            receipt.__dict__["_customer_gstin"] = d.get("party_gstin")
-            receipt.__dict__["_customer_pincode"] = d.get("party_pincode")
-            receipt.__dict__["_customer_city"] = d.get("party_city")
-            
-            yield receipt
+        yield from self._last_receipts
+
+
+def route_records(
+    records: Iterable[Invoice | Receipt | VoucherLine],
+    *,
+    invoice: Callable[[Invoice], object] | None = None,
+    receipt: Callable[[Receipt], object] | None = None,
+    line: Callable[[VoucherLine], object] | None = None,
+) -> dict[str, int]:
+    """
+    Send each streamed record to the sink for its type (records without a
+    sink are dropped).
+
+    Returns:
+        Dict of records routed per type: invoices, receipts, lines
+    """
+    sinks = {Invoice: ("invoices", invoice), Receipt: ("receipts", receipt), VoucherLine: ("lines", line)}
+    counts = {"invoices": 0, "receipts": 0, "lines": 0}
+    for record in records:
+        key, sink = sinks[type(record)]
+        if sink is not None:
+            sink(record)
+            counts[key] += 1
+    return counts
@@ -15,7 +15,7 @@ Output rows:
 from __future__ import annotations
 from datetime import datetime, date
 from lxml import etree
-from adapters.tally_http.validators import sanitize_xml
+from adapters.tally_http.validators import xml_root
 
 
 def _text(element: etree._Element | None, tag: str) -> str | None:
@@ -48,8 +48,7 @@ def _num(element: etree._Element | None, tag: str) -> float:
 
 
 def parse_opening_bill_allocations(xml_text: str) -> list[dict]:
-    sanitized = sanitize_xml(xml_text)
-    root = etree.fromstring(sanitized.encode("utf-8"))
+    root = xml_root(xml_text)
 
     out: list[dict] = []
 
@@ -117,8 +116,7 @@ def parse_outstanding_receivables(xml_text: str) -> list[dict]:
     - billtype: Bill type
     - is_advance: Whether it's an advance
     """
-    sanitized = sanitize_xml(xml_text)
-    root = etree.fromstring(sanitized.encode("utf-8"))
+    root = xml_root(xml_text)
     
     out: list[dict] = []
     
@@ -196,84 +194,90 @@ def parse_trn_bill_allocations(xml_text: str) -> list[dict]:
     - billtype: Bill type ("New Ref" or "Agst Ref")
     - bill_credit_period: Credit period in days (if available)
     """
-    sanitized = sanitize_xml(xml_text)
-    root = etree.fromstring(sanitized.encode("utf-8"))
+    root = xml_root(xml_text)
     
     out: list[dict] = []
     
     # Iterate through all vouchers
     for voucher in root.findall(".//VOUCHER"):
-        voucher_guid = _text(voucher, "GUID")
-        voucher_date_str = _text(voucher, "DATE")
-        voucher_date = parse_tally_date(voucher_date_str)
-        voucher_type = voucher.get("VCHTYPE") or _text(voucher, "VOUCHERTYPENAME") or ""
-        voucher_number = voucher.get("VCHNUMBER") or _text(voucher, "VOUCHERNUMBER") or ""
-        reference_number = _text(voucher, "REFERENCE")
-        reference_date_str = _text(voucher, "REFERENCEDATE")
-        reference_date = parse_tally_date(reference_date_str) if reference_date_str else None
-        narration = _text(voucher, "NARRATION")
-        party_name = _text(voucher, "PARTYLEDGERNAME")
-        place_of_supply = _text(voucher, "PLACEOFSUPPLY")
-        is_invoice = _bool(voucher, "ISINVOICE")
-        is_accounting_voucher = _bool(voucher, "ISACCOUNTINGVOUCHER")
-        is_inventory_voucher = _bool(voucher, "ISINVENTORYVOUCHER")
-        is_order_voucher = _bool(voucher, "ISORDERVOUCHER")
-        alter_id_text = _text(voucher, "ALTERID")
-        try:
-            alter_id = int(alter_id_text) if alter_id_text else None
-        except ValueError:
-            alter_id = None
-        
-        if not voucher_guid:
+        out.extend(parse_voucher_bill_allocations(voucher))
+    
+    return out
+
+
+def parse_voucher_bill_allocations(voucher: etree._Element) -> list[dict]:
+    """
+    Bill allocation rows (parse_trn_bill_allocations() shape) for one VOUCHER element.
+    """
+    voucher_guid = _text(voucher, "GUID")
+    voucher_date_str = _text(voucher, "DATE")
+    voucher_date = parse_tally_date(voucher_date_str)
+    voucher_type = voucher.get("VCHTYPE") or _text(voucher, "VOUCHERTYPENAME") or ""
+    voucher_number = voucher.get("VCHNUMBER") or _text(voucher, "VOUCHERNUMBER") or ""
+    reference_number = _text(voucher, "REFERENCE")
+    reference_date_str = _text(voucher, "REFERENCEDATE")
+    reference_date = parse_tally_date(reference_date_str) if reference_date_str else None
+    narration = _text(voucher, "NARRATION")
+    party_name = _text(voucher, "PARTYLEDGERNAME")
+    place_of_supply = _text(voucher, "PLACEOFSUPPLY")
+    is_invoice = _bool(voucher, "ISINVOICE")
+    is_accounting_voucher = _bool(voucher, "ISACCOUNTINGVOUCHER")
+    is_inventory_voucher = _bool(voucher, "ISINVENTORYVOUCHER")
+    is_order_voucher = _bool(voucher, "ISORDERVOUCHER")
+    alter_id_text = _text(voucher, "ALTERID")
+    try:
+        alter_id = int(alter_id_text) if alter_id_text else None
+    except ValueError:
+        alter_id = None
+    
+    if not voucher_guid:
+        return []
+    
+    out: list[dict] = []
+    
+    # Find all ledger entries with bill allocations
+    for ledger_entry in voucher.findall(".//ALLLEDGERENTRIES.LIST"):
+        ledger_name = _text(ledger_entry, "LEDGERNAME")
+        if not ledger_name:
             continue
         
-        # Find all ledger entries with bill allocations
-        for ledger_entry in voucher.findall(".//ALLLEDGERENTRIES.LIST"):
-            ledger_name = _text(ledger_entry, "LEDGERNAME")
-            if not ledger_name:
-                continue
+        # Find bill allocations within this ledger entry
+        for bill_alloc in ledger_entry.findall(".//BILLALLOCATIONS.LIST"):
+            bill_name = _text(bill_alloc, "NAME")
+            amount = _num(bill_alloc, "AMOUNT")
+            billtype = _text(bill_alloc, "BILLTYPE")
+            bill_credit_period = _text(bill_alloc, "BILLCREDITPERIOD")
             
-            # Find bill allocations within this ledger entry
-            for bill_alloc in ledger_entry.findall(".//BILLALLOCATIONS.LIST"):
-                bill_name = _text(bill_alloc, "NAME")
-                amount = _num(bill_alloc, "AMOUNT")
-                billtype = _text(bill_alloc, "BILLTYPE")
-                bill_credit_period = _text(bill_alloc, "BILLCREDITPERIOD")
-                
-                # Normalize credit period to int
-                credit_days = None
-                if bill_credit_period:
-                    try:
-                        credit_days = int(str(bill_credit_period).strip())
-                    except Exception:
-                        credit_days = None
-                
-                # Only include if we have a bill name
-                if bill_name:
-                    out.append({
-                        "voucher_guid": voucher_guid,
-                        "voucher_date": voucher_date,
-                        "voucher_type": voucher_type,
-                        "voucher_number": voucher_number,
-                        "reference_number": reference_number,
-                        "reference_date": reference_date,
-                        "narration": narration,
-                        "party_name": party_name,
-                        "place_of_supply": place_of_supply,
-                        "is_invoice": is_invoice,
-                        "is_accounting_voucher": is_accounting_voucher,
-                        "is_inventory_voucher": is_inventory_voucher,
-                        "is_order_voucher": is_order_voucher,
-                        "alter_id": alter_id,
-                        "ledger": ledger_name.strip(),
-                        "bill_name": bill_name.strip(),
-                        "amount": round(amount, 2),
-                        "billtype": billtype or "",
-                        "bill_credit_period": credit_days,
-                    })
+            # Normalize credit period to int
+            credit_days = None
+            if bill_credit_period:
+                try:
+                    credit_days = int(str(bill_credit_period).strip())
+                except Exception:
+                    credit_days = None
+            
+            # Only include if we have a bill name
+            if bill_name:
+                out.append({
+                    "voucher_guid": voucher_guid,
+                    "voucher_date": voucher_date,
+                    "voucher_type": voucher_type,
+                    "voucher_number": voucher_number,
+                    "reference_number": reference_number,
+                    "reference_date": reference_date,
+                    "narration": narration,
+                    "party_name": party_name,
+                    "place_of_supply": place_of_supply,
+                    "is_invoice": is_invoice,
+                    "is_accounting_voucher": is_accounting_voucher,
+                    "is_inventory_voucher": is_inventory_voucher,
+                    "is_order_voucher": is_order_voucher,
+                    "alter_id": alter_id,
+                    "ledger": ledger_name.strip(),
+                    "bill_name": bill_name.strip(),
+                    "amount": round(amount, 2),
+                    "billtype": billtype or "",
+                    "bill_credit_period": credit_days,
+                })
     
     return out
-
-
-
-
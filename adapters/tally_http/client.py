@@ -1,6 +1,6 @@
 import requests
 from tenacity import retry, wait_exponential, stop_after_attempt
-from .validators import ensure_status_ok, TallyHTTPError
+from .validators import ensure_status_ok, TallyHTTPError, TallyResponse
 
 DEFAULT_HEADERS = {
     "Content-Type": "text/xml; charset=utf-8",
@@ -17,9 +17,12 @@ class TallyClient:
 
     @retry(wait=wait_exponential(multiplier=1, min=1, max=30),
            stop=stop_after_attempt(5))
-    def post_xml(self, xml: str, timeout: int = 300) -> str:
+    def post_xml(self, xml: str, timeout: int = 300) -> TallyResponse:
         """
         Post XML to Tally and return response.
+
+        The response is a str carrying its parsed tree, so the status check
+        below and the adapters' parsers parse it only once.
         
         Args:
             xml: XML request string
@@ -27,6 +30,6 @@ class TallyClient:
         """
         r = self.session.post(self.base_url, data=xml.encode("utf-8"), timeout=timeout)
         r.raise_for_status()
-        text = r.text
-        ensure_status_ok(text)  # raises if STATUS != 1
-        return text
+        response = TallyResponse(r.text)
+        ensure_status_ok(response)  # raises if STATUS != 1
+        return response
@@ -4,7 +4,7 @@ Extracts ledger groups and ledgers with their parent relationships.
 """
 from __future__ import annotations
 from lxml import etree
-from .validators import sanitize_xml
+from .validators import xml_root
 
 
 def _text(element: etree._Element | None, tag: str) -> str | None:
@@ -28,8 +28,7 @@ def parse_ledgers(xml_text: str) -> list[dict]:
     - parent_name: Parent group name (e.g., "Sundry Debtors")
     - alter_id: Tally alteration ID
     """
-    sanitized = sanitize_xml(xml_text)
-    root = etree.fromstring(sanitized.encode("utf-8"))
+    root = xml_root(xml_text)
     out: list[dict] = []
     
     for ledger in root.findall(".//LEDGER"):
@@ -69,8 +68,7 @@ def parse_ledger_groups(xml_text: str) -> list[dict]:
     - parent_name: Parent group name (None for root groups)
     - alter_id: Tally alteration ID
     """
-    sanitized = sanitize_xml(xml_text)
-    root = etree.fromstring(sanitized.encode("utf-8"))
+    root = xml_root(xml_text)
     out: list[dict] = []
     
     for group in root.findall(".//GROUP"):
@@ -100,6 +98,57 @@ def parse_ledger_groups(xml_text: str) -> list[dict]:
     return out
 
 
+def parse_party_ledgers(xml_text: str) -> list[dict]:
+    """
+    Parse the targeted party ledger collection (requests/party_ledgers.xml.j2).
+    
+    Returns list of dicts with keys:
+    - name, guid, parent_name, alter_id: as parse_ledgers()
+    - gstin: Party GSTIN (PARTYGSTIN, or the latest GST registration details)
+    - state: Ledger state name
+    - pincode: Ledger pincode
+    - address: Address lines joined with ", "
+    """
+    root = xml_root(xml_text)
+    out: list[dict] = []
+    
+    for ledger in root.findall(".//LEDGER"):
+        name = ledger.get("NAME") or _text(ledger, "NAME")
+        if not name:
+            continue
+        
+        alter_id_str = _text(ledger, "ALTERID")
+        alter_id = None
+        if alter_id_str:
+            try:
+                alter_id = int(alter_id_str.replace(" ", ""))
+            except ValueError:
+                pass
+        
+        # Newer Tally releases keep these in dated sub-lists; last entry is current
+        gst_details = ledger.findall(".//LEDGSTREGDETAILS.LIST")
+        mailing = ledger.findall(".//LEDMAILINGDETAILS.LIST")
+        gstin = _text(ledger, "PARTYGSTIN") or (_text(gst_details[-1], "GSTIN") if gst_details else None)
+        state = _text(ledger, "LEDGERSTATENAME") or (_text(mailing[-1], "STATE") if mailing else None)
+        pincode = _text(ledger, "PINCODE") or (_text(mailing[-1], "PINCODE") if mailing else None)
+        address_lines = [
+            a.text.strip() for a in ledger.findall(".//ADDRESS.LIST/ADDRESS") if a.text and a.text.strip()
+        ]
+        
+        out.append({
+            "name": name.strip(),
+            "guid": _text(ledger, "GUID"),
+            "parent_name": _text(ledger, "PARENT"),
+            "alter_id": alter_id,
+            "gstin": gstin,
+            "state": state,
+            "pincode": pincode,
+            "address": ", ".join(address_lines) or None,
+        })
+    
+    return out
+
+
 def extract_ledger_groups_from_ledgers(ledgers: list[dict]) -> list[dict]:
     """
     Extract unique ledger groups from ledger parent names.
@@ -4,7 +4,7 @@ Handles both file-based and HTTP-fetched masters exports.
 """
 from __future__ import annotations
 from lxml import etree
-from .validators import sanitize_xml
+from .validators import xml_root
 
 
 def _text(element: etree._Element | None, tag: str) -> str | None:
@@ -38,8 +38,7 @@ def parse_units(xml_text: str) -> list[dict]:
     - is_simple: Whether it's a simple unit
     - alter_id: Tally alteration ID
     """
-    sanitized = sanitize_xml(xml_text)
-    root = etree.fromstring(sanitized.encode("utf-8"))
+    root = xml_root(xml_text)
     out: list[dict] = []
     
     for unit in root.findall(".//UNIT"):
@@ -83,8 +82,7 @@ def parse_stock_groups(xml_text: str) -> list[dict]:
     - parent_name: Parent group name (None for root groups)
     - alter_id: Tally alteration ID
     """
-    sanitized = sanitize_xml(xml_text)
-    root = etree.fromstring(sanitized.encode("utf-8"))
+    root = xml_root(xml_text)
     out: list[dict] = []
     
     for group in root.findall(".//STOCKGROUP"):
@@ -125,8 +123,7 @@ def parse_stock_items(xml_text: str) -> list[dict]:
     - base_units: Base unit of measurement
     - hsn: HSN code (if available)
     """
-    sanitized = sanitize_xml(xml_text)
-    root = etree.fromstring(sanitized.encode("utf-8"))
+    root = xml_root(xml_text)
     out: list[dict] = []
     
     for item in root.findall(".//STOCKITEM"):
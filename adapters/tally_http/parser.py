@@ -1,12 +1,18 @@
 from __future__ import annotations
+from typing import Iterator
 from lxml import etree
 from datetime import datetime, date
-from .validators import sanitize_xml
+from .validators import xml_root
 
 def parse_tally_date(s: str | None) -> date:
     if not s:
         return date.today()
     s = s.strip()
+    if len(s) == 8 and s.isdigit():  # YYYYMMDD, as Tally exports it
+        try:
+            return date(int(s[:4]), int(s[4:6]), int(s[6:]))
+        except ValueError:
+            pass
     for fmt in ("%Y%m%d", "%Y-%m-%d", "%d-%b-%Y"):
         try:
             return datetime.strptime(s, fmt).date()
@@ -17,6 +23,10 @@ def parse_tally_date(s: str | None) -> date:
 def _to_float(x: str | None) -> float:
     if not x:
         return 0.0
+    try:
+        return float(x)  # plain amounts; commas / (negatives) below
+    except ValueError:
+        pass
     x = x.replace(",", "").strip()
     neg = x.startswith("(") and x.endswith(")")
     if neg:
@@ -27,108 +37,144 @@ def _to_float(x: str | None) -> float:
         val = 0.0
     return -val if neg else val
 
-def _party_line_amount_signed(voucher: etree._Element, party_name: str, vchtype: str = None) -> float | None:
+# Voucher types whose party line is in LEDGERENTRIES.LIST (single R);
+# all types also check ALLLEDGERENTRIES.LIST (double L)
+LEDGER_ENTRIES_TYPES = {"Invoice", "Sales", "Credit Note", "Sales Return", "Purchase", "Purchase Return", "Debit Note"}
+
+# Containers whose descendants parse_voucher() reads (document order, as
+# voucher.findall(".//TAG") would return them)
+_LIST_TAGS = ("LEDGERENTRIES.LIST", "ALLLEDGERENTRIES.LIST", "BILLALLOCATIONS.LIST", "ALLINVENTORYENTRIES.LIST")
+# Party details looked up anywhere under the voucher (voucher.findtext(".//TAG"))
+_PARTY_TAGS = ("PARTYGSTIN", "BASICBUYERPARTYGSTIN", "PARTYPINCODE", "BASICBUYERPINCODE", "PARTYCITY", "BASICBUYERSTATE")
+# Fields read from the voucher itself and from the containers above
+# (element.findtext("TAG"), i.e. first child with the tag)
+_FIELD_TAGS = ("DATE", "PARTYLEDGERNAME", "AMOUNT", "LEDGERNAME", "STOCKITEMNAME", "BILLEDQTY", "RATE", "DISCOUNT")
+_SCAN_TAGS = ("VOUCHER",) + _LIST_TAGS + _PARTY_TAGS + _FIELD_TAGS
+_PARTY_TAG_SET = frozenset(_PARTY_TAGS)
+_LIST_TAG_SET = frozenset(_LIST_TAGS)
+
+class _VoucherScan:
     """
-    Extract party ledger amount with voucher-type aware tag selection.
-    - For Sales/Invoice/Credit Note/Purchase/Debit Note: Check LEDGERENTRIES.LIST (single R)
-    - For Receipt/Payment/Journal: Check ALLLEDGERENTRIES.LIST (double L)
+    Texts parse_voucher() needs from one voucher, gathered during the walk:
+    the voucher's own fields, the first text of each party tag anywhere under
+    it, and the fields of each container element, grouped by container tag.
     """
+    __slots__ = ("voucher", "fields", "party", "lists", "owned")
+
+    def __init__(self, voucher: etree._Element):
+        self.voucher = voucher
+        self.fields: dict[str, str] = {}
+        self.party: dict[str, str] = {}
+        self.lists: dict[str, list[dict[str, str]]] = {tag: [] for tag in _LIST_TAGS}
+        # voucher / container element -> its fields dict
+        self.owned: dict[etree._Element, dict[str, str]] = {voucher: self.fields}
+
+    def contains(self, el: etree._Element) -> bool:
+        """Whether el is under the voucher (has the voucher or one of its containers above it)."""
+        parent = el.getparent()
+        while parent is not None:
+            if parent in self.owned:
+                return True
+            parent = parent.getparent()
+        return False
+
+def _scan_vouchers(elements: Iterator[etree._Element]) -> Iterator[_VoucherScan]:
+    """
+    Group a document-order walk over _SCAN_TAGS into one _VoucherScan per
+    VOUCHER (the per-element work is inlined here: it runs for every field
+    element in the response). Elements outside any voucher are ignored.
+    """
+    scan = None
+    owned: dict[etree._Element, dict[str, str]] = {}
+    for el in elements:
+        tag = el.tag
+        if tag == "VOUCHER":
+            if scan is not None:
+                yield scan
+            scan = _VoucherScan(el)
+            owned = scan.owned
+        elif scan is None:
+            continue
+        elif tag in _LIST_TAG_SET:
+            if scan.contains(el):
+                owned[el] = fields = {}
+                scan.lists[tag].append(fields)
+        else:
+            owner = owned.get(el.getparent())
+            if owner is not None and tag not in owner:
+                owner[tag] = el.text or ""
+            if tag in _PARTY_TAG_SET and tag not in scan.party and (owner is not None or scan.contains(el)):
+                scan.party[tag] = el.text or ""
+    if scan is not None:
+        yield scan
+
+def _ledger_lines(scan: _VoucherScan, vchtype: str | None) -> list[dict[str, str]]:
+    """
+    Ledger lines in the order they are considered for the voucher amount.
+    - For Sales/Invoice/Credit Note/Purchase/Debit Note: LEDGERENTRIES.LIST (single R) first
+    - For Receipt/Payment/Journal: ALLLEDGERENTRIES.LIST (double L) only
+    """
+    if vchtype in LEDGER_ENTRIES_TYPES:
+        return scan.lists["LEDGERENTRIES.LIST"] + scan.lists["ALLLEDGERENTRIES.LIST"]
+    return scan.lists["ALLLEDGERENTRIES.LIST"]
+
+def _party_line_amount_signed(ledger_lines: list[dict[str, str]], party_name: str) -> float | None:
+    """Amount of the party's ledger line, sign kept."""
     party = (party_name or "").strip().lower()
-    
-    # Voucher types that use LEDGERENTRIES.LIST (single R)
-    ledger_entries_types = {"Invoice", "Sales", "Credit Note", "Sales Return", "Purchase", "Purchase Return", "Debit Note"}
-    
-    # For Sales/Invoice/Credit Note/Purchase/Debit Note, check LEDGERENTRIES.LIST (single R)
-    if vchtype in ledger_entries_types:
-        for le in voucher.findall(".//LEDGERENTRIES.LIST"):
-            lname = (le.findtext("LEDGERNAME") or "").strip().lower()
-            if lname == party or party[:15] in lname[:15]:
-                return _to_float(le.findtext("AMOUNT"))  # keep sign
-    
-    # For Receipt/Payment/Journal, check ALLLEDGERENTRIES.LIST (double L)
-    for le in voucher.findall(".//ALLLEDGERENTRIES.LIST"):
-        lname = (le.findtext("LEDGERNAME") or "").strip().lower()
+    for fields in ledger_lines:
+        lname = (fields.get("LEDGERNAME") or "").strip().lower()
         if lname == party or party[:15] in lname[:15]:
-            return _to_float(le.findtext("AMOUNT"))  # keep sign
-    
+            return _to_float(fields.get("AMOUNT"))  # keep sign
     return None
 
-def _fallback_amount_signed(voucher: etree._Element, vchtype: str = None) -> float:
-    """
-    Choose the line with largest magnitude; keep its original sign.
-    - For Sales/Invoice/Credit Note/Purchase/Debit Note: Check LEDGERENTRIES.LIST (single R)
-    - For Receipt/Payment/Journal: Check ALLLEDGERENTRIES.LIST (double L)
-    """
+def _fallback_amount_signed(ledger_lines: list[dict[str, str]]) -> float:
+    """Choose the line with largest magnitude; keep its original sign."""
     best_val = 0.0
     best_abs = 0.0
-    
-    # Voucher types that use LEDGERENTRIES.LIST (single R)
-    ledger_entries_types = {"Invoice", "Sales", "Credit Note", "Sales Return", "Purchase", "Purchase Return", "Debit Note"}
-    
-    # For Sales/Invoice/Credit Note/Purchase/Debit Note, check LEDGERENTRIES.LIST (single R)
-    if vchtype in ledger_entries_types:
-        for le in voucher.findall(".//LEDGERENTRIES.LIST"):
-            v = _to_float(le.findtext("AMOUNT"))
-            if abs(v) > best_abs:
-                best_abs = abs(v)
-                best_val = v
-    
-    # For Receipt/Payment/Journal, check ALLLEDGERENTRIES.LIST (double L)
-    for le in voucher.findall(".//ALLLEDGERENTRIES.LIST"):
-        v = _to_float(le.findtext("AMOUNT"))
+    for fields in ledger_lines:
+        v = _to_float(fields.get("AMOUNT"))
         if abs(v) > best_abs:
             best_abs = abs(v)
             best_val = v
-    
     return best_val
 
-def _bill_allocation_amount(voucher: etree._Element) -> float | None:
+def _bill_allocation_amount(bill_allocations: list[dict[str, str]]) -> float | None:
     """
     Extract amount from BILLALLOCATIONS.LIST (post-tax total for invoices).
     This is the most accurate for Invoice vouchers as it includes tax.
     Returns None if not found.
     """
-    for bill_alloc in voucher.findall(".//BILLALLOCATIONS.LIST"):
-        amt_text = bill_alloc.findtext("AMOUNT")
+    for fields in bill_allocations:
+        amt_text = fields.get("AMOUNT")
         if amt_text:
             # Return natural sign (don't force positive)
             return _to_float(amt_text)
     return None
 
-def _inventory_total_amount(voucher: etree._Element) -> float:
-    """
-    Calculate total amount from inventory entries (pre-tax).
-    Used as fallback for Invoice/Sales vouchers where bill allocation is not available.
-    Note: This gives pre-tax total, so should be used as last resort.
-    """
-    total = 0.0
-    for inv_entry in voucher.findall(".//ALLINVENTORYENTRIES.LIST"):
-        amt = _to_float(inv_entry.findtext("AMOUNT"))
-        total += amt
-    return total
-
-def _parse_inventory_entries(voucher: etree._Element) -> list[dict]:
+def _parse_inventory_entries(inventory: list[dict[str, str]]) -> tuple[list[dict], float]:
     """
     Parse individual inventory entries from a voucher.
-    Returns list of dicts with: stock_item_name, billed_qty, rate, amount, discount
+
+    Returns:
+        (entries, total) - dicts with stock_item_name, billed_qty, rate, amount,
+        discount for entries with an item name, and the pre-tax sum of AMOUNT
+        over all entries (used as the subtotal / last-resort total)
     """
     entries = []
-    for inv_entry in voucher.findall(".//ALLINVENTORYENTRIES.LIST"):
-        stock_item_name = (inv_entry.findtext("STOCKITEMNAME") or "").strip()
-        billed_qty = (inv_entry.findtext("BILLEDQTY") or "").strip()
-        rate = (inv_entry.findtext("RATE") or "").strip()
-        amount = _to_float(inv_entry.findtext("AMOUNT"))
-        discount = _to_float(inv_entry.findtext("DISCOUNT"))
-        
+    total = 0.0
+    for fields in inventory:
+        amount = _to_float(fields.get("AMOUNT"))
+        total += amount
+        stock_item_name = (fields.get("STOCKITEMNAME") or "").strip()
         if stock_item_name:  # Only include entries with item names
             entries.append({
                 "stock_item_name": stock_item_name,
-                "billed_qty": billed_qty,
-                "rate": rate,
+                "billed_qty": (fields.get("BILLEDQTY") or "").strip(),
+                "rate": (fields.get("RATE") or "").strip(),
                 "amount": amount,
-                "discount": discount
+                "discount": _to_float(fields.get("DISCOUNT")),
             })
-    return entries
+    return entries, total
 
 def parse_daybook(xml_text: str) -> list[dict]:
     """
@@ -136,88 +182,102 @@ def parse_daybook(xml_text: str) -> list[dict]:
     Fields: vchtype, vchnumber, date, party, amount (for backward compat), subtotal, total, guid, 
             party_gstin, party_pincode, party_city, inventory_entries
     """
-    # Sanitize XML to remove invalid characters
-    sanitized = sanitize_xml(xml_text)
-    root = etree.fromstring(sanitized.encode("utf-8"))
-    out: list[dict] = []
-    for v in root.findall(".//VOUCHER"):
-        vchtype = v.get("VCHTYPE") or ""
-        vchnumber = v.get("VCHNUMBER") or ""
-        # Use GUID if available, otherwise use REMOTEID (Tally's unique voucher identifier)
-        guid = v.get("GUID") or v.get("REMOTEID") or ""
-        d = parse_tally_date(v.findtext("DATE"))
-        party = (v.findtext("PARTYLEDGERNAME") or "").strip()
-        
-        # Extract party/customer master details
-        # Try multiple possible XML paths where Tally might store this info
-        party_gstin = (v.findtext("PARTYGSTIN") or 
-                      v.findtext(".//PARTYGSTIN") or 
-                      v.findtext(".//BASICBUYERPARTYGSTIN") or "").strip()
-        
-        party_pincode = (v.findtext("PARTYPINCODE") or 
-                        v.findtext(".//PARTYPINCODE") or 
-                        v.findtext(".//BASICBUYERPINCODE") or "").strip()
-        
-        party_city = (v.findtext("PARTYCITY") or 
-                     v.findtext(".//PARTYCITY") or 
-                     v.findtext(".//BASICBUYERSTATE") or "").strip()
-
-        # For invoices, try to get both pre-tax (subtotal) and post-tax (total)
-        subtotal = 0.0
-        total = 0.0
-        
-        # Get inventory total (pre-tax for invoices)
-        amt_from_inventory = _inventory_total_amount(v)
-        
-        # Try to get post-tax amount from ledger entries (voucher-type aware)
-        amt_from_ledger = _party_line_amount_signed(v, party, vchtype)
-        if amt_from_ledger is None:
-            amt_from_ledger = _fallback_amount_signed(v, vchtype)
-        
-        # Also check bill allocation (works for most invoices)
-        amt_from_bill = _bill_allocation_amount(v)
-        
-        # Determine subtotal and total based on what's available
-        # Keep natural signs initially - adapter will handle sign normalization
-        if amt_from_inventory and (amt_from_ledger or amt_from_bill):
-            # Invoice with both pre-tax and post-tax amounts
-            subtotal = amt_from_inventory  # Pre-tax from inventory
-            # Prefer ledger amount (more universal), fallback to bill allocation
-            # Keep natural sign - don't force positive
-            total = amt_from_ledger if amt_from_ledger else amt_from_bill
-        elif amt_from_ledger:
-            # Has ledger amount but no inventory - use ledger for both
-            total = amt_from_ledger
-            subtotal = total  # No separate tax information
-        elif amt_from_bill:
-            # Has bill allocation but no inventory
-            total = amt_from_bill
-            subtotal = total  # No separate tax information
-        elif amt_from_inventory:
-            # Has inventory only (no post-tax found)
-            subtotal = amt_from_inventory
-            total = amt_from_inventory
-        else:
-            # Last resort: header-level AMOUNT
-            amt = _to_float(v.findtext("AMOUNT"))
-            subtotal = amt
-            total = amt
-
-        # Parse inventory entries for line items
-        inventory_entries = _parse_inventory_entries(v)
-
-        out.append({
-            "vchtype": vchtype,
-            "vchnumber": vchnumber,
-            "date": d,
-            "party": party,
-            "amount": total,  # backward compatibility - use total
-            "subtotal": subtotal,  # pre-tax amount
-            "total": total,  # post-tax amount
-            "guid": guid,
-            "party_gstin": party_gstin if party_gstin else None,
-            "party_pincode": party_pincode if party_pincode else None,
-            "party_city": party_city if party_city else None,
-            "inventory_entries": inventory_entries,
-        })
-    return out
+    return list(iter_daybook(xml_text))
+
+def iter_daybook(xml_text: str) -> Iterator[dict]:
+    """
+    Yield the parse_daybook() dicts one voucher at a time, without collecting them.
+
+    The whole document is walked once; each voucher's dict is built from the
+    texts gathered for it (_scan_vouchers).
+    """
+    for scan in _scan_vouchers(xml_root(xml_text).iter(*_SCAN_TAGS)):
+        yield _voucher_dict(scan)
+
+def parse_voucher(v: etree._Element) -> dict:
+    """Parse one VOUCHER element into the parse_daybook() dict shape."""
+    return _voucher_dict(next(_scan_vouchers(v.iter(*_SCAN_TAGS))))
+
+def _voucher_dict(scan: _VoucherScan) -> dict:
+    """Build the parse_daybook() dict from a voucher's gathered texts."""
+    v = scan.voucher
+    header = scan.fields
+    found = scan.party
+    vchtype = v.get("VCHTYPE") or ""
+    vchnumber = v.get("VCHNUMBER") or ""
+    # Use GUID if available, otherwise use REMOTEID (Tally's unique voucher identifier)
+    guid = v.get("GUID") or v.get("REMOTEID") or ""
+    d = parse_tally_date(header.get("DATE"))
+    party = (header.get("PARTYLEDGERNAME") or "").strip()
+
+    # Extract party/customer master details
+    # Try multiple possible XML paths where Tally might store this info
+    party_gstin = (header.get("PARTYGSTIN") or 
+                  found.get("PARTYGSTIN") or 
+                  found.get("BASICBUYERPARTYGSTIN") or "").strip()
+    
+    party_pincode = (header.get("PARTYPINCODE") or 
+                    found.get("PARTYPINCODE") or 
+                    found.get("BASICBUYERPINCODE") or "").strip()
+    
+    party_city = (header.get("PARTYCITY") or 
+                 found.get("PARTYCITY") or 
+                 found.get("BASICBUYERSTATE") or "").strip()
+
+    # For invoices, try to get both pre-tax (subtotal) and post-tax (total)
+    subtotal = 0.0
+    total = 0.0
+    
+    # Line items and their total (pre-tax for invoices)
+    inventory_entries, amt_from_inventory = _parse_inventory_entries(scan.lists["ALLINVENTORYENTRIES.LIST"])
+    
+    # Try to get post-tax amount from ledger entries (voucher-type aware)
+    ledger_lines = _ledger_lines(scan, vchtype)
+    amt_from_ledger = _party_line_amount_signed(ledger_lines, party)
+    if amt_from_ledger is None:
+        amt_from_ledger = _fallback_amount_signed(ledger_lines)
+    
+    # Also check bill allocation (works for most invoices); only consulted
+    # when the ledger lines give no amount
+    amt_from_bill = None if amt_from_ledger else _bill_allocation_amount(scan.lists["BILLALLOCATIONS.LIST"])
+    
+    # Determine subtotal and total based on what's available
+    # Keep natural signs initially - adapter will handle sign normalization
+    if amt_from_inventory and (amt_from_ledger or amt_from_bill):
+        # Invoice with both pre-tax and post-tax amounts
+        subtotal = amt_from_inventory  # Pre-tax from inventory
+        # Prefer ledger amount (more universal), fallback to bill allocation
+        # Keep natural sign - don't force positive
+        total = amt_from_ledger if amt_from_ledger else amt_from_bill
+    elif amt_from_ledger:
+        # Has ledger amount but no inventory - use ledger for both
+        total = amt_from_ledger
+        subtotal = total  # No separate tax information
+    elif amt_from_bill:
+        # Has bill allocation but no inventory
+        total = amt_from_bill
+        subtotal = total  # No separate tax information
+    elif amt_from_inventory:
+        # Has inventory only (no post-tax found)
+        subtotal = amt_from_inventory
+        total = amt_from_inventory
+    else:
+        # Last resort: header-level AMOUNT
+        amt = _to_float(header.get("AMOUNT"))
+        subtotal = amt
+        total = amt
+
+    return {
+        "vchtype": vchtype,
+        "vchnumber": vchnumber,
+        "date": d,
+        "party": party,
+        "amount": total,  # backward compatibility - use total
+        "subtotal": subtotal,  # pre-tax amount
+        "total": total,  # post-tax amount
+        "guid": guid,
+        "party_gstin": party_gstin if party_gstin else None,
+        "party_pincode": party_pincode if party_pincode else None,
+        "party_city": party_city if party_city else None,
+        "inventory_entries": inventory_entries,
+    }
@@ -0,0 +1,47 @@
+"""
+Targeted party ledger lookups.
+
+Fetches GSTIN, address and group for a handful of named ledgers with one TDL
+collection request (filtered by name) instead of the full ledger master export.
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Iterable
+from xml.sax.saxutils import escape
+from jinja2 import Template
+from .client import TallyClient
+from .ledgers_parser import parse_party_ledgers
+
+PARTY_LEDGERS_TEMPLATE = (Path(__file__).resolve().parent / "requests" / "party_ledgers.xml.j2").read_text(encoding="utf-8")
+
+# Names per request; keeps the filter formula a reasonable size
+BATCH_SIZE = 100
+
+
+def name_filter(names: Iterable[str]) -> str:
+    """TDL formula matching any of the given ledger names (XML-escaped)."""
+    clauses = [f'$Name = "{name}"' for name in names]
+    return escape(" OR ".join(clauses))
+
+
+def render_party_ledgers_request(names: list[str], company: str) -> str:
+    return Template(PARTY_LEDGERS_TEMPLATE).render(company=escape(company), name_filter=name_filter(names))
+
+
+def fetch_party_ledgers(client: TallyClient, names: Iterable[str], batch_size: int = BATCH_SIZE) -> dict[str, dict]:
+    """
+    Fetch the named ledgers from Tally.
+
+    Names containing a double quote cannot be expressed in the TDL filter and
+    are skipped. Names Tally does not know are simply absent from the result.
+
+    Returns:
+        Ledger name -> parse_party_ledgers() dict
+    """
+    wanted = sorted({n for n in names if n and '"' not in n})
+    found: dict[str, dict] = {}
+    for i in range(0, len(wanted), batch_size):
+        xml = render_party_ledgers_request(wanted[i:i + batch_size], client.company)
+        for ledger in parse_party_ledgers(client.post_xml(xml)):
+            found[ledger["name"]] = ledger
+    return found
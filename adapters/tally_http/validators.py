@@ -1,5 +1,6 @@
 from __future__ import annotations
 import re
+from functools import cached_property
 from lxml import etree
 
 class TallyHTTPError(RuntimeError):
@@ -22,15 +23,37 @@ def sanitize_xml(xml_string: str) -> str:
     
     return xml_string
 
+class TallyResponse(str):
+    """
+    Response text from Tally that is sanitized and parsed at most once.
+
+    Behaves as the plain response string. TallyClient.post_xml returns one, so
+    the status check and the parsers (through xml_root) share the same tree
+    instead of each sanitizing and parsing the payload again. Parsers only read
+    the tree; don't modify it.
+    """
+
+    @cached_property
+    def sanitized(self) -> str:
+        return sanitize_xml(str(self))
+
+    @cached_property
+    def root(self) -> etree._Element:
+        return etree.fromstring(self.sanitized.encode("utf-8"))
+
+def xml_root(xml_text: str) -> etree._Element:
+    """Sanitize and parse a Tally response (reusing the tree of a TallyResponse)."""
+    if isinstance(xml_text, TallyResponse):
+        return xml_text.root
+    return etree.fromstring(sanitize_xml(xml_text).encode("utf-8"))
+
 def ensure_status_ok(xml_text: str) -> None:
     """
     Raises TallyHTTPError if <STATUS> is missing or not '1'.
     Some "empty" responses still have STATUS=1; that's OK (caller can treat it as no data).
     """
     try:
-        # Sanitize XML to remove invalid characters before parsing
-        sanitized = sanitize_xml(xml_text)
-        root = etree.fromstring(sanitized.encode("utf-8"))
+        root = xml_root(xml_text)
     except Exception as e:
         raise TallyHTTPError(f"Invalid XML from Tally: {e}") from e
 
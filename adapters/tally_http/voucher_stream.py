@@ -0,0 +1,103 @@
+"""
+Shared DayBook voucher stream.
+
+Fetches each date window from Tally once and parses it in a single pass over
+the VOUCHER elements, producing both the parse_daybook() voucher dicts
+(headers + inventory lines) and the parse_trn_bill_allocations() rows. The
+invoice, sales-line and receivables loaders consume the same VoucherWindow
+instead of each requesting and parsing the DayBook themselves.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Iterator
+from .adapter import _render, invoice_from_voucher, receipt_from_voucher
+from .ar_ap.parser import parse_voucher_bill_allocations
+from .client import TallyClient
+from .parser import parse_voucher
+from .validators import xml_root
+
+DAYBOOK_TEMPLATE_PATH = Path(__file__).resolve().parent / "requests" / "daybook.xml.j2"
+
+
+@dataclass
+class VoucherWindow:
+    from_date: date
+    to_date: date
+    vouchers: list[dict] = field(default_factory=list)   # parse_daybook() shape
+    bills: list[dict] = field(default_factory=list)      # parse_trn_bill_allocations() shape
+    strict: bool = False                                 # validate the built records
+
+    def invoices(self, include_types: set[str] | None = None):
+        """Invoices for all vouchers (or only the given voucher types)."""
+        for d in self.vouchers:
+            if include_types and d["vchtype"] not in include_types:
+                continue
+            yield invoice_from_voucher(d, self.strict)
+
+    def receipts(self):
+        """Receipts for the Receipt vouchers in the window."""
+        for d in self.vouchers:
+            if d["vchtype"] == "Receipt":
+                yield receipt_from_voucher(d, self.strict)
+
+
+def parse_daybook_window(xml_text: str) -> tuple[list[dict], list[dict]]:
+    """
+    Parse a DayBook response into (vouchers, bill_allocations) in one traversal.
+
+    Equivalent to (parse_daybook(xml), parse_trn_bill_allocations(xml)) but
+    sanitizes and builds the tree only once.
+    """
+    root = xml_root(xml_text)
+    vouchers: list[dict] = []
+    bills: list[dict] = []
+    for v in root.findall(".//VOUCHER"):
+        vouchers.append(parse_voucher(v))
+        bills.extend(parse_voucher_bill_allocations(v))
+    return vouchers, bills
+
+
+def date_windows(from_date: date, to_date: date, batch_days: int) -> Iterator[tuple[date, date]]:
+    """Consecutive [start, end] windows of at most batch_days covering the range."""
+    current = from_date
+    while current <= to_date:
+        end = min(current + timedelta(days=batch_days - 1), to_date)
+        yield current, end
+        current = end + timedelta(days=1)
+
+
+class VoucherStream:
+    """
+    Fetches DayBook windows from Tally, one request per window.
+
+    Windows already fetched by this stream are served from memory, so several
+    sinks can ask for the same dates without another Tally round trip.
+    """
+
+    def __init__(self, url: str, company: str, daybook_template: str | None = None, strict: bool = False):
+        self.client = TallyClient(url, company)
+        self.daybook_template = daybook_template or DAYBOOK_TEMPLATE_PATH.read_text(encoding="utf-8")
+        self.strict = strict
+        self._windows: dict[tuple[date, date], VoucherWindow] = {}
+        self.requests = 0
+
+    def fetch(self, from_date: date, to_date: date) -> VoucherWindow:
+        key = (from_date, to_date)
+        if key not in self._windows:
+            xml = _render(self.daybook_template, from_date=from_date, to_date=to_date, company=self.client.company)
+            vouchers, bills = parse_daybook_window(self.client.post_xml(xml))
+            self.requests += 1
+            self._windows[key] = VoucherWindow(from_date, to_date, vouchers, bills, self.strict)
+        return self._windows[key]
+
+    def clear(self) -> None:
+        """Drop cached windows."""
+        self._windows.clear()
+
+    def windows(self, from_date: date, to_date: date, batch_days: int = 15) -> Iterator[VoucherWindow]:
+        """Fetch the range window by window (released from the cache once yielded)."""
+        for start, end in date_windows(from_date, to_date, batch_days):
+            yield self.fetch(start, end)
+            self._windows.pop((start, end), None)
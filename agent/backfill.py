@@ -14,12 +14,13 @@ Usage:
 
 from datetime import date, timedelta
 import sys
-import psycopg
 from loguru import logger
 from pathlib import Path
-from adapters.tally_http.adapter import TallyHTTPAdapter
-from agent.settings import TALLY_URL, TALLY_COMPANY, DB_URL
-from agent.run import upsert_invoice, upsert_receipt
+from adapters.tally_http.adapter import TallyHTTPAdapter, route_records
+from agent.settings import TALLY_URL, TALLY_COMPANY
+from agent.db import connection
+from agent.run import load_invoices, upsert_receipt
+from agent.rollups import ensure_schema as ensure_rollup_schema, refresh_sales_rollups
 
 DAYBOOK_TEMPLATE = (
     Path(__file__).resolve().parents[1] / "adapters" / "tally_http" / "requests" / "daybook.xml.j2"
@@ -51,29 +52,29 @@ def backfill_date_range(start_date: date, end_date: date, dry_run: bool = False)
     total_receipts = 0
     days_with_data = 0
     
-    with psycopg.connect(DB_URL, autocommit=True) as conn:
+    with connection() as conn:
+        ensure_rollup_schema(conn)
         while current <= end_date:
             try:
-                day_invoices = 0
-                day_receipts = 0
+                # Fetch one day at a time (from_date = to_date); receipts are
+                # written as the vouchers are parsed, the day's invoices
+                # together so their previously stored dates are read in one query
+                invoices = []
+                counts = route_records(
+                    adapter.stream_vouchers(current, current),
+                    invoice=invoices.append,
+                    receipt=lambda rcpt: upsert_receipt(conn, rcpt),
+                )
+                _, touched_dates = load_invoices(conn, invoices)
+                refresh_sales_rollups(conn, touched_dates)
+                n_invoices, n_receipts = counts["invoices"], counts["receipts"]
                 
-                # Fetch one day at a time (from_date = to_date)
-                # This caches the vouchers in the adapter
-                for inv in adapter.fetch_invoices(current, current):
-                    upsert_invoice(conn, inv)
-                    day_invoices += 1
+                total_invoices += n_invoices
+                total_receipts += n_receipts
                 
-                # Extract receipts from cached data (no additional Tally request)
-                for rcpt in adapter.get_receipts_from_last_fetch():
-                    upsert_receipt(conn, rcpt)
-                    day_receipts += 1
-                
-                total_invoices += day_invoices
-                total_receipts += day_receipts
-                
-                if day_invoices > 0 or day_receipts > 0:
+                if n_invoices > 0 or n_receipts > 0:
                     days_with_data += 1
-                    logger.info(f"✓ {current}: {day_invoices} invoices, {day_receipts} receipts")
+                    logger.info(f"✓ {current}: {n_invoices} invoices, {n_receipts} receipts")
                 else:
                     logger.debug(f"  {current}: no data")
                     
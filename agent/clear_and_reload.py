@@ -13,14 +13,31 @@ Usage:
     
     # Dry run to see what would be deleted (doesn't actually delete or reload)
     python -m agent.clear_and_reload 2024-04-01 2024-10-13 --dry-run
+    
+    # Shadow reload: stage the fresh data first, then swap it in with one
+    # transaction (existing data stays readable until the swap)
+    python -m agent.clear_and_reload 2024-04-01 2024-10-13 --shadow
 """
 
 import sys
-import psycopg
-from datetime import date
+import asyncio
+from datetime import date, timedelta
 from loguru import logger
-from agent.settings import DB_URL
-from agent.backfill import parse_date, backfill_date_range
+from adapters.adapter_types import Invoice, Receipt
+from adapters.tally_http.adapter import TallyHTTPAdapter
+from agent.settings import TALLY_URL, TALLY_COMPANY
+from agent.db import connection
+from agent.backfill import parse_date, backfill_date_range, DAYBOOK_TEMPLATE
+from agent.run import upsert_customer
+from agent.rollups import ensure_schema as ensure_rollup_schema, rebuild_sales_rollups, refresh_sales_rollups
+
+INVOICE_COLUMNS = [
+    "invoice_id", "voucher_key", "vchtype", "date", "customer_id", "sp_id",
+    "subtotal", "tax", "total", "roundoff",
+]
+RECEIPT_COLUMNS = ["receipt_key", "date", "customer_id", "amount"]
+CUSTOMER_COLUMNS = ["customer_id", "customer_gstin", "customer_pincode", "customer_city"]
+STAGE_TABLES = {Invoice: ("stage_invoice", INVOICE_COLUMNS), Receipt: ("stage_receipt", RECEIPT_COLUMNS)}
 
 
 def clear_data(start_date: date, end_date: date, dry_run: bool = False):
@@ -31,7 +48,7 @@ def clear_data(start_date: date, end_date: date, dry_run: bool = False):
         logger.info("[DRY RUN] Would delete invoices in this date range")
         return 0
     
-    with psycopg.connect(DB_URL, autocommit=True) as conn:
+    with connection() as conn:
         with conn.cursor() as cur:
             cur.execute("""
                 DELETE FROM fact_invoice 
@@ -43,6 +60,173 @@ def clear_data(start_date: date, end_date: date, dry_run: bool = False):
             return deleted
 
 
+def _create_stage_tables(conn):
+    """
+    Session-local staging tables shaped like the fact tables (no indexes yet).
+
+    Pooled connections are reused, so tables left behind by a failed reload
+    (possibly with their primary keys already added) are dropped first.
+    """
+    with conn.cursor() as cur:
+        cur.execute("drop table if exists stage_invoice, stage_receipt")
+        cur.execute(f"""
+            create temp table stage_invoice as
+            select {", ".join(INVOICE_COLUMNS)} from fact_invoice with no data
+        """)
+        cur.execute(f"""
+            create temp table stage_receipt as
+            select {", ".join(RECEIPT_COLUMNS)} from fact_receipt with no data
+        """)
+
+
+def _copy_rows(conn, table: str, columns: list[str], rows: list[tuple]):
+    if not rows:
+        return
+    with conn.cursor() as cur:
+        with cur.copy(f"copy {table} ({', '.join(columns)}) from stdin") as copy:
+            for row in rows:
+                copy.write_row(row)
+
+
+def stage_date_range(conn, start_date: date, end_date: date) -> tuple[int, int]:
+    """
+    Fetch the range from Tally day by day and COPY it into the stage tables.
+    
+    Customers are upserted as they are seen (additive, and needed by the
+    foreign key before the swap); nothing else in the live tables changes.
+    
+    Returns:
+        Tuple of (staged_invoices, staged_receipts)
+    """
+    adapter = TallyHTTPAdapter(TALLY_URL, TALLY_COMPANY, DAYBOOK_TEMPLATE, include_types=set())
+    _create_stage_tables(conn)
+    staged = {Invoice: 0, Receipt: 0}
+    
+    async def stage_days():
+        current = start_date
+        while current <= end_date:
+            day = {Invoice: 0, Receipt: 0}
+            # Columnar batches go straight to COPY
+            async for batch in adapter.fetch_batches(current, current):
+                # upsert_customer skips customers the dimension cache already has
+                for customer in batch.rows(CUSTOMER_COLUMNS):
+                    upsert_customer(conn, *customer)
+                table, columns = STAGE_TABLES[batch.schema.record_type]
+                _copy_rows(conn, table, columns, list(batch.rows(columns)))
+                day[batch.schema.record_type] += len(batch)
+            for record_type, n in day.items():
+                staged[record_type] += n
+            if any(day.values()):
+                logger.info(f"✓ Staged {current}: {day[Invoice]} invoices, {day[Receipt]} receipts")
+            current += timedelta(days=1)
+    
+    asyncio.run(stage_days())
+    total_invoices, total_receipts = staged[Invoice], staged[Receipt]
+    
+    # Index the staged rows once, after the load; a voucher fetched twice
+    # keeps its last version
+    with conn.cursor() as cur:
+        cur.execute("""
+            delete from stage_invoice a using stage_invoice b
+            where a.invoice_id = b.invoice_id and a.ctid < b.ctid
+        """)
+        cur.execute("""
+            delete from stage_receipt a using stage_receipt b
+            where a.receipt_key = b.receipt_key and a.ctid < b.ctid
+        """)
+        cur.execute("alter table stage_invoice add primary key (invoice_id)")
+        cur.execute("alter table stage_receipt add primary key (receipt_key)")
+        cur.execute("analyze stage_invoice")
+        cur.execute("analyze stage_receipt")
+    
+    return total_invoices, total_receipts
+
+
+def swap_in_staged(conn, start_date: date, end_date: date) -> dict:
+    """
+    Replace the range in fact_invoice / fact_receipt with the staged rows in
+    a single transaction, together with the range's sales rollups and those
+    of the days staged invoices are moving away from.
+    
+    Only rows that actually differ are touched: invoices missing from the
+    stage are deleted, changed ones updated, new ones inserted. Unchanged
+    rows (usually the vast majority) produce no dead tuples.
+    
+    Returns:
+        Dict with deleted/upserted counts
+    """
+    counts = {}
+    update_cols = [c for c in INVOICE_COLUMNS if c not in ("invoice_id", "voucher_key", "sp_id")]
+    with conn.transaction():
+        with conn.cursor() as cur:
+            cur.execute("""
+                delete from fact_invoice f
+                where f.date >= %s and f.date <= %s
+                  and not exists (select 1 from stage_invoice s where s.invoice_id = f.invoice_id)
+            """, (start_date, end_date))
+            counts["invoices_deleted"] = cur.rowcount
+            
+            # The upsert moves re-dated invoices; their old days need refreshing too
+            cur.execute("""
+                select distinct f.date from fact_invoice f join stage_invoice s using (invoice_id)
+            """)
+            touched_dates = {d for d, in cur.fetchall() if d}
+            
+            cur.execute(f"""
+                insert into fact_invoice ({", ".join(INVOICE_COLUMNS)})
+                select {", ".join(INVOICE_COLUMNS)} from stage_invoice
+                on conflict (invoice_id) do update set
+                  {", ".join(f"{c}=excluded.{c}" for c in update_cols)}
+                where ({", ".join(f"fact_invoice.{c}" for c in update_cols)})
+                  is distinct from ({", ".join(f"excluded.{c}" for c in update_cols)})
+            """)
+            counts["invoices_upserted"] = cur.rowcount
+            
+            cur.execute("""
+                insert into fact_receipt (receipt_key, date, customer_id, amount)
+                select receipt_key, date, customer_id, amount from stage_receipt
+                on conflict (receipt_key) do update set
+                  date=excluded.date,
+                  customer_id=excluded.customer_id,
+                  amount=excluded.amount
+                where (fact_receipt.date, fact_receipt.customer_id, fact_receipt.amount)
+                  is distinct from (excluded.date, excluded.customer_id, excluded.amount)
+            """)
+            counts["receipts_upserted"] = cur.rowcount
+        
+        # Same transaction, so dashboards never see facts and rollups disagree
+        touched_dates.update(start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1))
+        refresh_sales_rollups(conn, touched_dates)
+    
+    with conn.cursor() as cur:
+        cur.execute("drop table if exists stage_invoice, stage_receipt")
+    return counts
+
+
+def shadow_reload(start_date: date, end_date: date, dry_run: bool = False):
+    """Stage the range from Tally, then swap it in atomically."""
+    logger.info(f"Shadow reload from {start_date} to {end_date}")
+    
+    if dry_run:
+        logger.info("[DRY RUN] Would stage and swap in data for this range")
+        return
+    
+    with connection() as conn:
+        ensure_rollup_schema(conn)
+        
+        logger.info("Step 1/2: Staging fresh data...")
+        invoices, receipts = stage_date_range(conn, start_date, end_date)
+        logger.info(f"✓ Staged {invoices} invoices and {receipts} receipts")
+        
+        logger.info("Step 2/2: Swapping staged data in...")
+        counts = swap_in_staged(conn, start_date, end_date)
+        logger.info(
+            f"✓ Deleted {counts['invoices_deleted']} invoices, "
+            f"wrote {counts['invoices_upserted']} new/changed invoices "
+            f"and {counts['receipts_upserted']} receipts"
+        )
+
+
 def main():
     if len(sys.argv) < 3:
         print(__doc__)
@@ -53,6 +237,7 @@ def main():
     
     # Parse flags
     dry_run = "--dry-run" in sys.argv
+    shadow = "--shadow" in sys.argv
     
     if dry_run:
         logger.warning("DRY RUN MODE - No data will be deleted or written")
@@ -66,16 +251,29 @@ def main():
         logger.warning(f"End date {end_date} is in the future, using today instead")
         end_date = date.today()
     
+    if shadow:
+        shadow_reload(start_date, end_date, dry_run)
+        logger.success(f"✓ Shadow reload complete!")
+        return
+    
     logger.info(f"Clear and reload: {start_date} to {end_date}")
     
     # Step 1: Clear existing data
-    logger.info("Step 1/2: Clearing existing data...")
+    logger.info("Step 1/3: Clearing existing data...")
     deleted = clear_data(start_date, end_date, dry_run)
     
     # Step 2: Reload data
-    logger.info("Step 2/2: Reloading fresh data...")
+    logger.info("Step 2/3: Reloading fresh data...")
     backfill_date_range(start_date, end_date, dry_run)
     
+    # Step 3: Rebuild rollups for the whole range (days left empty after
+    # the reload are never touched by the backfill itself)
+    logger.info("Step 3/3: Rebuilding sales rollups...")
+    if not dry_run:
+        with connection() as conn:
+            ensure_rollup_schema(conn)
+            rebuild_sales_rollups(conn, start_date, end_date)
+    
     logger.success(f"✓ Clear and reload complete!")
 
 
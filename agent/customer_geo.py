@@ -0,0 +1,92 @@
+"""
+Customer geo enrichment - resolve dim_customer.pincode against dim_pincode
+once and store state / district / lat / lon on dim_customer.
+
+Runs after the customer upserts in agent.run and agent.nightly; only customers
+whose pincode changed since their last enrichment are touched, plus (when the
+pincode table is refreshed) customers on pincodes whose geo data changed.
+Geo dashboards read the denormalized columns instead of joining dim_pincode
+and normalizing pincode strings at query time.
+
+Usage:
+    # Enrich customers whose pincode changed
+    python -m agent.customer_geo
+
+    # Re-enrich every customer
+    python -m agent.customer_geo --all
+"""
+from __future__ import annotations
+from typing import Iterable
+from loguru import logger
+from agent.db import connection
+from agent.migrations import ensure_migrations
+
+
+def ensure_schema(conn) -> None:
+    """Ensure dim_pincode and the dim_customer geo columns exist."""
+    ensure_migrations(conn, "0003_dim_pincode.sql", "0016_customer_geo.sql")
+
+
+def enrich_customer_geo(conn, *, refresh_pincodes: Iterable[str] | None = None, everything: bool = False) -> int:
+    """
+    Copy geo data from dim_pincode onto customers whose pincode changed.
+
+    Customer pincodes are matched on their digits only ("400 001" -> "400001").
+    Customers whose pincode has no dim_pincode row get NULL geo columns and
+    are not retried until their pincode changes (or refresh_pincodes / --all).
+
+    Args:
+        refresh_pincodes: Also re-enrich customers on these dim_pincode pincodes
+            (e.g. the rows load_pincode_data just changed)
+        everything: Re-enrich all customers
+
+    Returns:
+        Number of customers updated
+    """
+    refresh = sorted(set(refresh_pincodes or []))
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            with pending as (
+              select c.customer_id, c.pincode,
+                     p.state, p.city as district, p.lat, p.lon
+              from dim_customer c
+              left join dim_pincode p
+                on p.pincode = nullif(regexp_replace(c.pincode, '[^0-9]', '', 'g'), '')
+              where c.pincode is distinct from c.geo_pincode
+                 or %(everything)s
+                 or (cardinality(%(refresh)s::text[]) > 0
+                     and regexp_replace(c.pincode, '[^0-9]', '', 'g') = any(%(refresh)s::text[]))
+            )
+            update dim_customer c
+            set state = pending.state,
+                district = pending.district,
+                lat = pending.lat,
+                lon = pending.lon,
+                geo_pincode = pending.pincode,
+                geo_updated_at = now()
+            from pending
+            where pending.customer_id = c.customer_id
+            """,
+            {"everything": everything, "refresh": refresh},
+        )
+        updated = cur.rowcount
+    if updated:
+        logger.info(f"Geo-enriched {updated} customers")
+    return updated
+
+
+def main(argv: list[str] | None = None) -> None:
+    import argparse
+    parser = argparse.ArgumentParser("customer-geo", description="Denormalize pincode geo data onto dim_customer")
+    parser.add_argument("--all", dest="everything", action="store_true", help="Re-enrich every customer")
+    args = parser.parse_args(argv)
+
+    with connection() as conn:
+        ensure_schema(conn)
+        updated = enrich_customer_geo(conn, everything=args.everything)
+    logger.success(f"✓ Customer geo enrichment: {updated} customers updated")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Shared Postgres connection pool.
+
+Agent loaders borrow autocommit connections from one psycopg_pool pool per
+database URL per process instead of calling psycopg.connect per run or per
+batch. Connections stay open between borrowers, so their session state
+carries over:
+statements run DB_PREPARE_THRESHOLD times become server-side prepared
+statements, and temp staging tables (agent.sales_lines_from_vreg) are created
+once per connection rather than once per batch.
+
+Pool size comes from DB_POOL_MIN / DB_POOL_MAX (agent.settings); keep
+DB_POOL_MAX at or above the number of concurrent workers.
+
+Usage:
+    from agent.db import connection
+
+    with connection() as conn:
+        ...
+"""
+from __future__ import annotations
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+import psycopg
+from psycopg_pool import ConnectionPool
+from agent.settings import DB_URL, DB_POOL_MIN, DB_POOL_MAX, DB_PREPARE_THRESHOLD
+
+_pools: dict[str, ConnectionPool] = {}
+_lock = threading.Lock()
+
+
+def get_pool(db_url: str = DB_URL) -> ConnectionPool:
+    """The process-wide pool for db_url, opened on first use."""
+    with _lock:
+        pool = _pools.get(db_url)
+        if pool is None or pool.closed:
+            pool = _pools[db_url] = ConnectionPool(
+                db_url,
+                min_size=DB_POOL_MIN,
+                max_size=max(DB_POOL_MIN, DB_POOL_MAX),
+                kwargs={"autocommit": True, "prepare_threshold": DB_PREPARE_THRESHOLD},
+                check=ConnectionPool.check_connection,
+                name="agent",
+                open=True,
+            )
+    return pool
+
+
+@contextmanager
+def connection(db_url: str = DB_URL) -> Iterator[psycopg.Connection]:
+    """Borrow an autocommit connection from the shared pool for db_url."""
+    with get_pool(db_url).connection() as conn:
+        yield conn
+
+
+def close_pools() -> None:
+    """Close the shared pools (a later connection() opens new ones)."""
+    with _lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
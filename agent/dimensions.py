@@ -0,0 +1,155 @@
+"""
+Dimension lookup cache.
+
+Name-to-id maps for dim_item, dim_customer and dim_ledger_group, loaded from
+the warehouse once per run (lazily, on first use) and kept up to date by the
+loaders that write those tables. Fact loaders resolve surrogate keys here in
+Python instead of joining on lower(name) or upserting the dimension row for
+every invoice.
+
+The cache assumes the process's own writes commit (the loaders use
+autocommit); call cache.invalidate() after anything that rewrites a dimension
+outside these helpers.
+"""
+from __future__ import annotations
+import threading
+from typing import Iterable
+from loguru import logger
+from agent.migrations import ensure_migrations
+
+DIMENSIONS = ("items", "customers", "ledger_groups")
+
+
+def ensure_schema(conn) -> None:
+    """Ensure the lower(name) dimension indexes exist."""
+    ensure_migrations(conn, "0013_dimension_name_indexes.sql")
+
+
+class DimensionCache:
+    """Per-process cache of dimension keys (see module docstring)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.items: dict[str, str] | None = None                                     # lower(name) -> item_id
+        self.customers: dict[str, tuple[str | None, str | None, str | None]] | None = None  # customer_id -> (gstin, pincode, city)
+        self.ledger_groups: dict[str, int] | None = None                             # name -> ledger_group_id
+        self.ledger_group_guids: dict[str, int] | None = None                        # guid -> ledger_group_id
+
+    def invalidate(self, *dims: str) -> None:
+        """Drop the given dimensions (all if none given); they reload on next use."""
+        unknown = set(dims) - set(DIMENSIONS)
+        if unknown:
+            raise ValueError(f"Unknown dimensions: {sorted(unknown)}. Valid: {', '.join(DIMENSIONS)}")
+        with self._lock:
+            for dim in dims or DIMENSIONS:
+                setattr(self, dim, None)
+                if dim == "ledger_groups":
+                    self.ledger_group_guids = None
+
+    # -- items ---------------------------------------------------------------
+
+    def item_ids(self, conn) -> dict[str, str]:
+        """lower(name) -> dim_item.item_id."""
+        if self.items is None:
+            with self._lock:
+                if self.items is None:
+                    with conn.cursor() as cur:
+                        cur.execute("select lower(name), item_id from dim_item where name is not null")
+                        self.items = {name: item_id for name, item_id in cur.fetchall()}
+                    logger.debug(f"Dimension cache: loaded {len(self.items)} items")
+        return self.items
+
+    def note_items(self, items: Iterable[tuple[str, str | None]]) -> None:
+        """Record (item_id, name) pairs just written to dim_item."""
+        if self.items is None:
+            return
+        for item_id, name in items:
+            if name:
+                self.items[name.lower()] = item_id
+
+    # -- customers -----------------------------------------------------------
+
+    def _customer_map(self, conn) -> dict[str, tuple[str | None, str | None, str | None]]:
+        if self.customers is None:
+            with self._lock:
+                if self.customers is None:
+                    with conn.cursor() as cur:
+                        cur.execute("select customer_id, gstin, pincode, city from dim_customer")
+                        self.customers = {r[0]: (r[1], r[2], r[3]) for r in cur.fetchall()}
+                    logger.debug(f"Dimension cache: loaded {len(self.customers)} customers")
+        return self.customers
+
+    def missing_customers(self, conn, customer_ids: Iterable[str]) -> set[str]:
+        """The given customer_ids that are not in dim_customer yet."""
+        customers = self._customer_map(conn)
+        return {c for c in customer_ids if c and c not in customers}
+
+    def ensure_customer(
+        self,
+        conn,
+        customer_id: str,
+        gstin: str | None = None,
+        pincode: str | None = None,
+        city: str | None = None,
+    ) -> bool:
+        """
+        Ensure customer_id exists in dim_customer with the given details.
+
+        Matches the previous per-invoice upsert (details only fill in or
+        replace with non-null values) but skips the round trip when the cached
+        row already has them.
+
+        Returns:
+            True if dim_customer was written
+        """
+        customers = self._customer_map(conn)
+        new = (gstin, pincode, city)
+        known = customers.get(customer_id)
+        if known is not None and all(n is None or n == k for n, k in zip(new, known)):
+            return False
+
+        with conn.cursor() as cur:
+            cur.execute("""
+              insert into dim_customer (customer_id, name, gstin, pincode, city)
+              values (%s, %s, %s, %s, %s)
+              on conflict (customer_id) do update set
+                gstin = COALESCE(excluded.gstin, dim_customer.gstin),
+                pincode = COALESCE(excluded.pincode, dim_customer.pincode),
+                city = COALESCE(excluded.city, dim_customer.city)
+            """, (customer_id, customer_id, gstin, pincode, city))
+        known = known or (None, None, None)
+        customers[customer_id] = tuple(n if n is not None else k for n, k in zip(new, known))
+        return True
+
+    # -- ledger groups -------------------------------------------------------
+
+    def ledger_group_ids(self, conn) -> dict[str, int]:
+        """dim_ledger_group name -> ledger_group_id."""
+        if self.ledger_groups is None:
+            with self._lock:
+                if self.ledger_groups is None:
+                    with conn.cursor() as cur:
+                        cur.execute("select ledger_group_id, guid, name from dim_ledger_group")
+                        rows = cur.fetchall()
+                    self.ledger_group_guids = {guid: gid for gid, guid, _ in rows if guid}
+                    self.ledger_groups = {name: gid for gid, _, name in rows}
+                    logger.debug(f"Dimension cache: loaded {len(rows)} ledger groups")
+        return self.ledger_groups
+
+    def ledger_group_id(self, conn, *, guid: str | None = None, name: str | None = None) -> int | None:
+        """Look up a ledger group by GUID if given, else by name."""
+        by_name = self.ledger_group_ids(conn)
+        if guid:
+            return self.ledger_group_guids.get(guid)
+        return by_name.get(name)
+
+    def note_ledger_group(self, ledger_group_id: int, guid: str | None, name: str) -> None:
+        """Record a row just written to dim_ledger_group."""
+        if self.ledger_groups is None:
+            return
+        self.ledger_groups[name] = ledger_group_id
+        if guid:
+            self.ledger_group_guids[guid] = ledger_group_id
+
+
+cache = DimensionCache()
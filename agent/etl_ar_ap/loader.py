@@ -2,13 +2,13 @@ from __future__ import annotations
 from datetime import date, timedelta
 from time import sleep
 from loguru import logger
-import psycopg
 from adapters.tally_http.ar_ap.adapter import TallyARAPAdapter
+from adapters.tally_http.voucher_stream import VoucherStream
 from adapters.tally_http.ar_ap.parser import (
     parse_opening_bill_allocations,
-    parse_trn_bill_allocations,
     parse_outstanding_receivables,
 )
+from agent.db import connection
 
 
 def upsert_opening_bills(conn, rows: list[dict]) -> int:
@@ -45,7 +45,7 @@ def run_mst_opening_bill_allocation_pipeline(db_url: str, tally_url: str, tally_
     xml = adapter.fetch_ledgers_with_opening_bills_xml()
     rows = parse_opening_bill_allocations(xml)
     logger.info(f"Parsed opening bill allocations: {len(rows)}")
-    with psycopg.connect(db_url, autocommit=True) as conn:
+    with connection(db_url) as conn:
         count = upsert_opening_bills(conn, rows)
         logger.info(f"Inserted opening bill allocations: {count}")
         return count
@@ -62,29 +62,76 @@ def load_stg_trn_bill(conn, rows: list[dict]) -> int:
     with conn.cursor() as cur:
         # Truncate staging table
         cur.execute("truncate table stg_trn_bill")
-        
-        # Insert all rows
-        inserted = 0
-        for r in rows:
+        return _insert_stg_trn_bill(cur, rows)
+
+
+def _insert_stg_trn_bill(cur, rows: list[dict]) -> int:
+    inserted = 0
+    for r in rows:
+        cur.execute(
+            """
+            insert into stg_trn_bill (
+              voucher_guid, voucher_date, ledger, bill_name, amount, billtype, bill_credit_period
+            ) values (%s,%s,%s,%s,%s,%s,%s)
+            """,
+            (
+                r.get("voucher_guid"),
+                r.get("voucher_date"),
+                r.get("ledger"),
+                r.get("bill_name"),
+                r.get("amount", 0.0),
+                r.get("billtype"),
+                r.get("bill_credit_period"),
+            ),
+        )
+        inserted += 1
+    return inserted
+
+
+def replace_bill_window(conn, from_date: date, to_date: date, rows: list[dict]) -> tuple[int, int]:
+    """
+    Receivables sink for a shared voucher window.
+    
+    Replaces the stg_trn_bill and tally_loader.trn_voucher / trn_bill rows of
+    vouchers dated in [from_date, to_date] (or re-exported with a new date)
+    with ``rows``, leaving other dates untouched. Call
+    rebuild_fact_bills_receivable() once all windows are loaded.
+    
+    Returns:
+        Tuple of (voucher_rows, bill_rows) written to tally_loader tables
+    """
+    guids = sorted({r["voucher_guid"] for r in rows if r.get("voucher_guid")})
+    with conn.transaction():
+        with conn.cursor() as cur:
+            cur.execute(
+                "delete from stg_trn_bill where voucher_date between %s and %s or voucher_guid = any(%s)",
+                (from_date, to_date, guids),
+            )
             cur.execute(
                 """
-                insert into stg_trn_bill (
-                  voucher_guid, voucher_date, ledger, bill_name, amount, billtype, bill_credit_period
-                ) values (%s,%s,%s,%s,%s,%s,%s)
+                delete from tally_loader.trn_bill b
+                using tally_loader.trn_voucher v
+                where v.guid = b.guid and (v.date between %s and %s or v.guid = any(%s))
                 """,
-                (
-                    r.get("voucher_guid"),
-                    r.get("voucher_date"),
-                    r.get("ledger"),
-                    r.get("bill_name"),
-                    r.get("amount", 0.0),
-                    r.get("billtype"),
-                    r.get("bill_credit_period"),
-                ),
+                (from_date, to_date, guids),
             )
-            inserted += 1
-    
-    return inserted
+            cur.execute(
+                "delete from tally_loader.trn_voucher where date between %s and %s or guid = any(%s)",
+                (from_date, to_date, guids),
+            )
+            _insert_stg_trn_bill(cur, rows)
+        return load_tally_loader_trn_tables(conn, rows)
+
+
+def rebuild_fact_bills_receivable(conn) -> int:
+    """
+    Recompute fact_bills_receivable from the tally_loader tables in one
+    transaction (settled bills drop out; readers never see it empty).
+    """
+    with conn.transaction():
+        with conn.cursor() as cur:
+            cur.execute("delete from fact_bills_receivable")
+        return upsert_fact_bills_receivable(conn)
 
 
 def load_tally_loader_trn_tables(conn, rows: list[dict]) -> tuple[int, int]:
@@ -377,7 +424,7 @@ def run_bills_receivable_pipeline(
     Args:
         batch_days: Number of days per batch (default 30 to avoid timeouts)
     """
-    adapter = TallyARAPAdapter(tally_url, tally_company)
+    stream = VoucherStream(tally_url, tally_company)
     
     # Process in batches to avoid Tally crashes
     all_rows: list[dict] = []
@@ -390,8 +437,8 @@ def run_bills_receivable_pipeline(
         logger.info(f"Fetching batch: {current_date} to {batch_end}")
         
         try:
-            xml = adapter.fetch_vouchers_with_bills_xml(current_date, batch_end)
-            batch_rows = parse_trn_bill_allocations(xml)
+            batch_rows = stream.fetch(current_date, batch_end).bills
+            stream.clear()  # only the bill rows are kept
             all_rows.extend(batch_rows)
             logger.info(f"  Parsed {len(batch_rows)} bill allocation rows (total: {len(all_rows)})")
         except Exception as e:
@@ -407,7 +454,7 @@ def run_bills_receivable_pipeline(
     
     logger.info(f"Total bill allocation rows collected: {len(all_rows)}")
     
-    with psycopg.connect(db_url, autocommit=True) as conn:
+    with connection(db_url) as conn:
         # Optionally reset fact and auxiliary tables to avoid stale rows
         if reset_fact:
             with conn.cursor() as cur:
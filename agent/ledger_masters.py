@@ -17,11 +17,13 @@ Usage:
 
 import sys
 from pathlib import Path
-import psycopg
 from loguru import logger
 from adapters.tally_http.ledgers_parser import parse_ledger_masters
 from adapters.tally_http.client import TallyClient
-from agent.settings import DB_URL, TALLY_URL, TALLY_COMPANY
+from agent.settings import TALLY_URL, TALLY_COMPANY
+from agent.db import connection
+from agent.dimensions import cache as dimension_cache, ensure_schema as ensure_dimension_indexes
+from agent.migrations import ensure_migrations
 
 
 def load_xml_file(file_path: str) -> str:
@@ -73,14 +75,9 @@ def fetch_ledgers_from_tally(company: str) -> str:
 
 def ensure_schema(conn):
     """Ensure required tables exist."""
-    migration_file = Path(__file__).parents[1] / "warehouse" / "migrations" / "0007_ledger_masters.sql"
-    if migration_file.exists():
-        sql = migration_file.read_text(encoding="utf-8")
-        with conn.cursor() as cur:
-            cur.execute(sql)
-        logger.info("Schema validated/created")
-    else:
-        logger.warning(f"Migration file not found: {migration_file}")
+    ensure_migrations(conn, "0007_ledger_masters.sql")
+    ensure_dimension_indexes(conn)
+    logger.info("Schema validated/created")
 
 
 def upsert_ledger_groups(conn, groups: list[dict]) -> tuple[int, int]:
@@ -97,12 +94,7 @@ def upsert_ledger_groups(conn, groups: list[dict]) -> tuple[int, int]:
     with conn.cursor() as cur:
         for group in groups:
             # Check if exists (by GUID if available, else by name)
-            if group["guid"]:
-                cur.execute("SELECT guid FROM dim_ledger_group WHERE guid = %s", (group["guid"],))
-                exists = cur.fetchone() is not None
-            else:
-                cur.execute("SELECT name FROM dim_ledger_group WHERE name = %s", (group["name"],))
-                exists = cur.fetchone() is not None
+            exists = dimension_cache.ledger_group_id(conn, guid=group["guid"], name=group["name"]) is not None
             
             # Upsert by GUID if available
             if group["guid"]:
@@ -114,6 +106,7 @@ def upsert_ledger_groups(conn, groups: list[dict]) -> tuple[int, int]:
                         parent_name = EXCLUDED.parent_name,
                         alter_id = EXCLUDED.alter_id,
                         updated_at = NOW()
+                    RETURNING ledger_group_id
                 """, (group["guid"], group["name"], group["parent_name"], group["alter_id"]))
             else:
                 # Fallback: upsert by name
@@ -124,7 +117,9 @@ def upsert_ledger_groups(conn, groups: list[dict]) -> tuple[int, int]:
                         parent_name = EXCLUDED.parent_name,
                         alter_id = EXCLUDED.alter_id,
                         updated_at = NOW()
+                    RETURNING ledger_group_id
                 """, (group["name"], group["parent_name"], group["alter_id"]))
+            dimension_cache.note_ledger_group(cur.fetchone()[0], group["guid"], group["name"])
             
             if exists:
                 updated += 1
@@ -138,6 +133,10 @@ def update_customer_ledger_groups(conn, ledgers: list[dict]) -> int:
     """
     Update dim_customer.ledger_group_name based on ledger parent assignments.
     
+    The ledger → group mapping is COPYed into an indexed temp table and
+    applied with two hash/index-friendly UPDATEs: customers matched by
+    customer_id first, then by name for customers whose id is not a ledger.
+    
     Args:
         conn: Database connection
         ledgers: List of ledger dicts with name and parent_name
@@ -145,39 +144,46 @@ def update_customer_ledger_groups(conn, ledgers: list[dict]) -> int:
     Returns:
         Number of customers updated
     """
-    if not ledgers:
+    # One group per ledger name (last one wins)
+    mapping = {l["name"]: l["parent_name"] for l in ledgers if l.get("name") and l.get("parent_name")}
+    if not mapping:
         return 0
     
     with conn.cursor() as cur:
-        # Create temp table with ledger → group mapping
         cur.execute("""
             CREATE TEMP TABLE IF NOT EXISTS ledger_to_group (
-                ledger_name text,
-                group_name text
+                ledger_name text PRIMARY KEY,
+                group_name text NOT NULL
             )
         """)
-        
-        # Clear and populate temp table
         cur.execute("TRUNCATE TABLE ledger_to_group")
+        with cur.copy("COPY ledger_to_group (ledger_name, group_name) FROM STDIN") as copy:
+            for row in mapping.items():
+                copy.write_row(row)
+        # Temp tables are never auto-analyzed; give the planner real row counts
+        cur.execute("ANALYZE ledger_to_group")
         
-        for ledger in ledgers:
-            if ledger.get("parent_name"):
-                cur.execute("""
-                    INSERT INTO ledger_to_group (ledger_name, group_name)
-                    VALUES (%s, %s)
-                """, (ledger["name"], ledger["parent_name"]))
-        
-        # Update dim_customer with ledger group
+        # Update dim_customer with ledger group: by customer_id ...
         cur.execute("""
             UPDATE dim_customer c
             SET ledger_group_name = ltg.group_name
             FROM ledger_to_group ltg
-            WHERE (c.customer_id = ltg.ledger_name OR c.name = ltg.ledger_name)
-              AND (c.ledger_group_name IS NULL OR c.ledger_group_name != ltg.group_name)
+            WHERE c.customer_id = ltg.ledger_name
+              AND c.ledger_group_name IS DISTINCT FROM ltg.group_name
         """)
-        
         updated_count = cur.rowcount
         
+        # ... then by name where the customer_id did not match a ledger
+        cur.execute("""
+            UPDATE dim_customer c
+            SET ledger_group_name = ltg.group_name
+            FROM ledger_to_group ltg
+            WHERE c.name = ltg.ledger_name
+              AND NOT EXISTS (SELECT 1 FROM ledger_to_group x WHERE x.ledger_name = c.customer_id)
+              AND c.ledger_group_name IS DISTINCT FROM ltg.group_name
+        """)
+        updated_count += cur.rowcount
+        
         # Clean up temp table
         cur.execute("DROP TABLE IF EXISTS ledger_to_group")
         
@@ -309,7 +315,7 @@ def main():
         return
     
     # Connect to DB and load data
-    with psycopg.connect(DB_URL, autocommit=True) as conn:
+    with connection() as conn:
         logger.info("Ensuring schema exists...")
         ensure_schema(conn)
         
@@ -0,0 +1,109 @@
+"""
+Warehouse migration runner.
+
+Applies warehouse/migrations/NNNN_*.sql files and records each one, with a
+checksum of its contents, in schema_version. Loaders call ensure_migrations()
+at startup; a file already recorded at the same checksum costs one indexed
+lookup instead of re-running its DDL (and taking its locks against readers).
+
+A file whose checksum changed since it was recorded is applied again: the
+migrations are written to be idempotent, so editing one in place still reaches
+existing databases.
+
+Usage:
+    # Apply all pending migrations in order
+    python -m agent.migrations
+
+    # List applied / pending migrations
+    python -m agent.migrations --status
+"""
+from __future__ import annotations
+import hashlib
+from pathlib import Path
+from loguru import logger
+from agent.db import connection
+
+MIGRATIONS_DIR = Path(__file__).resolve().parents[1] / "warehouse" / "migrations"
+
+
+def checksum(sql: str) -> str:
+    return hashlib.sha256(sql.encode("utf-8")).hexdigest()
+
+
+def _ensure_version_table(cur) -> None:
+    cur.execute("""
+        create table if not exists schema_version (
+          name text primary key,
+          checksum text not null,
+          applied_at timestamptz not null default now()
+        )
+    """)
+
+
+def _recorded(cur, names: list[str]) -> dict[str, str]:
+    cur.execute("select name, checksum from schema_version where name = any(%s)", (names,))
+    return {name: sha for name, sha in cur.fetchall()}
+
+
+def ensure_migrations(conn, *names: str, force: bool = False) -> list[str]:
+    """
+    Apply the given migration files (in the order given) unless already
+    recorded at their current checksum; force=True applies them regardless.
+
+    Returns:
+        Names of the files that were executed
+    """
+    scripts = {name: (MIGRATIONS_DIR / name).read_text(encoding="utf-8") for name in names}
+    applied = []
+    with conn.cursor() as cur:
+        _ensure_version_table(cur)
+        recorded = {} if force else _recorded(cur, list(names))
+        for name, sql in scripts.items():
+            sha = checksum(sql)
+            if recorded.get(name) == sha:
+                continue
+            cur.execute(sql)
+            cur.execute("""
+                insert into schema_version (name, checksum) values (%s, %s)
+                on conflict (name) do update set checksum = excluded.checksum, applied_at = now()
+            """, (name, sha))
+            applied.append(name)
+            logger.info(f"Applied migration {name}")
+    return applied
+
+
+def migration_status(conn) -> dict[str, str]:
+    """name -> 'applied' | 'changed' | 'pending' for every file in warehouse/migrations."""
+    files = sorted(p.name for p in MIGRATIONS_DIR.glob("*.sql"))
+    with conn.cursor() as cur:
+        _ensure_version_table(cur)
+        recorded = _recorded(cur, files)
+    status = {}
+    for name in files:
+        if name not in recorded:
+            status[name] = "pending"
+        elif recorded[name] != checksum((MIGRATIONS_DIR / name).read_text(encoding="utf-8")):
+            status[name] = "changed"
+        else:
+            status[name] = "applied"
+    return status
+
+
+def main(argv: list[str] | None = None) -> None:
+    import argparse
+    parser = argparse.ArgumentParser("migrations", description="Apply warehouse/migrations once per checksum")
+    parser.add_argument("--status", action="store_true", help="List migrations without applying them")
+    args = parser.parse_args(argv)
+
+    with connection() as conn:
+        status = migration_status(conn)
+        if args.status:
+            for name, state in status.items():
+                print(f"{state:8} {name}")
+            return
+        applied = ensure_migrations(conn, *(name for name, state in status.items() if state != "applied"))
+        logger.success(f"✓ {len(applied)} migrations applied, {len(status) - len(applied)} already up to date")
+
+
+if __name__ == "__main__":
+    main()
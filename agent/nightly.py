@@ -0,0 +1,144 @@
+"""
+Nightly load - one DayBook extraction pass feeding every voucher sink.
+
+Each date window is requested from Tally once (adapters.tally_http.voucher_stream)
+and the parsed vouchers are fanned out to:
+  - invoices:    fact_invoice / fact_receipt        (agent.run), then customer geo
+                 enrichment (agent.customer_geo)
+  - lines:       fact_invoice_line                  (agent.sales_lines_from_vreg)
+  - receivables: tally_loader tables → fact_bills_receivable (agent.etl_ar_ap.loader)
+Sales rollups are refreshed once per window.
+
+Previously agent.run, sales-lines-from-vreg and run_bills_receivable each
+fetched and parsed the same DayBook.
+
+The receivables sink replaces only the windows it loads and then recomputes
+fact_bills_receivable from the full tally_loader history, so run
+run_bills_receivable once for the whole period before relying on it nightly.
+
+Usage:
+    # From the invoices checkpoint (minus one day) to today
+    python -m agent.nightly
+
+    # Explicit range / subset of sinks
+    python -m agent.nightly --from 2024-04-01 --to 2024-04-30 --sinks invoices,lines
+"""
+from __future__ import annotations
+from datetime import date, timedelta
+from time import sleep
+from loguru import logger
+from adapters.tally_http.voucher_stream import VoucherStream
+from agent.settings import TALLY_URL, TALLY_COMPANY
+from agent.db import connection
+from agent.run import DAYBOOK_TEMPLATE, get_checkpoint, load_invoices, load_receipts, set_checkpoint, log_run
+from agent.sales_lines_from_vreg import _ensure_migration as ensure_sales_lines_schema, load_sales_lines_window
+from agent.etl_ar_ap.loader import replace_bill_window, rebuild_fact_bills_receivable
+from agent.rollups import refresh_sales_rollups
+from agent.customer_geo import ensure_schema as ensure_geo_schema, enrich_customer_geo
+from agent.party_resolver import PartyResolver
+
+SINKS = ("invoices", "lines", "receivables")
+
+
+def run_nightly(
+    from_date: date,
+    to_date: date,
+    *,
+    sinks: tuple[str, ...] = SINKS,
+    batch_days: int = 15,
+    strict: bool = False,
+) -> dict:
+    """
+    Fetch [from_date, to_date] window by window and feed each window to the
+    selected sinks. strict=True validates every invoice/receipt record built
+    from the DayBook (slower; for debugging parser output).
+
+    Returns:
+        Dict of row counts per sink plus the number of Tally requests made
+    """
+    unknown = set(sinks) - set(SINKS)
+    if unknown:
+        raise ValueError(f"Unknown sinks: {sorted(unknown)}. Valid: {', '.join(SINKS)}")
+
+    stream = VoucherStream(TALLY_URL, TALLY_COMPANY, DAYBOOK_TEMPLATE, strict=strict)
+    resolver = PartyResolver(stream.client)
+    counts = {"invoices": 0, "receipts": 0, "lines": 0, "bills": 0, "tally_requests": 0}
+
+    with connection() as conn:
+        ensure_sales_lines_schema(conn)  # also ensures the rollup tables
+
+        for window in stream.windows(from_date, to_date, batch_days):
+            logger.info(f"📥 {window.from_date} to {window.to_date}: {len(window.vouchers)} vouchers")
+            touched_dates: set[date] = set()
+
+            if "invoices" in sinks:
+                n, dates = load_invoices(conn, window.invoices(), resolver)
+                counts["invoices"] += n
+                touched_dates |= dates
+                counts["receipts"] += load_receipts(conn, window.receipts())
+
+            if "lines" in sinks:
+                _, n, dates = load_sales_lines_window(conn, window)
+                counts["lines"] += n
+                touched_dates |= dates
+
+            if "receivables" in sinks:
+                _, n = replace_bill_window(conn, window.from_date, window.to_date, window.bills)
+                counts["bills"] += n
+
+            if touched_dates:
+                refresh_sales_rollups(conn, touched_dates)
+
+            # Small delay between batches to give Tally time to recover
+            if window.to_date < to_date:
+                sleep(1)
+
+        if "receivables" in sinks:
+            fact_count = rebuild_fact_bills_receivable(conn)
+            logger.info(f"Rebuilt fact_bills_receivable: {fact_count} rows")
+
+        if "invoices" in sinks:
+            ensure_geo_schema(conn)
+            counts["geo_customers"] = enrich_customer_geo(conn)
+            with conn.pipeline():  # one round trip for the bookkeeping writes
+                set_checkpoint(conn, "invoices", to_date)
+                set_checkpoint(conn, "receipts", to_date)
+                log_run(conn, "invoices", counts["invoices"], "ok")
+                log_run(conn, "receipts", counts["receipts"], "ok")
+
+    counts["tally_requests"] = stream.requests + resolver.requests
+    logger.success(f"✓ Nightly load {from_date} to {to_date}: {counts}")
+    return counts
+
+
+def main(argv: list[str] | None = None) -> None:
+    import argparse
+    parser = argparse.ArgumentParser("nightly", description="Single-pass DayBook load for all voucher sinks")
+    g = parser.add_mutually_exclusive_group()
+    g.add_argument("--lookback-days", type=int)
+    g.add_argument("--from", dest="from_date")
+    parser.add_argument("--to", dest="to_date")
+    parser.add_argument("--sinks", default=",".join(SINKS), help=f"Comma-separated subset of {','.join(SINKS)}")
+    parser.add_argument("--batch-days", type=int, default=15)
+    parser.add_argument("--strict", action="store_true", help="Validate every record built from the DayBook")
+    args = parser.parse_args(argv)
+
+    to_d = date.fromisoformat(args.to_date) if args.to_date else date.today()
+    if args.from_date:
+        from_d = date.fromisoformat(args.from_date)
+    elif args.lookback_days:
+        from_d = to_d - timedelta(days=args.lookback_days)
+    else:
+        with connection() as conn:
+            from_d = get_checkpoint(conn, "invoices") - timedelta(days=1)  # overlap for late edits
+
+    if from_d > to_d:
+        logger.error("Start date must be before or equal to end date")
+        raise SystemExit(1)
+
+    sinks = tuple(s.strip() for s in args.sinks.split(",") if s.strip())
+    run_nightly(from_d, to_d, sinks=sinks, batch_days=args.batch_days, strict=args.strict)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Lazy party master resolution for DayBook-only runs.
+
+Voucher loads create customers from the party name plus whatever the voucher
+carries. Before upserting a batch of invoices, PartyResolver looks up party
+names that are not yet in dim_customer (via the dimension cache) and fetches
+just those ledgers from Tally in one filtered collection request, so new
+customers arrive with GSTIN, pincode and ledger group without running the full
+ledger master export (agent.ledger_masters).
+"""
+from __future__ import annotations
+from typing import Iterable
+from loguru import logger
+from adapters.tally_http.client import TallyClient
+from adapters.tally_http.party_ledgers import fetch_party_ledgers
+from agent.dimensions import cache as dimension_cache
+from agent.ledger_masters import ensure_schema as ensure_ledger_schema
+
+
+class PartyResolver:
+    """Resolves unknown party ledgers against Tally, at most once per name per run."""
+
+    def __init__(self, client: TallyClient):
+        self.client = client
+        self._attempted: set[str] = set()
+        self._schema_ready = False
+        self.requests = 0
+
+    def resolve(self, conn, party_names: Iterable[str]) -> int:
+        """
+        Fetch and store master data for parties not yet in dim_customer.
+
+        Returns:
+            Number of customers created from ledger masters
+        """
+        missing = dimension_cache.missing_customers(conn, party_names) - self._attempted
+        if not missing:
+            return 0
+        self._attempted |= missing
+
+        try:
+            ledgers = fetch_party_ledgers(self.client, missing)
+            self.requests += 1
+        except Exception as e:
+            # Non-fatal: the invoices still create the customers from the voucher data
+            logger.warning(f"Could not resolve {len(missing)} party ledgers from Tally: {e}")
+            return 0
+
+        if ledgers and not self._schema_ready:
+            ensure_ledger_schema(conn)  # dim_customer.ledger_group_name
+            self._schema_ready = True
+
+        with conn.cursor() as cur:
+            for name, ledger in ledgers.items():
+                if name not in missing:
+                    continue
+                # city falls back to the state, as the voucher parser does
+                dimension_cache.ensure_customer(conn, name, ledger["gstin"], ledger["pincode"], ledger["state"])
+                if ledger["parent_name"]:
+                    cur.execute(
+                        """
+                        update dim_customer set ledger_group_name = %s
+                        where customer_id = %s and ledger_group_name is distinct from %s
+                        """,
+                        (ledger["parent_name"], name, ledger["parent_name"]),
+                    )
+
+        resolved = len(missing & ledgers.keys())
+        logger.info(f"Resolved {resolved}/{len(missing)} new parties from Tally ledger masters")
+        return resolved
@@ -0,0 +1,178 @@
+"""
+Sales rollups - pre-aggregated daily/monthly tables for dashboards.
+
+The loaders (agent.run, agent.backfill, sales-lines-from-vreg) call
+refresh_sales_rollups() with the invoice dates they touched; only those days
+(and the months containing them) are recomputed from fact_invoice /
+fact_invoice_line. An invoice re-dated in Tally touches its stored date as
+well as its new one (stored_invoice_dates), or the old day would keep
+counting it.
+
+Usage:
+    # Rebuild rollups for a date range
+    python -m agent.rollups --from 2024-04-01 --to 2025-03-31
+
+    # Rebuild the last 30 days
+    python -m agent.rollups --lookback-days 30
+"""
+from __future__ import annotations
+from datetime import date, timedelta
+from typing import Iterable
+from loguru import logger
+from agent.db import connection
+from agent.migrations import ensure_migrations
+
+
+def ensure_schema(conn) -> None:
+    """Ensure rollup tables exist."""
+    ensure_migrations(conn, "0012_sales_rollups.sql")
+
+
+def _months(dates: list[date]) -> list[date]:
+    """First-of-month dates covering the given dates."""
+    return sorted({d.replace(day=1) for d in dates})
+
+
+def stored_invoice_dates(conn, invoice_ids: Iterable[str]) -> set[date]:
+    """The dates fact_invoice currently holds for the given invoice_ids."""
+    ids = list({i for i in invoice_ids if i})
+    if not ids:
+        return set()
+    with conn.cursor() as cur:
+        cur.execute("select distinct date from fact_invoice where invoice_id = any(%s)", (ids,))
+        return {d for d, in cur.fetchall() if d}
+
+
+def refresh_sales_rollups(conn, dates: Iterable[date]) -> int:
+    """
+    Recompute the rollup tables for the given invoice dates.
+
+    Daily rows for those dates are replaced from the fact tables, then the
+    affected months are re-summed from the daily tables. Runs in a single
+    transaction so dashboards never see a half-refreshed day.
+
+    Returns:
+        Number of agg_sales_daily rows written
+    """
+    days = sorted({d for d in dates if d})
+    if not days:
+        return 0
+    months = _months(days)
+
+    with conn.transaction():
+        with conn.cursor() as cur:
+            cur.execute("delete from agg_invoice_daily where date = any(%s)", (days,))
+            cur.execute(
+                """
+                insert into agg_invoice_daily (date, vchtype, customer_id, invoice_count, subtotal, tax, total)
+                select fi.date,
+                       coalesce(fi.vchtype, ''),
+                       coalesce(fi.customer_id, ''),
+                       count(*),
+                       coalesce(sum(fi.subtotal), 0),
+                       coalesce(sum(fi.tax), 0),
+                       coalesce(sum(fi.total), 0)
+                from fact_invoice fi
+                where fi.date = any(%s)
+                group by 1, 2, 3
+                """,
+                (days,),
+            )
+
+            cur.execute("delete from agg_sales_daily where date = any(%s)", (days,))
+            cur.execute(
+                """
+                insert into agg_sales_daily (
+                  date, vchtype, customer_id, sku_name, sku_id, brand,
+                  invoice_count, line_count, qty, line_basic, line_tax, line_total
+                )
+                select fi.date,
+                       coalesce(fi.vchtype, ''),
+                       coalesce(fi.customer_id, ''),
+                       coalesce(fil.sku_name, ''),
+                       max(fil.sku_id),
+                       max(di.brand),
+                       count(distinct fi.invoice_id),
+                       count(*),
+                       coalesce(sum(fil.qty), 0),
+                       coalesce(sum(fil.line_basic), 0),
+                       coalesce(sum(fil.line_tax), 0),
+                       coalesce(sum(fil.line_total), 0)
+                from fact_invoice fi
+                join fact_invoice_line fil on fil.invoice_id = fi.invoice_id
+                left join dim_item di on di.item_id = fil.sku_id
+                where fi.date = any(%s)
+                group by 1, 2, 3, 4
+                """,
+                (days,),
+            )
+            written = cur.rowcount
+
+            cur.execute("delete from agg_invoice_monthly where month = any(%s)", (months,))
+            cur.execute(
+                """
+                insert into agg_invoice_monthly (month, vchtype, customer_id, invoice_count, subtotal, tax, total)
+                select date_trunc('month', date)::date, vchtype, customer_id,
+                       sum(invoice_count), sum(subtotal), sum(tax), sum(total)
+                from agg_invoice_daily
+                where date_trunc('month', date)::date = any(%s)
+                group by 1, 2, 3
+                """,
+                (months,),
+            )
+
+            cur.execute("delete from agg_sales_monthly where month = any(%s)", (months,))
+            cur.execute(
+                """
+                insert into agg_sales_monthly (
+                  month, vchtype, customer_id, sku_name, sku_id, brand,
+                  invoice_count, line_count, qty, line_basic, line_tax, line_total
+                )
+                select date_trunc('month', date)::date, vchtype, customer_id, sku_name,
+                       max(sku_id), max(brand),
+                       sum(invoice_count), sum(line_count), sum(qty),
+                       sum(line_basic), sum(line_tax), sum(line_total)
+                from agg_sales_daily
+                where date_trunc('month', date)::date = any(%s)
+                group by 1, 2, 3, 4
+                """,
+                (months,),
+            )
+
+    logger.info(f"📊 Refreshed sales rollups for {len(days)} day(s) / {len(months)} month(s)")
+    return written
+
+
+def rebuild_sales_rollups(conn, start_date: date, end_date: date) -> int:
+    """Recompute rollups for every day in [start_date, end_date]."""
+    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    return refresh_sales_rollups(conn, days)
+
+
+def main(argv: list[str] | None = None) -> None:
+    import argparse
+    parser = argparse.ArgumentParser("rollups", description="Rebuild sales rollup tables for a date range")
+    g = parser.add_mutually_exclusive_group()
+    g.add_argument("--lookback-days", type=int)
+    g.add_argument("--from", dest="from_date")
+    parser.add_argument("--to", dest="to_date")
+    args = parser.parse_args(argv)
+
+    to_d = date.fromisoformat(args.to_date) if args.to_date else date.today()
+    if args.from_date:
+        from_d = date.fromisoformat(args.from_date)
+    else:
+        from_d = to_d - timedelta(days=args.lookback_days or 7)
+
+    if from_d > to_d:
+        logger.error("Start date must be before or equal to end date")
+        raise SystemExit(1)
+
+    with connection() as conn:
+        ensure_schema(conn)
+        rows = rebuild_sales_rollups(conn, from_d, to_d)
+    logger.success(f"✓ Rebuilt sales rollups {from_d} to {to_d} ({rows} daily item rows)")
+
+
+if __name__ == "__main__":
+    main()
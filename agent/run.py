@@ -1,10 +1,14 @@
 from datetime import date, timedelta
 import sys
-import psycopg
 from loguru import logger
 from pathlib import Path
-from adapters.tally_http.adapter import TallyHTTPAdapter
-from agent.settings import TALLY_URL, TALLY_COMPANY, DB_URL
+from adapters.tally_http.voucher_stream import VoucherStream
+from agent.settings import TALLY_URL, TALLY_COMPANY
+from agent.db import connection
+from agent.rollups import ensure_schema as ensure_rollup_schema, refresh_sales_rollups, stored_invoice_dates
+from agent.dimensions import cache as dimension_cache
+from agent.party_resolver import PartyResolver
+from agent.customer_geo import ensure_schema as ensure_geo_schema, enrich_customer_geo
 
 DAYBOOK_TEMPLATE = (Path(__file__).resolve().parents[1] / "adapters" / "tally_http" / "requests" / "daybook.xml.j2").read_text(encoding="utf-8")
 
@@ -18,25 +22,13 @@ def get_checkpoint(conn, stream: str) -> date:
 def upsert_customer(conn, customer_id: str, gstin: str | None = None, 
                    pincode: str | None = None, city: str | None = None):
     """Ensure customer exists in dim_customer before inserting invoice.
-    Updates GSTIN, pincode, and city if provided and not already set."""
-    with conn.cursor() as cur:
-        cur.execute("""
-          insert into dim_customer (customer_id, name, gstin, pincode, city)
-          values (%s, %s, %s, %s, %s)
-          on conflict (customer_id) do update set
-            gstin = COALESCE(excluded.gstin, dim_customer.gstin),
-            pincode = COALESCE(excluded.pincode, dim_customer.pincode),
-            city = COALESCE(excluded.city, dim_customer.city)
-        """, (customer_id, customer_id, gstin, pincode, city))
+    Updates GSTIN, pincode, and city if provided and not already set.
+    Skips the database when the dimension cache already has those values."""
+    dimension_cache.ensure_customer(conn, customer_id, gstin, pincode, city)
 
 def upsert_invoice(conn, inv):
     # First ensure the customer exists with master data
-    # Extract customer details from invoice attributes if available
-    gstin = getattr(inv, "_customer_gstin", None)
-    pincode = getattr(inv, "_customer_pincode", None)
-    city = getattr(inv, "_customer_city", None)
-    
-    upsert_customer(conn, inv.customer_id, gstin, pincode, city)
+    upsert_customer(conn, inv.customer_id, inv.customer_gstin, inv.customer_pincode, inv.customer_city)
     
     with conn.cursor() as cur:
         cur.execute("""
@@ -58,11 +50,7 @@ def upsert_invoice(conn, inv):
 def upsert_receipt(conn, rcpt):
     """Insert or update a receipt in fact_receipt table."""
     # First ensure the customer exists with master data
-    gstin = getattr(rcpt, "_customer_gstin", None)
-    pincode = getattr(rcpt, "_customer_pincode", None)
-    city = getattr(rcpt, "_customer_city", None)
-    
-    upsert_customer(conn, rcpt.customer_id, gstin, pincode, city)
+    upsert_customer(conn, rcpt.customer_id, rcpt.customer_gstin, rcpt.customer_pincode, rcpt.customer_city)
     
     with conn.cursor() as cur:
         cur.execute("""
@@ -74,58 +62,88 @@ def upsert_receipt(conn, rcpt):
             amount=excluded.amount
         """, (rcpt.receipt_key, rcpt.date, rcpt.customer_id, rcpt.amount))
 
+def load_invoices(conn, invoices, resolver: PartyResolver | None = None) -> tuple[int, set[date]]:
+    """Upsert invoices; returns (count, invoice dates touched).
+
+    Touched dates include the dates already stored for these invoices, so a
+    re-dated invoice also refreshes the day it moved away from.
+
+    With a resolver, parties not yet in dim_customer are first fetched from
+    Tally's ledger masters in one batched request."""
+    count = 0
+    invoices = list(invoices)
+    touched_dates = stored_invoice_dates(conn, [inv.invoice_id for inv in invoices])
+    if resolver is not None:
+        resolver.resolve(conn, {inv.customer_id for inv in invoices})
+    for inv in invoices:
+        upsert_invoice(conn, inv); count += 1
+        touched_dates.add(inv.date)
+    return count, touched_dates
+
+def load_receipts(conn, receipts) -> int:
+    """Upsert receipts; returns count."""
+    count = 0
+    for rcpt in receipts:
+        upsert_receipt(conn, rcpt); count += 1
+    return count
+
+def set_checkpoint(conn, stream: str, last_date: date):
+    with conn.cursor() as cur:
+        cur.execute("""
+          insert into etl_checkpoints(stream_name,last_date) values(%s, %s)
+          on conflict(stream_name) do update set last_date=excluded.last_date, updated_at=now()
+        """, (stream, last_date))
+
 def log_run(conn, stream_name: str, rows: int, status: str, err: str | None = None):
     with conn.cursor() as cur:
         cur.execute("insert into etl_logs(stream_name, rows, status, error) values(%s,%s,%s,%s)",
                     (stream_name, rows, status, err))
 
 def main():
-    # Pass empty set to include ALL voucher types (Sales, Receipt, Payment, Journal, etc.)
-    adapter = TallyHTTPAdapter(TALLY_URL, TALLY_COMPANY, DAYBOOK_TEMPLATE, include_types=set())
-    with psycopg.connect(DB_URL, autocommit=True) as conn:
+    # One DayBook request for the window; ALL voucher types go to fact_invoice
+    # (Sales, Receipt, Payment, Journal, etc.) and receipts reuse the same data
+    stream = VoucherStream(TALLY_URL, TALLY_COMPANY, DAYBOOK_TEMPLATE)
+    with connection() as conn:
         # Process invoices (ALL vouchers go to fact_invoice)
         try:
             last = get_checkpoint(conn, "invoices")
             start = last - timedelta(days=1)  # overlap for late edits
             end = date.today()
-            count = 0
-            for inv in adapter.fetch_invoices(start, end):
-                upsert_invoice(conn, inv); count += 1
-            with conn.cursor() as cur:
-                cur.execute("""
-                  insert into etl_checkpoints(stream_name,last_date) values('invoices', %s)
-                  on conflict(stream_name) do update set last_date=excluded.last_date, updated_at=now()
-                """, (end,))
+            window = stream.fetch(start, end)
+            count, touched_dates = load_invoices(conn, window.invoices(), PartyResolver(stream.client))
+            ensure_rollup_schema(conn)
+            refresh_sales_rollups(conn, touched_dates)
+            set_checkpoint(conn, "invoices", end)
             log_run(conn, "invoices", count, "ok")
             logger.info(f"Invoices upserted: {count}")
         except Exception as e:
             log_run(conn, "invoices", 0, "error", str(e))
             raise
         
-        # ADDITIONALLY process receipts from cached data (no additional Tally request)
+        # ADDITIONALLY process receipts from the same window (no additional Tally request)
         try:
-            receipt_count = 0
-            for rcpt in adapter.get_receipts_from_last_fetch():
-                upsert_receipt(conn, rcpt)
-                receipt_count += 1
+            receipt_count = load_receipts(conn, window.receipts())
             
             # Update receipts checkpoint
-            with conn.cursor() as cur:
-                cur.execute("""
-                  insert into etl_checkpoints(stream_name,last_date) values('receipts', %s)
-                  on conflict(stream_name) do update set last_date=excluded.last_date, updated_at=now()
-                """, (end,))
+            set_checkpoint(conn, "receipts", end)
             log_run(conn, "receipts", receipt_count, "ok")
             logger.info(f"Receipts upserted: {receipt_count}")
         except Exception as e:
             log_run(conn, "receipts", 0, "error", str(e))
             raise
+        
+        # Geo columns for customers whose pincode changed in this run
+        ensure_geo_schema(conn)
+        enrich_customer_geo(conn)
 
 if __name__ == "__main__":
     # Lightweight subcommand shim to avoid disrupting existing behavior
     if len(sys.argv) > 1 and sys.argv[1] == "sales-lines-from-vreg":
         from agent.sales_lines_from_vreg import main as sales_lines_main
         sales_lines_main(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "nightly":
+        from agent.nightly import main as nightly_main
+        nightly_main(sys.argv[2:])
     else:
         main()
 
@@ -1,21 +1,47 @@
 from __future__ import annotations
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
 import re
-import psycopg
 from loguru import logger
 from pathlib import Path
-from adapters.tally_http.adapter import TallyHTTPAdapter
-from agent.settings import TALLY_URL, TALLY_COMPANY, DB_URL
+from adapters.tally_http.adapter import invoice_from_voucher
+from adapters.tally_http.voucher_stream import VoucherStream, VoucherWindow, date_windows
+from agent.settings import TALLY_URL, TALLY_COMPANY
+from agent.db import connection
+from agent.rollups import ensure_schema as ensure_rollup_schema, refresh_sales_rollups
+from agent.dimensions import cache as dimension_cache, ensure_schema as ensure_dimension_indexes
+from agent.migrations import ensure_migrations
 
 DAYBOOK_TEMPLATE = (Path(__file__).resolve().parents[1] / "adapters" / "tally_http" / "requests" / "daybook.xml.j2").read_text(encoding="utf-8")
 
+LINE_COLUMNS = ["invoice_id", "sku_id", "sku_name", "qty", "uom", "rate", "discount", "line_basic", "line_tax", "line_total"]
+CENT = Decimal("0.01")
+
 
 def _ensure_migration(conn) -> None:
-    sql_path = Path(__file__).resolve().parents[1] / "warehouse" / "migrations" / "0006_fact_invoice_line.sql"
-    sql = sql_path.read_text(encoding="utf-8")
-    with conn.cursor() as cur:
-        cur.execute(sql)
+    ensure_migrations(conn, "0006_fact_invoice_line.sql")
+    ensure_rollup_schema(conn)
+    ensure_dimension_indexes(conn)
+
+
+def _ensure_session_staging(cur) -> None:
+    """
+    Session-private copies of stg_vreg_header / stg_vreg_line.
+
+    Temp tables are visible only to this connection, so concurrent loads do
+    not truncate each other's staging rows.
+    """
+    cur.execute(
+        """
+        create temp table if not exists tmp_vreg_header (like stg_vreg_header);
+        create index if not exists tmp_vreg_header_guid on tmp_vreg_header (guid);
+        create temp table if not exists tmp_vreg_line (like stg_vreg_line);
+        create index if not exists tmp_vreg_line_voucher_guid on tmp_vreg_line (voucher_guid);
+        """
+    )
 
 
 def _parse_qty_uom(billed_qty: str) -> tuple[float | None, str | None]:
@@ -99,70 +125,23 @@ class StagedLine:
     discount: float | None
 
 
-def _process_batch(from_date: date, to_date: date, *, dry_run: bool = False, preview: int | None = None) -> tuple[int, int]:
-    """Process a single batch of vouchers and return (headers_count, lines_count)."""
-    logger.info(f"🔍 Fetching vouchers from Tally: {from_date} to {to_date}")
-    adapter = TallyHTTPAdapter(TALLY_URL, TALLY_COMPANY, DAYBOOK_TEMPLATE, include_types=set())
-
-    vouchers = list(adapter.fetch_invoices(from_date, to_date))
-    logger.info(f"📥 Fetched {len(vouchers)} vouchers from Tally")
-
+def stage_vouchers(vouchers: list[dict]) -> tuple[list[StagedHeader], list[StagedLine]]:
+    """Turn parse_daybook() vouchers into staged headers and lines."""
     staged_headers: list[StagedHeader] = []
     staged_lines: list[StagedLine] = []
 
-    for v in adapter._last_vouchers_cache:
-        # headers
-        # Extract amounts with natural signs from Tally
-        subtotal = float(v.get("subtotal") or 0.0)
-        total = float(v.get("total") or 0.0)
-        
-        # Normalize signs based on voucher type to ensure subtotal and total have same sign
-        # This accounts for Tally's accounting conventions where party ledger amounts
-        # have different signs for different voucher types
-        vchtype = v.get("vchtype", "")
-        
-        if vchtype in ("Invoice", "Sales", "Debit Note"):
-            # For sales-type vouchers:
-            # - Inventory (subtotal) is positive in Tally
-            # - Party ledger (total) is negative in Tally
-            # → Negate total to make it positive (revenue/income)
-            if subtotal < 0:
-                subtotal = -subtotal
-            if total < 0:
-                total = -total
-                
-        elif vchtype in ("Purchase", "Purchase Return"):
-            # For purchase-type vouchers:
-            # - Inventory (subtotal) is negative in Tally
-            # - Party ledger (total) is positive in Tally
-            # → Negate total to make it negative (expense)
-            if subtotal > 0:
-                subtotal = -subtotal
-            if total > 0:
-                total = -total
-                
-        elif vchtype in ("Credit Note", "Sales Return"):
-            # For credit notes:
-            # - Both subtotal and total are naturally negative in Tally
-            # → Ensure both are negative (returns/refunds)
-            if subtotal > 0:
-                subtotal = -subtotal
-            if total > 0:
-                total = -total
-        
-        # Calculate tax AFTER sign normalization
-        # Now both subtotal and total have consistent signs
-        tax = total - subtotal
-        
+    for v in vouchers:
+        # headers: amounts sign-normalized per voucher type, tax = total - subtotal
+        inv = invoice_from_voucher(v)
         staged_headers.append(
             StagedHeader(
                 guid=v.get("guid") or None,
                 vch_no=v.get("vchnumber") or None,
                 vch_date=v.get("date"),
                 party=v.get("party") or None,
-                basic_amount=subtotal,
-                tax_amount=tax,
-                total_amount=total,
+                basic_amount=inv.subtotal,
+                tax_amount=inv.tax,
+                total_amount=inv.total,
             )
         )
 
@@ -179,6 +158,89 @@ def _process_batch(from_date: date, to_date: date, *, dry_run: bool = False, pre
                 )
             )
 
+    return staged_headers, staged_lines
+
+
+def _money(value: float | None) -> Decimal:
+    # numeric(14,2), as the staging columns stored it
+    return Decimal(str(value or 0)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def transform_lines(
+    staged_headers: list[StagedHeader],
+    staged_lines: list[StagedLine],
+    sku_ids: dict[str, str] | None = None,
+) -> tuple[list[tuple], list[StagedLine]]:
+    """
+    Build fact_invoice_line rows (in LINE_COLUMNS order) from staged lines.
+
+    The voucher tax is allocated to its lines pro rata on line amount. Lines
+    without a voucher GUID or a parseable billed quantity are dropped.
+    sku_ids maps lower(stock item name) to dim_item.item_id.
+
+    Returns:
+        (rows, problems) - problems are lines whose quantity or rate did not parse
+    """
+    sku_ids = sku_ids or {}
+    tax_by_guid = {h.guid: _money(h.tax_amount) for h in staged_headers if h.guid}
+    basic_by_guid: dict[str, Decimal] = defaultdict(Decimal)
+    for l in staged_lines:
+        if l.voucher_guid in tax_by_guid:
+            basic_by_guid[l.voucher_guid] += _money(l.amount)
+
+    rows: list[tuple] = []
+    problems: list[StagedLine] = []
+    for l in staged_lines:
+        if l.voucher_guid not in tax_by_guid:
+            continue
+        qty, uom = _parse_qty_uom(l.billed_qty or "")
+        rate = _parse_rate(l.rate or "")
+        if qty is None or rate is None:
+            problems.append(l)
+        if qty is None:
+            continue
+
+        basic = _money(l.amount)
+        sum_basic = basic_by_guid[l.voucher_guid]
+        share = basic / sum_basic * tax_by_guid[l.voucher_guid] if sum_basic else Decimal(0)
+        rows.append(
+            (
+                l.voucher_guid,
+                sku_ids.get(l.stock_item_name.lower()),
+                l.stock_item_name,
+                qty,
+                uom,
+                rate,
+                None,
+                basic,
+                share.quantize(CENT, rounding=ROUND_HALF_UP),
+                (basic + share).quantize(CENT, rounding=ROUND_HALF_UP),
+            )
+        )
+    return rows, problems
+
+
+def _process_batch(
+    from_date: date,
+    to_date: date,
+    *,
+    dry_run: bool = False,
+    preview: int | None = None,
+    diagnostics: bool = False,
+    refresh_rollups: bool = True,
+) -> tuple[int, int, set[date]]:
+    """
+    Process a single batch of vouchers.
+
+    Returns:
+        (headers_count, lines_count, touched_dates) - touched_dates as returned
+        by load_staged (empty for a dry run)
+    """
+    logger.info(f"🔍 Fetching vouchers from Tally: {from_date} to {to_date}")
+    window = VoucherStream(TALLY_URL, TALLY_COMPANY, DAYBOOK_TEMPLATE).fetch(from_date, to_date)
+    logger.info(f"📥 Fetched {len(window.vouchers)} vouchers from Tally")
+
+    staged_headers, staged_lines = stage_vouchers(window.vouchers)
     headers_count = len(staged_headers)
     lines_count = len(staged_lines)
 
@@ -186,246 +248,242 @@ def _process_batch(from_date: date, to_date: date, *, dry_run: bool = False, pre
         logger.info(f"[dry-run] {from_date} to {to_date}: headers={headers_count} lines={lines_count}")
         if preview and headers_count > 0:
             _print_preview_in_memory(staged_headers, staged_lines, preview)
-        return headers_count, lines_count
-
-    with psycopg.connect(DB_URL, autocommit=True) as conn:
-        with conn.cursor() as cur:
-            # stage tables
-            cur.execute("truncate table stg_vreg_header;")
-            cur.execute("truncate table stg_vreg_line;")
+        return headers_count, lines_count, set()
 
-            if staged_headers:
-                cur.executemany(
-                    """
-                    insert into stg_vreg_header(guid, vch_no, vch_date, party, basic_amount, tax_amount, total_amount)
-                    values (%s,%s,%s,%s,%s,%s,%s)
-                    """,
-                    [
-                        (
-                            h.guid,
-                            h.vch_no,
-                            h.vch_date,
-                            h.party,
-                            h.basic_amount,
-                            h.tax_amount,
-                            h.total_amount,
-                        )
-                        for h in staged_headers
-                    ],
+    with connection() as conn:
+        touched_dates = load_staged(
+            conn, staged_headers, staged_lines, from_date, to_date, preview=preview, diagnostics=diagnostics
+        )
+        if refresh_rollups:
+            refresh_sales_rollups(conn, touched_dates)
+
+    return headers_count, lines_count, touched_dates
+
+
+def load_sales_lines_window(conn, window: VoucherWindow) -> tuple[int, int, set[date]]:
+    """
+    Line-item sink for a shared VoucherWindow: stage and load its headers and
+    lines (rollups are left to the caller).
+
+    Returns:
+        (headers, lines, invoice dates touched) - see load_staged
+    """
+    staged_headers, staged_lines = stage_vouchers(window.vouchers)
+    touched_dates = load_staged(conn, staged_headers, staged_lines, window.from_date, window.to_date)
+    return len(staged_headers), len(staged_lines), touched_dates
+
+
+def load_staged(
+    conn,
+    staged_headers: list[StagedHeader],
+    staged_lines: list[StagedLine],
+    from_date: date,
+    to_date: date,
+    *,
+    preview: int | None = None,
+    diagnostics: bool = False,
+) -> set[date]:
+    """
+    Load staged headers/lines into fact_invoice / fact_invoice_line.
+
+    Lines are transformed in Python (transform_lines) and COPYed straight into
+    fact_invoice_line. With diagnostics=True the raw lines are also staged in
+    tmp_vreg_line and join/parse problems and DB counts are logged.
+
+    Returns:
+        The fact_invoice dates of the loaded invoices - the days to refresh
+        in the rollups. The header upsert keeps an existing invoice's date,
+        so for an invoice re-dated in Tally this is its stored date, not
+        the voucher date.
+    """
+    headers_count = len(staged_headers)
+    touched_dates: set[date] = set()
+    with conn.cursor() as cur:
+        # stage headers (session-private, see _ensure_session_staging)
+        _ensure_session_staging(cur)
+        cur.execute("truncate table tmp_vreg_header;")
+        if staged_headers:
+            with cur.copy(
+                "copy tmp_vreg_header (guid, vch_no, vch_date, party, basic_amount, tax_amount, total_amount) from stdin"
+            ) as copy:
+                for h in staged_headers:
+                    copy.write_row((h.guid, h.vch_no, h.vch_date, h.party, h.basic_amount, h.tax_amount, h.total_amount))
+
+        # upsert headers into fact_invoice (reusing existing logic: ensure customer exists is already handled in agent/run.py)
+        if staged_headers:
+            cur.execute(
+                """
+                insert into fact_invoice (invoice_id, voucher_key, vchtype, date, customer_id, sp_id, subtotal, tax, total, roundoff)
+                select coalesce(h.guid, h.vch_no || '/' || h.vch_date::text || '/' || coalesce(h.party,'')) as invoice_id,
+                       coalesce(h.guid, h.vch_no || '/' || h.vch_date::text || '/' || coalesce(h.party,'')) as voucher_key,
+                       'Invoice',
+                       h.vch_date,
+                       coalesce(h.party, 'UNKNOWN') as customer_id,
+                       null as sp_id,
+                       h.basic_amount,
+                       h.tax_amount,
+                       h.total_amount,
+                       0.0 as roundoff
+                from tmp_vreg_header h
+                on conflict (invoice_id) do update set
+                  subtotal = excluded.subtotal,
+                  tax = excluded.tax,
+                  total = excluded.total
+                """
+            )
+            logger.info(f"📝 Upserted {len(staged_headers)} headers to fact_invoice")
+
+            cur.execute(
+                """
+                select distinct i.date
+                from tmp_vreg_header h
+                join fact_invoice i on (coalesce(h.guid, h.vch_no || '/' || h.vch_date::text || '/' || coalesce(h.party,''))) = i.invoice_id
+                """
+            )
+            touched_dates = {d for d, in cur.fetchall() if d}
+
+        # Replace the lines of these invoices
+        if staged_lines:
+            cur.execute(
+                """
+                delete from fact_invoice_line 
+                where invoice_id in (
+                  select coalesce(h.guid, h.vch_no || '/' || h.vch_date::text || '/' || coalesce(h.party,''))
+                  from tmp_vreg_header h
                 )
+                """
+            )
+            logger.info(f"🗑️ Deleted {cur.rowcount} existing lines for batch invoices")
 
-            if staged_lines:
-                cur.executemany(
-                    """
-                    insert into stg_vreg_line(voucher_guid, stock_item_name, billed_qty, rate, amount, discount)
-                    values (%s,%s,%s,%s,%s,%s)
-                    """,
-                    [
-                        (
-                            l.voucher_guid,
-                            l.stock_item_name,
-                            l.billed_qty,
-                            l.rate,
-                            l.amount,
-                            l.discount,
-                        )
-                        for l in staged_lines
-                    ],
-                )
+            rows, problems = transform_lines(staged_headers, staged_lines, dimension_cache.item_ids(conn))
+            with cur.copy(f"copy fact_invoice_line ({', '.join(LINE_COLUMNS)}) from stdin") as copy:
+                for row in rows:
+                    copy.write_row(row)
+            logger.info(f"📝 Inserted {len(rows)} lines to fact_invoice_line (staged: {len(staged_lines)}, dropped: {len(staged_lines) - len(rows)})")
 
-            # upsert headers into fact_invoice (reusing existing logic: ensure customer exists is already handled in agent/run.py)
-            if staged_headers:
-                result = cur.execute(
-                    """
-                    insert into fact_invoice (invoice_id, voucher_key, vchtype, date, customer_id, sp_id, subtotal, tax, total, roundoff)
-                    select coalesce(h.guid, h.vch_no || '/' || h.vch_date::text || '/' || coalesce(h.party,'')) as invoice_id,
-                           coalesce(h.guid, h.vch_no || '/' || h.vch_date::text || '/' || coalesce(h.party,'')) as voucher_key,
-                           'Invoice',
-                           h.vch_date,
-                           coalesce(h.party, 'UNKNOWN') as customer_id,
-                           null as sp_id,
-                           h.basic_amount,
-                           h.tax_amount,
-                           h.total_amount,
-                           0.0 as roundoff
-                    from stg_vreg_header h
-                    on conflict (invoice_id) do update set
-                      subtotal = excluded.subtotal,
-                      tax = excluded.tax,
-                      total = excluded.total
-                    """
-                )
-                logger.info(f"📝 Upserted {len(staged_headers)} headers to fact_invoice")
+            if diagnostics:
+                _log_line_diagnostics(cur, staged_lines, problems)
 
-            # Insert lines with proper duplicate handling
-            if staged_lines:
-                # First, delete existing lines for these specific invoices to avoid duplicates
-                # Count lines to be deleted first
-                cur.execute(
-                    """
-                    select count(*) from fact_invoice_line 
-                    where invoice_id in (
-                      select coalesce(h.guid, h.vch_no || '/' || h.vch_date::text || '/' || coalesce(h.party,''))
-                      from stg_vreg_header h
-                    )
-                    """
-                )
-                lines_to_delete = cur.fetchone()[0]
-                
-                cur.execute(
-                    """
-                    delete from fact_invoice_line 
-                    where invoice_id in (
-                      select coalesce(h.guid, h.vch_no || '/' || h.vch_date::text || '/' || coalesce(h.party,''))
-                      from stg_vreg_header h
-                    )
-                    """
-                )
-                logger.info(f"🗑️ Deleted {lines_to_delete} existing lines for batch invoices")
+        if diagnostics:
+            _log_db_counts(conn, from_date, to_date)
 
-                # Debug: Check how many lines are joinable before insertion
-                cur.execute(
-                    """
-                    select count(*) as joinable_lines
-                    from stg_vreg_line l
-                    join stg_vreg_header h on h.guid = l.voucher_guid
-                    join fact_invoice i on (coalesce(h.guid, h.vch_no || '/' || h.vch_date::text || '/' || coalesce(h.party,''))) = i.invoice_id
-                    """
-                )
-                joinable_count = cur.fetchone()[0]
-                logger.info(f"🔍 Joinable lines (staged: {len(staged_lines)}, joinable: {joinable_count})")
-
-                # Debug: Find lines that fail to join
-                if len(staged_lines) > joinable_count:
-                    cur.execute(
-                        """
-                        select l.stock_item_name, l.voucher_guid, h.guid as header_guid, h.vch_no
-                        from stg_vreg_line l
-                        left join stg_vreg_header h on h.guid = l.voucher_guid
-                        left join fact_invoice i on (coalesce(h.guid, h.vch_no || '/' || h.vch_date::text || '/' || coalesce(h.party,''))) = i.invoice_id
-                        where i.invoice_id is null
-                        limit 10
-                        """
-                    )
-                    failed_lines = cur.fetchall()
-                    if failed_lines:
-                        logger.warning(f"⚠️ Sample of {len(failed_lines)} lines that failed to join:")
-                        for row in failed_lines:
-                            logger.warning(f"   Item: {row[0]}, Voucher GUID: {row[1]}, Header GUID: {row[2]}, Vch No: {row[3]}")
-
-                # Debug: Check for potential insertion failures due to regex/data issues
-                cur.execute(
-                    """
-                    with parsed_lines as (
-                      select 
-                        l.stock_item_name,
-                        l.billed_qty,
-                        l.rate,
-                        h.vch_no,
-                        h.vch_date,
-                        (regexp_matches(coalesce(l.billed_qty,''), '([0-9.+-]+)[[:space:]]*([^/]*)'))[1] as parsed_qty,
-                        nullif(regexp_replace(coalesce(l.rate,''), '[/].*$', ''), '') as parsed_rate
-                      from stg_vreg_line l
-                      join stg_vreg_header h on h.guid = l.voucher_guid
-                    )
-                    select * from parsed_lines
-                    where parsed_qty is null or parsed_rate is null
-                    limit 10
-                    """
-                )
-                problematic_lines = cur.fetchall()
-                if problematic_lines:
-                    logger.warning(f"⚠️ Sample of {len(problematic_lines)} lines with parsing issues:")
-                    for row in problematic_lines:
-                        logger.warning(f"   Invoice: {row[3]} ({row[4]}), Item: {row[0]}, BilledQty: '{row[1]}', Rate: '{row[2]}', ParsedQty: {row[5]}, ParsedRate: {row[6]}")
-
-                # Then insert new lines
-                insert_result = cur.execute(
-                    """
-                    insert into fact_invoice_line (
-                      invoice_id, sku_id, sku_name, qty, uom, rate, discount, line_basic, line_tax, line_total
-                    )
-                    select
-                      i.invoice_id,
-                      ds.item_id as sku_id,
-                      l.stock_item_name,
-                      (regexp_matches(coalesce(l.billed_qty,''), '([0-9.+-]+)[[:space:]]*([^/]*)'))[1]::numeric as qty,
-                      nullif((regexp_matches(coalesce(l.billed_qty,''), '([0-9.+-]+)[[:space:]]*([^/]*)'))[2], '') as uom,
-                      nullif(regexp_replace(coalesce(l.rate,''), '[/].*$', ''), '')::numeric as rate,
-                      null::numeric as discount,
-                      l.amount as line_basic,
-                      round(coalesce((l.amount / nullif(sb.sum_line_basic,0)) * coalesce(h.tax_amount,0),0),2) as line_tax,
-                      round(l.amount + coalesce((l.amount / nullif(sb.sum_line_basic,0)) * coalesce(h.tax_amount,0),0),2) as line_total
-                    from stg_vreg_line l
-                    join stg_vreg_header h on h.guid = l.voucher_guid
-                    join fact_invoice i on (coalesce(h.guid, h.vch_no || '/' || h.vch_date::text || '/' || coalesce(h.party,''))) = i.invoice_id
-                    left join (
-                      select h.guid, sum(l.amount) as sum_line_basic
-                      from stg_vreg_line l
-                      join stg_vreg_header h on h.guid = l.voucher_guid
-                      group by h.guid
-                    ) sb on sb.guid = h.guid
-                    left join dim_item ds on lower(ds.name) = lower(l.stock_item_name)
-                    """
-                )
-                
-                # Get the actual number of rows inserted
-                inserted_count = cur.rowcount
-                logger.info(f"📝 Inserted {inserted_count} lines to fact_invoice_line (staged: {len(staged_lines)}, joinable: {joinable_count})")
-
-            # Verify the data was actually inserted
-            with conn.cursor() as verify_cur:
-                verify_cur.execute(
-                    """
-                    select count(*) as header_count from fact_invoice 
-                    where date between %s and %s
-                    """,
-                    (from_date, to_date)
-                )
-                header_count = verify_cur.fetchone()[0]
-                
-                verify_cur.execute(
+        if preview and headers_count > 0:
+            with conn.cursor() as c2:
+                c2.execute(
                     """
-                    select count(*) as line_count from fact_invoice_line fil
-                    join fact_invoice fi on fil.invoice_id = fi.invoice_id
+                    select fi.date, fi.voucher_key as vch_no, dc.name as customer,
+                           fil.sku_name, fil.qty, fil.uom, fil.rate,
+                           fil.line_basic, fil.line_tax, fil.line_total
+                    from fact_invoice fi
+                    join fact_invoice_line fil on fil.invoice_id = fi.invoice_id
+                    left join dim_customer dc on dc.customer_id = fi.customer_id
                     where fi.date between %s and %s
+                    order by fi.date desc, fi.voucher_key
+                    limit %s
                     """,
-                    (from_date, to_date)
+                    (from_date, to_date, preview),
                 )
-                line_count = verify_cur.fetchone()[0]
-                
-                logger.info(f"✅ Verified in DB: {header_count} headers, {line_count} lines for {from_date} to {to_date}")
-
-            if preview and headers_count > 0:
-                with conn.cursor() as c2:
-                    c2.execute(
-                        """
-                        select fi.date, fi.voucher_key as vch_no, dc.name as customer,
-                               fil.sku_name, fil.qty, fil.uom, fil.rate,
-                               fil.line_basic, fil.line_tax, fil.line_total
-                        from fact_invoice fi
-                        join fact_invoice_line fil on fil.invoice_id = fi.invoice_id
-                        left join dim_customer dc on dc.customer_id = fi.customer_id
-                        where fi.date between %s and %s
-                        order by fi.date desc, fi.voucher_key
-                        limit %s
-                        """,
-                        (from_date, to_date, preview),
-                    )
-                    rows = c2.fetchall()
-                    for r in rows:
-                        logger.info(r)
-
-    return headers_count, lines_count
-
-
-def load_sales_lines(from_date: date, to_date: date, *, dry_run: bool = False, preview: int | None = None) -> None:
-    """Load sales lines with automatic batching for large date ranges."""
+                rows = c2.fetchall()
+                for r in rows:
+                    logger.info(r)
+
+    return touched_dates
+
+
+def _log_line_diagnostics(cur, staged_lines: list[StagedLine], problems: list[StagedLine]) -> None:
+    """Stage the raw lines in tmp_vreg_line and log join and parse problems."""
+    cur.execute("truncate table tmp_vreg_line;")
+    with cur.copy("copy tmp_vreg_line (voucher_guid, stock_item_name, billed_qty, rate, amount, discount) from stdin") as copy:
+        for l in staged_lines:
+            copy.write_row((l.voucher_guid, l.stock_item_name, l.billed_qty, l.rate, l.amount, l.discount))
+
+    cur.execute(
+        """
+        select count(*) as joinable_lines
+        from tmp_vreg_line l
+        join tmp_vreg_header h on h.guid = l.voucher_guid
+        join fact_invoice i on (coalesce(h.guid, h.vch_no || '/' || h.vch_date::text || '/' || coalesce(h.party,''))) = i.invoice_id
+        """
+    )
+    joinable_count = cur.fetchone()[0]
+    logger.info(f"🔍 Joinable lines (staged: {len(staged_lines)}, joinable: {joinable_count})")
+
+    if len(staged_lines) > joinable_count:
+        cur.execute(
+            """
+            select l.stock_item_name, l.voucher_guid, h.guid as header_guid, h.vch_no
+            from tmp_vreg_line l
+            left join tmp_vreg_header h on h.guid = l.voucher_guid
+            left join fact_invoice i on (coalesce(h.guid, h.vch_no || '/' || h.vch_date::text || '/' || coalesce(h.party,''))) = i.invoice_id
+            where i.invoice_id is null
+            limit 10
+            """
+        )
+        failed_lines = cur.fetchall()
+        if failed_lines:
+            logger.warning(f"⚠️ Sample of {len(failed_lines)} lines that failed to join:")
+            for row in failed_lines:
+                logger.warning(f"   Item: {row[0]}, Voucher GUID: {row[1]}, Header GUID: {row[2]}, Vch No: {row[3]}")
+
+    if problems:
+        logger.warning(f"⚠️ {len(problems)} lines with parsing issues (sample of {min(len(problems), 10)}):")
+        for l in problems[:10]:
+            qty, _ = _parse_qty_uom(l.billed_qty or "")
+            logger.warning(
+                f"   Voucher GUID: {l.voucher_guid}, Item: {l.stock_item_name}, BilledQty: '{l.billed_qty}', "
+                f"Rate: '{l.rate}', ParsedQty: {qty}, ParsedRate: {_parse_rate(l.rate or '')}"
+            )
+
+
+def _log_db_counts(conn, from_date: date, to_date: date) -> tuple[int, int]:
+    """Log and return the (headers, lines) counts in the DB for the date range."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            select count(*) as header_count from fact_invoice 
+            where date between %s and %s
+            """,
+            (from_date, to_date)
+        )
+        header_count = cur.fetchone()[0]
+
+        cur.execute(
+            """
+            select count(*) as line_count from fact_invoice_line fil
+            join fact_invoice fi on fil.invoice_id = fi.invoice_id
+            where fi.date between %s and %s
+            """,
+            (from_date, to_date)
+        )
+        line_count = cur.fetchone()[0]
+
+    logger.info(f"✅ Verified in DB: {header_count} headers, {line_count} lines for {from_date} to {to_date}")
+    return header_count, line_count
+
+
+def load_sales_lines(
+    from_date: date,
+    to_date: date,
+    *,
+    dry_run: bool = False,
+    preview: int | None = None,
+    diagnostics: bool = False,
+    workers: int = 1,
+) -> None:
+    """
+    Load sales lines with automatic batching for large date ranges.
+
+    With workers > 1 the batches are loaded concurrently, each on its own
+    connection from the shared pool (agent.db); rollups are then refreshed once for the whole range instead
+    of per batch, since batches can share a month. That refresh also covers the
+    dates the batches touched outside the range (invoices keep their stored
+    date, see load_staged).
+    """
     import time
     
     # Run migration once at the start (not on every batch)
     if not dry_run:
-        with psycopg.connect(DB_URL, autocommit=True) as conn:
+        with connection() as conn:
             _ensure_migration(conn)
     
     # Calculate total days and determine if batching is needed
@@ -435,74 +493,65 @@ def load_sales_lines(from_date: date, to_date: date, *, dry_run: bool = False, p
     if total_days <= batch_size:
         # Small range - process in one go
         logger.info(f"Processing {total_days} days in single batch: {from_date} to {to_date}")
-        _process_batch(from_date, to_date, dry_run=dry_run, preview=preview)
+        _process_batch(from_date, to_date, dry_run=dry_run, preview=preview, diagnostics=diagnostics)
         return
     
-    # Large range - process in batches
-    logger.info(f"Processing {total_days} days in batches of {batch_size}: {from_date} to {to_date}")
-    
-    total_headers = 0
-    total_lines = 0
-    batch_num = 1
-    
-    current_date = from_date
-    while current_date <= to_date:
-        # Calculate batch end date
-        batch_end = min(current_date + timedelta(days=batch_size - 1), to_date)
-        
-        logger.info(f"🔄 Processing batch {batch_num}: {current_date} to {batch_end}")
-        
+    batches = list(date_windows(from_date, to_date, batch_size))
+    concurrent = workers > 1 and not dry_run
+
+    def run_batch(batch_num: int, start: date, end: date) -> tuple[int, int, set[date]]:
+        logger.info(f"🔄 Processing batch {batch_num}: {start} to {end}")
         try:
-            headers, lines = _process_batch(current_date, batch_end, dry_run=dry_run, preview=preview)
-            total_headers += headers
-            total_lines += lines
-            
-            logger.info(f"✅ Batch {batch_num} completed: {headers} headers, {lines} lines")
-            
+            headers, lines, touched_dates = _process_batch(
+                start, end, dry_run=dry_run, preview=preview, diagnostics=diagnostics, refresh_rollups=not concurrent
+            )
         except Exception as e:
             logger.error(f"❌ Batch {batch_num} failed: {e}")
             raise
-        
-        # Move to next batch
-        current_date = batch_end + timedelta(days=1)
-        batch_num += 1
-        
-        # Small pause between batches to avoid overwhelming the system
-        if not dry_run and current_date <= to_date:
-            time.sleep(1)
+        logger.info(f"✅ Batch {batch_num} completed: {headers} headers, {lines} lines")
+        return headers, lines, touched_dates
+
+    total_headers = 0
+    total_lines = 0
+
+    if concurrent:
+        logger.info(f"Processing {total_days} days in {len(batches)} batches of {batch_size} with {workers} workers: {from_date} to {to_date}")
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run_batch, n, start, end) for n, (start, end) in enumerate(batches, 1)]
+            touched_dates = {from_date + timedelta(days=i) for i in range(total_days)}
+            for future in futures:
+                headers, lines, dates = future.result()
+                total_headers += headers
+                total_lines += lines
+                touched_dates |= dates
+
+        with connection() as conn:
+            refresh_sales_rollups(conn, touched_dates)
+    else:
+        # Large range - process in batches
+        logger.info(f"Processing {total_days} days in batches of {batch_size}: {from_date} to {to_date}")
+        for n, (start, end) in enumerate(batches, 1):
+            headers, lines, _ = run_batch(n, start, end)
+            total_headers += headers
+            total_lines += lines
+
+            # Small pause between batches to avoid overwhelming the system
+            if not dry_run and end < to_date:
+                time.sleep(1)
     
     logger.info(f"🎉 All batches completed! Total: {total_headers} headers, {total_lines} lines")
     
     # Final verification - check what's actually in the database
-    if not dry_run:
-        with psycopg.connect(DB_URL, autocommit=True) as conn:
+    if diagnostics and not dry_run:
+        with connection() as conn:
+            db_header_count, db_line_count = _log_db_counts(conn, from_date, to_date)
             with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    select count(*) as total_headers from fact_invoice 
-                    where date between %s and %s
-                    """,
-                    (from_date, to_date)
-                )
-                db_header_count = cur.fetchone()[0]
-                
-                cur.execute(
-                    """
-                    select count(*) as total_lines from fact_invoice_line fil
-                    join fact_invoice fi on fil.invoice_id = fi.invoice_id
-                    where fi.date between %s and %s
-                    """,
-                    (from_date, to_date)
-                )
-                db_line_count = cur.fetchone()[0]
-                
                 # Also get total lines across all dates to see if there's a broader issue
                 cur.execute("select count(*) from fact_invoice_line")
                 total_lines_all_dates = cur.fetchone()[0]
-                
-                logger.info(f"🔍 Final DB verification: {db_header_count} headers, {db_line_count} lines in date range {from_date} to {to_date}")
-                logger.info(f"🔍 Total lines in fact_invoice_line table: {total_lines_all_dates}")
-                logger.info(f"📊 Processed vs DB: Headers {total_headers} vs {db_header_count}, Lines {total_lines} vs {db_line_count}")
+
+            logger.info(f"🔍 Total lines in fact_invoice_line table: {total_lines_all_dates}")
+            logger.info(f"📊 Processed vs DB: Headers {total_headers} vs {db_header_count}, Lines {total_lines} vs {db_line_count}")
 
 
 def main(argv: list[str] | None = None) -> None:
@@ -514,6 +563,8 @@ def main(argv: list[str] | None = None) -> None:
     parser.add_argument("--to", dest="to_date")
     parser.add_argument("--dry-run", action="store_true")
     parser.add_argument("--preview", type=int)
+    parser.add_argument("--diagnostics", action="store_true", help="Log join/parse problems and DB counts per batch")
+    parser.add_argument("--workers", type=int, default=1, help="Load this many date windows concurrently")
     args = parser.parse_args(argv)
 
     to_d = date.today()
@@ -526,7 +577,9 @@ def main(argv: list[str] | None = None) -> None:
     else:
         from_d = to_d - timedelta(days=7)
 
-    load_sales_lines(from_d, to_d, dry_run=args.dry_run, preview=args.preview)
+    load_sales_lines(
+        from_d, to_d, dry_run=args.dry_run, preview=args.preview, diagnostics=args.diagnostics, workers=args.workers
+    )
 
 
 if __name__ == "__main__":
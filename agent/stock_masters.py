@@ -24,11 +24,13 @@ Usage:
 import sys
 import csv
 from pathlib import Path
-import psycopg
 from loguru import logger
 from adapters.tally_http.masters_parser import parse_masters
 from adapters.tally_http.client import TallyClient
-from agent.settings import DB_URL, TALLY_URL, TALLY_COMPANY
+from agent.settings import TALLY_URL, TALLY_COMPANY
+from agent.db import connection
+from agent.dimensions import cache as dimension_cache, ensure_schema as ensure_dimension_indexes
+from agent.migrations import ensure_migrations
 
 
 def load_xml_file(file_path: str) -> str:
@@ -102,14 +104,25 @@ def fetch_masters_from_tally(company: str) -> str:
 
 def ensure_schema(conn):
     """Ensure required tables exist."""
-    migration_file = Path(__file__).parents[1] / "warehouse" / "migrations" / "0004_stock_masters.sql"
-    if migration_file.exists():
-        sql = migration_file.read_text(encoding="utf-8")
-        with conn.cursor() as cur:
-            cur.execute(sql)
-        logger.info("Schema validated/created")
-    else:
-        logger.warning(f"Migration file not found: {migration_file}")
+    ensure_migrations(conn, "0004_stock_masters.sql", "0014_item_group_path.sql")
+    ensure_dimension_indexes(conn)
+    logger.info("Schema validated/created")
+
+
+def _copy_to_temp(cur, table: str, columns: dict[str, str], rows: list[tuple]) -> None:
+    """(Re)fill a session temp table with rows via COPY."""
+    cur.execute(f"CREATE TEMP TABLE IF NOT EXISTS {table} ({', '.join(f'{c} {t}' for c, t in columns.items())})")
+    cur.execute(f"TRUNCATE {table}")
+    with cur.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as copy:
+        for row in rows:
+            copy.write_row(row)
+
+
+def _upsert_counts(cur) -> tuple[int, int]:
+    """(inserted, updated) from an upsert that RETURNING (xmax = 0)."""
+    flags = [r[0] for r in cur.fetchall()]
+    inserted = sum(1 for f in flags if f)
+    return (inserted, len(flags) - inserted)
 
 
 def upsert_units(conn, units: list[dict]) -> tuple[int, int]:
@@ -120,38 +133,30 @@ def upsert_units(conn, units: list[dict]) -> tuple[int, int]:
     if not units:
         return (0, 0)
     
-    inserted = 0
-    updated = 0
+    # One row per unit, last one wins (as the row-by-row upsert did)
+    rows = {
+        u["name"]: (u["name"], u["original_name"], u["gst_rep_uom"], u["is_simple"], u["alter_id"])
+        for u in units
+    }
     
     with conn.cursor() as cur:
-        for unit in units:
-            # Check if exists
-            cur.execute("SELECT uom_name FROM dim_uom WHERE uom_name = %s", (unit["name"],))
-            exists = cur.fetchone() is not None
-            
-            cur.execute("""
-                INSERT INTO dim_uom (uom_name, original_name, gst_rep_uom, is_simple, alter_id, updated_at)
-                VALUES (%s, %s, %s, %s, %s, NOW())
-                ON CONFLICT (uom_name) DO UPDATE SET
-                    original_name = EXCLUDED.original_name,
-                    gst_rep_uom = EXCLUDED.gst_rep_uom,
-                    is_simple = EXCLUDED.is_simple,
-                    alter_id = EXCLUDED.alter_id,
-                    updated_at = NOW()
-            """, (
-                unit["name"],
-                unit["original_name"],
-                unit["gst_rep_uom"],
-                unit["is_simple"],
-                unit["alter_id"],
-            ))
-            
-            if exists:
-                updated += 1
-            else:
-                inserted += 1
-    
-    return (inserted, updated)
+        _copy_to_temp(cur, "tmp_uom", {
+            "uom_name": "text", "original_name": "text", "gst_rep_uom": "text",
+            "is_simple": "boolean", "alter_id": "bigint",
+        }, list(rows.values()))
+        cur.execute("""
+            INSERT INTO dim_uom (uom_name, original_name, gst_rep_uom, is_simple, alter_id, updated_at)
+            SELECT uom_name, original_name, gst_rep_uom, is_simple, alter_id, NOW()
+            FROM tmp_uom
+            ON CONFLICT (uom_name) DO UPDATE SET
+                original_name = EXCLUDED.original_name,
+                gst_rep_uom = EXCLUDED.gst_rep_uom,
+                is_simple = EXCLUDED.is_simple,
+                alter_id = EXCLUDED.alter_id,
+                updated_at = NOW()
+            RETURNING (xmax = 0)
+        """)
+        return _upsert_counts(cur)
 
 
 def upsert_groups(conn, groups: list[dict]) -> tuple[int, int]:
@@ -162,47 +167,61 @@ def upsert_groups(conn, groups: list[dict]) -> tuple[int, int]:
     if not groups:
         return (0, 0)
     
-    inserted = 0
-    updated = 0
+    # Upsert by GUID if available, else by name; last one wins per key
+    by_guid = {g["guid"]: (g["guid"], g["name"], g["parent_name"], g["alter_id"]) for g in groups if g["guid"]}
+    by_name = {g["name"]: (None, g["name"], g["parent_name"], g["alter_id"]) for g in groups if not g["guid"]}
     
     with conn.cursor() as cur:
-        for group in groups:
-            # Check if exists (by GUID if available, else by name)
-            if group["guid"]:
-                cur.execute("SELECT guid FROM dim_stock_group WHERE guid = %s", (group["guid"],))
-                exists = cur.fetchone() is not None
-            else:
-                cur.execute("SELECT name FROM dim_stock_group WHERE name = %s", (group["name"],))
-                exists = cur.fetchone() is not None
-            
-            # Upsert by GUID if available
-            if group["guid"]:
-                cur.execute("""
-                    INSERT INTO dim_stock_group (guid, name, parent_name, alter_id, updated_at)
-                    VALUES (%s, %s, %s, %s, NOW())
-                    ON CONFLICT (guid) DO UPDATE SET
-                        name = EXCLUDED.name,
-                        parent_name = EXCLUDED.parent_name,
-                        alter_id = EXCLUDED.alter_id,
-                        updated_at = NOW()
-                """, (group["guid"], group["name"], group["parent_name"], group["alter_id"]))
-            else:
-                # Fallback: upsert by name
-                cur.execute("""
-                    INSERT INTO dim_stock_group (name, parent_name, alter_id, updated_at)
-                    VALUES (%s, %s, %s, NOW())
-                    ON CONFLICT (name) DO UPDATE SET
-                        parent_name = EXCLUDED.parent_name,
-                        alter_id = EXCLUDED.alter_id,
-                        updated_at = NOW()
-                """, (group["name"], group["parent_name"], group["alter_id"]))
-            
-            if exists:
-                updated += 1
-            else:
-                inserted += 1
+        _copy_to_temp(cur, "tmp_stock_group", {
+            "guid": "text", "name": "text", "parent_name": "text", "alter_id": "bigint",
+        }, list(by_guid.values()) + list(by_name.values()))
+        
+        cur.execute("""
+            INSERT INTO dim_stock_group (guid, name, parent_name, alter_id, updated_at)
+            SELECT guid, name, parent_name, alter_id, NOW()
+            FROM tmp_stock_group
+            WHERE guid IS NOT NULL
+            ON CONFLICT (guid) DO UPDATE SET
+                name = EXCLUDED.name,
+                parent_name = EXCLUDED.parent_name,
+                alter_id = EXCLUDED.alter_id,
+                updated_at = NOW()
+            RETURNING (xmax = 0)
+        """)
+        inserted, updated = _upsert_counts(cur)
+        
+        # Fallback: upsert by name
+        cur.execute("""
+            INSERT INTO dim_stock_group (name, parent_name, alter_id, updated_at)
+            SELECT name, parent_name, alter_id, NOW()
+            FROM tmp_stock_group
+            WHERE guid IS NULL
+            ON CONFLICT (name) DO UPDATE SET
+                parent_name = EXCLUDED.parent_name,
+                alter_id = EXCLUDED.alter_id,
+                updated_at = NOW()
+            RETURNING (xmax = 0)
+        """)
+        ins, upd = _upsert_counts(cur)
     
-    return (inserted, updated)
+    return (inserted + ins, updated + upd)
+
+
+def _merge_item_rows(items: list[dict]) -> dict[str, tuple]:
+    """
+    One dim_item row per item_id, folding duplicates the way successive
+    upserts would (non-null values replace, blank uom/hsn do not).
+    """
+    merged: dict[str, tuple] = {}
+    for item in items:
+        # item_id = guid if available, else name
+        item_id = item["guid"] if item["guid"] else item["name"]
+        row = (item_id, item["guid"], item["name"], item["parent_name"], item["base_units"] or None, item["hsn"] or None)
+        prev = merged.get(item_id)
+        if prev:
+            row = tuple(new if new is not None else old for new, old in zip(row, prev))
+        merged[item_id] = row
+    return merged
 
 
 def upsert_items(conn, items: list[dict]) -> tuple[int, int]:
@@ -213,87 +232,151 @@ def upsert_items(conn, items: list[dict]) -> tuple[int, int]:
     if not items:
         return (0, 0)
     
-    inserted = 0
-    updated = 0
+    rows = _merge_item_rows(items)
     
     with conn.cursor() as cur:
-        for item in items:
-            # item_id = guid if available, else name
-            item_id = item["guid"] if item["guid"] else item["name"]
-            
-            # Check if exists
-            cur.execute("SELECT item_id FROM dim_item WHERE item_id = %s", (item_id,))
-            exists = cur.fetchone() is not None
-            
-            # Upsert with smart merging (keep non-null existing values)
-            cur.execute("""
-                INSERT INTO dim_item (item_id, guid, name, parent_name, uom, hsn, updated_at)
-                VALUES (%s, %s, %s, %s, %s, %s, NOW())
-                ON CONFLICT (item_id) DO UPDATE SET
-                    guid = COALESCE(EXCLUDED.guid, dim_item.guid),
-                    name = COALESCE(EXCLUDED.name, dim_item.name),
-                    parent_name = COALESCE(EXCLUDED.parent_name, dim_item.parent_name),
-                    uom = COALESCE(NULLIF(EXCLUDED.uom, ''), dim_item.uom),
-                    hsn = COALESCE(NULLIF(EXCLUDED.hsn, ''), dim_item.hsn),
-                    updated_at = NOW()
-            """, (
-                item_id,
-                item["guid"],
-                item["name"],
-                item["parent_name"],
-                item["base_units"],
-                item["hsn"],
-            ))
-            
-            if exists:
-                updated += 1
-            else:
-                inserted += 1
+        _copy_to_temp(cur, "tmp_stock_item", {
+            "item_id": "text", "guid": "text", "name": "text",
+            "parent_name": "text", "uom": "text", "hsn": "text",
+        }, list(rows.values()))
+        
+        # Upsert with smart merging (keep non-null existing values)
+        cur.execute("""
+            INSERT INTO dim_item (item_id, guid, name, parent_name, uom, hsn, updated_at)
+            SELECT item_id, guid, name, parent_name, uom, hsn, NOW()
+            FROM tmp_stock_item
+            ON CONFLICT (item_id) DO UPDATE SET
+                guid = COALESCE(EXCLUDED.guid, dim_item.guid),
+                name = COALESCE(EXCLUDED.name, dim_item.name),
+                parent_name = COALESCE(EXCLUDED.parent_name, dim_item.parent_name),
+                uom = COALESCE(NULLIF(EXCLUDED.uom, ''), dim_item.uom),
+                hsn = COALESCE(NULLIF(EXCLUDED.hsn, ''), dim_item.hsn),
+                updated_at = NOW()
+            RETURNING (xmax = 0)
+        """)
+        counts = _upsert_counts(cur)
     
-    return (inserted, updated)
+    dimension_cache.note_items((item_id, row[2]) for item_id, row in rows.items())
+    return counts
 
 
-def compute_brands(conn):
+class GroupHierarchy:
     """
-    Compute brand_name for all items in dim_item by walking up the stock_group hierarchy
-    to find the root group (group with NULL parent_name).
+    Parent-pointer index over stock groups.
+
+    root() and path() walk each chain once: every group visited on the way up
+    gets its root and ancestry memoised (path compression), so resolving all
+    groups or items is O(n) overall. A parent that is not a known group ends
+    the chain (it is treated as the root); a cycle has no root.
     """
+
+    def __init__(self, parents: dict[str, str | None] | None = None):
+        self.parents: dict[str, str | None] = dict(parents or {})
+        self._resolved: dict[str, tuple[str | None, tuple[str, ...]]] = {}
+
+    @classmethod
+    def from_groups(cls, groups: list[dict]) -> "GroupHierarchy":
+        return cls({g["name"]: g["parent_name"] for g in groups})
+
+    @classmethod
+    def from_db(cls, conn) -> "GroupHierarchy":
+        hierarchy = cls()
+        hierarchy.extend_from_db(conn)
+        return hierarchy
+
+    def extend_from_db(self, conn) -> None:
+        """Add dim_stock_group rows for groups not already in the index."""
+        with conn.cursor() as cur:
+            cur.execute("SELECT name, parent_name FROM dim_stock_group")
+            self.extend(dict(cur.fetchall()))
+
+    def extend(self, parents: dict[str, str | None]) -> None:
+        """Add groups not already in the index (known groups keep their parent)."""
+        added = {name: parent for name, parent in parents.items() if name not in self.parents}
+        if added:
+            self.parents.update(added)
+            self._resolved.clear()
+
+    def _resolve(self, name: str) -> tuple[str | None, tuple[str, ...]]:
+        """(root, path from root down to name) for a group name."""
+        chain: list[str] = []
+        on_chain: set[str] = set()
+        cur = name
+        while True:
+            if cur in self._resolved:
+                base = self._resolved[cur]
+                break
+            if cur in on_chain:
+                base = (None, ())  # cycle
+                break
+            parent = self.parents.get(cur)
+            if not parent:
+                base = (cur, (cur,))
+                self._resolved[cur] = base
+                break
+            chain.append(cur)
+            on_chain.add(cur)
+            cur = parent
+
+        # Compress: memoise every group walked on the way up
+        root, path = base
+        for node in reversed(chain):
+            path = path + (node,) if root is not None else ()
+            self._resolved[node] = (root, path)
+        return self._resolved.get(name, base)
+
+    def root(self, name: str) -> str | None:
+        return self._resolve(name)[0]
+
+    def path(self, name: str) -> tuple[str, ...]:
+        return self._resolve(name)[1]
+
+    def item_brand(self, parent_name: str | None) -> tuple[str | None, str | None, list[str] | None]:
+        """(brand, root_group, group_path) for an item under parent_name."""
+        if not parent_name:
+            return (None, None, None)
+        root, path = self._resolve(parent_name)
+        return (root or parent_name, root, list(path) if root is not None else None)
+
+
+def compute_brands(conn, hierarchy: GroupHierarchy | None = None) -> int:
+    """
+    Compute brand (root group), root_group and group_path for all items in
+    dim_item from the stock group hierarchy.
+
+    Items whose parent group cannot be resolved (no parent, unknown parent, a
+    cycle) keep brand = parent_name as before. Only items whose values changed
+    are written, in one bulk UPDATE.
+
+    Args:
+        hierarchy: Index built from the parsed groups, reused if given;
+            groups it lacks are filled in from dim_stock_group
+    """
+    if hierarchy is None:
+        hierarchy = GroupHierarchy.from_db(conn)
+    else:
+        hierarchy.extend_from_db(conn)
+
     with conn.cursor() as cur:
-        # Use recursive CTE to find root group for each item
-        cur.execute("""
-            WITH RECURSIVE grp AS (
-                -- Start: get each item's immediate parent group
-                SELECT i.item_id, g.name AS group_name, g.parent_name, 1 AS depth
-                FROM dim_item i
-                LEFT JOIN dim_stock_group g ON g.name = i.parent_name
-                
-                UNION ALL
-                
-                -- Recurse: walk up the hierarchy
-                SELECT grp.item_id, g2.name, g2.parent_name, grp.depth + 1
-                FROM grp
-                JOIN dim_stock_group g2 ON g2.name = grp.parent_name
-                WHERE grp.depth < 10  -- safety limit
-            ),
-            root AS (
-                -- Find the root group (one with NULL parent_name)
-                SELECT 
-                    item_id,
-                    (ARRAY_AGG(group_name ORDER BY 
-                        CASE WHEN parent_name IS NULL THEN 0 ELSE 1 END, 
-                        depth ASC
-                    ))[1] AS root_group
-                FROM grp
-                GROUP BY item_id
-            )
-            UPDATE dim_item i
-            SET brand = COALESCE(r.root_group, i.parent_name)
-            FROM root r
-            WHERE r.item_id = i.item_id
-              AND COALESCE(i.brand, '') <> COALESCE(r.root_group, i.parent_name, '')
-        """)
+        cur.execute("SELECT item_id, parent_name, brand, root_group, group_path FROM dim_item")
+        changed = []
+        for item_id, parent_name, brand, root_group, group_path in cur.fetchall():
+            new = hierarchy.item_brand(parent_name)
+            if new != (brand, root_group, group_path):
+                changed.append((item_id, *new))
+
+        if changed:
+            _copy_to_temp(cur, "tmp_item_brand", {
+                "item_id": "text", "brand": "text", "root_group": "text", "group_path": "text[]",
+            }, changed)
+            cur.execute("""
+                UPDATE dim_item i
+                SET brand = t.brand, root_group = t.root_group, group_path = t.group_path
+                FROM tmp_item_brand t
+                WHERE t.item_id = i.item_id
+            """)
         
-        updated = cur.rowcount
+        updated = len(changed)
         logger.info(f"Updated brand for {updated} items")
         return updated
 
@@ -347,38 +430,21 @@ def preview_data(conn, limit: int = 50) -> dict:
     }
 
 
-def _compute_group_roots(groups: list[dict]) -> dict[str, str | None]:
+def _compute_group_roots(groups: list[dict], hierarchy: GroupHierarchy | None = None) -> dict[str, str | None]:
     """Build a mapping of group -> root group name (None if no chain).
 
     Resolves parent chains in-memory so we can filter by requested brands before DB upsert.
     """
-    name_to_parent: dict[str, str | None] = {g["name"]: g["parent_name"] for g in groups}
-
-    cache: dict[str, str | None] = {}
-
-    def root_of(name: str) -> str | None:
-        if name in cache:
-            return cache[name]
-        seen: set[str] = set()
-        cur = name
-        while True:
-            if cur in seen:
-                # Cycle detected; treat as no root
-                cache[name] = None
-                return None
-            seen.add(cur)
-            parent = name_to_parent.get(cur)
-            if not parent:
-                cache[name] = cur
-                return cur
-            cur = parent
-
-    for g in groups:
-        cache[g["name"]] = root_of(g["name"])  # fill cache
-    return cache
+    hierarchy = hierarchy or GroupHierarchy.from_groups(groups)
+    return {g["name"]: hierarchy.root(g["name"]) for g in groups}
 
 
-def _filter_by_brands(groups: list[dict], items: list[dict], brand_names: list[str]) -> tuple[list[dict], list[dict]]:
+def _filter_by_brands(
+    groups: list[dict],
+    items: list[dict],
+    brand_names: list[str],
+    hierarchy: GroupHierarchy | None = None,
+) -> tuple[list[dict], list[dict]]:
     """Filter groups and items to only those under specified root brands.
 
     - Keeps root groups that match, and any descendants whose root resolves to a matched root.
@@ -387,7 +453,7 @@ def _filter_by_brands(groups: list[dict], items: list[dict], brand_names: list[s
     if not brand_names:
         return groups, items
 
-    roots_map = _compute_group_roots(groups)
+    roots_map = _compute_group_roots(groups, hierarchy)
     brand_set = {b.strip().lower() for b in brand_names if b.strip()}
 
     def is_group_kept(g: dict) -> bool:
@@ -457,6 +523,7 @@ def clear_stock_master(conn, brands_filter: list[str], dry_run: bool = False) ->
             deleted_items = cur.rowcount
             cur.execute("delete from dim_stock_group")
             deleted_groups = cur.rowcount
+    dimension_cache.invalidate("items")
     return {"groups": deleted_groups, "items": deleted_items}
 
 
@@ -549,9 +616,11 @@ def main():
     # Parse
     logger.info("Parsing masters XML...")
     data = parse_masters(xml_text)
+    # Built once from all parsed groups; reused for the brand filter and brands
+    hierarchy = GroupHierarchy.from_groups(data['groups'])
     if brands_filter:
         original_counts = (len(data['groups']), len(data['items']))
-        data['groups'], data['items'] = _filter_by_brands(data['groups'], data['items'], brands_filter)
+        data['groups'], data['items'] = _filter_by_brands(data['groups'], data['items'], brands_filter, hierarchy)
         logger.info(f"Applied brand filter: {', '.join(brands_filter)}")
         logger.info(f"Groups/items before filter: {original_counts[0]}/{original_counts[1]} | after: {len(data['groups'])}/{len(data['items'])}")
     
@@ -584,7 +653,7 @@ def main():
         return
     
     # Connect to DB and load data
-    with psycopg.connect(DB_URL, autocommit=True) as conn:
+    with connection() as conn:
         # Optional clear/clear-reload
         if clear_only or clear_reload:
             logger.info("Clearing existing stock master data...")
@@ -610,7 +679,7 @@ def main():
             logger.success(f"Items: {items_ins} inserted, {items_upd} updated")
             
             logger.info("Computing brands (root groups)...")
-            compute_brands(conn)
+            compute_brands(conn, hierarchy)
         else:
             logger.info("No stock items in XML - skipping item upsert")
         
@@ -2,97 +2,141 @@
 """
 Load pincode data from CSV into dim_pincode table.
 
+The CSV is streamed through the csv module, each row is hashed, and only rows
+whose hash differs from the stored row_hash are COPYed to a temp table and
+merged; an unchanged file is a read of the existing hashes and nothing else.
+
 Usage:
-    python load_pincode_data.py
+    python load_pincode_data.py [path/to/pincodes.csv]
 """
 
 import csv
+import hashlib
+import sys
+from typing import Iterator
 import psycopg
 from loguru import logger
 from pathlib import Path
 from agent.settings import DB_URL
+from agent.customer_geo import ensure_schema as ensure_geo_schema, enrich_customer_geo
+from agent.migrations import ensure_migrations
 
-def load_pincode_data(csv_file: Path):
-    """Load pincode data from CSV into database."""
-    
-    logger.info(f"Loading pincode data from {csv_file}")
-    
-    # Read and parse CSV
-    pincodes = []
-    duplicates = 0
+COLUMNS = ["pincode", "city", "state", "lat", "lon", "row_hash"]
+
+
+def _coord(value: str | None) -> float | None:
+    # Handle latitude/longitude (may be 'NA' or empty)
+    try:
+        return float(value) if value and value.upper() != 'NA' else None
+    except (ValueError, AttributeError):
+        return None
+
+
+def row_hash(city: str | None, state: str | None, lat: float | None, lon: float | None) -> str:
+    """Content hash of the non-key pincode columns."""
+    content = "\x1f".join("" if v is None else str(v) for v in (city, state, lat, lon))
+    return hashlib.md5(content.encode("utf-8")).hexdigest()
+
+
+def read_pincodes(csv_file: Path, stats: dict | None = None) -> Iterator[tuple]:
+    """
+    Stream (pincode, city, state, lat, lon, row_hash) rows from the CSV.
+
+    Duplicate pincodes keep their first occurrence; stats["duplicates"]
+    counts the rest.
+    """
     seen_pincodes = set()
-    
-    with open(csv_file, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
+    duplicates = 0
+    with open(csv_file, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
             pincode = row['pincode'].strip()
             
             # Skip if we've already seen this pincode (keep first occurrence)
             if pincode in seen_pincodes:
                 duplicates += 1
                 continue
-            
             seen_pincodes.add(pincode)
             
-            # Extract required fields
-            # Handle latitude/longitude (may be 'NA' or empty)
-            try:
-                lat = float(row['latitude']) if row['latitude'] and row['latitude'].upper() != 'NA' else None
-            except (ValueError, AttributeError):
-                lat = None
-            
-            try:
-                lon = float(row['longitude']) if row['longitude'] and row['longitude'].upper() != 'NA' else None
-            except (ValueError, AttributeError):
-                lon = None
-            
-            pincodes.append({
-                'pincode': pincode,
-                'city': row['district'].strip().title() if row['district'] else None,
-                'state': row['statename'].strip().title() if row['statename'] else None,
-                'lat': lat,
-                'lon': lon,
-            })
+            city = row['district'].strip().title() if row['district'] else None
+            state = row['statename'].strip().title() if row['statename'] else None
+            lat = _coord(row['latitude'])
+            lon = _coord(row['longitude'])
+            yield (pincode, city, state, lat, lon, row_hash(city, state, lat, lon))
     
-    logger.info(f"Read {len(pincodes)} unique pincodes from CSV ({duplicates} duplicates skipped)")
+    if stats is not None:
+        stats["duplicates"] = duplicates
+
+
+def ensure_schema(conn):
+    """Ensure dim_pincode and its row_hash column exist."""
+    ensure_migrations(conn, "0003_dim_pincode.sql", "0015_dim_pincode_hash.sql")
+
+
+def load_pincode_data(csv_file: Path) -> dict:
+    """
+    Load pincode data from CSV into database.
+    
+    Returns:
+        Dict with inserted / updated / unchanged / duplicates counts
+    """
+    logger.info(f"Loading pincode data from {csv_file}")
+    stats = {"inserted": 0, "updated": 0, "unchanged": 0, "duplicates": 0}
     
-    # Insert into database
     with psycopg.connect(DB_URL) as conn:
+        ensure_schema(conn)
         with conn.cursor() as cur:
-            # Clear existing data (optional - comment out if you want to keep existing data)
-            # cur.execute("TRUNCATE TABLE dim_pincode")
-            # logger.info("Cleared existing data from dim_pincode")
+            cur.execute("SELECT pincode, row_hash FROM dim_pincode")
+            existing = dict(cur.fetchall())
             
-            # Insert data
-            insert_count = 0
-            update_count = 0
+            # Diff against the stored hashes while streaming the file
+            changed = []
+            for row in read_pincodes(csv_file, stats):
+                if existing.get(row[0]) == row[-1]:
+                    stats["unchanged"] += 1
+                else:
+                    changed.append(row)
             
-            for pc in pincodes:
+            if changed:
+                cur.execute(
+                    "CREATE TEMP TABLE tmp_pincode (LIKE dim_pincode INCLUDING DEFAULTS) ON COMMIT DROP"
+                )
+                with cur.copy(f"COPY tmp_pincode ({', '.join(COLUMNS)}) FROM STDIN") as copy:
+                    for row in changed:
+                        copy.write_row(row)
                 cur.execute("""
-                    INSERT INTO dim_pincode (pincode, city, state, lat, lon)
-                    VALUES (%(pincode)s, %(city)s, %(state)s, %(lat)s, %(lon)s)
+                    INSERT INTO dim_pincode (pincode, city, state, lat, lon, row_hash, updated_at)
+                    SELECT pincode, city, state, lat, lon, row_hash, NOW()
+                    FROM tmp_pincode
                     ON CONFLICT (pincode) DO UPDATE SET
                         city = EXCLUDED.city,
                         state = EXCLUDED.state,
                         lat = EXCLUDED.lat,
-                        lon = EXCLUDED.lon
+                        lon = EXCLUDED.lon,
+                        row_hash = EXCLUDED.row_hash,
+                        updated_at = NOW()
                     RETURNING (xmax = 0) AS inserted
-                """, pc)
-                
-                # Check if it was an insert or update
-                result = cur.fetchone()
-                if result and result[0]:
-                    insert_count += 1
-                else:
-                    update_count += 1
-            
-            conn.commit()
+                """)
+                flags = [r[0] for r in cur.fetchall()]
+                stats["inserted"] = sum(1 for f in flags if f)
+                stats["updated"] = len(flags) - stats["inserted"]
+        
+        if changed:
+            # Customers on new/changed pincodes pick up the new geo data
+            ensure_geo_schema(conn)
+            stats["customers_enriched"] = enrich_customer_geo(conn, refresh_pincodes=[r[0] for r in changed])
+        
+        conn.commit()
     
-    logger.success(f"✓ Loaded {insert_count} new pincodes, updated {update_count} existing pincodes")
-    logger.info(f"Total pincodes in database: {len(pincodes)}")
+    total = stats["inserted"] + stats["updated"] + stats["unchanged"]
+    logger.info(f"Read {total} unique pincodes from CSV ({stats['duplicates']} duplicates skipped)")
+    logger.success(
+        f"✓ Loaded {stats['inserted']} new pincodes, updated {stats['updated']} existing pincodes, "
+        f"{stats['unchanged']} unchanged"
+    )
+    return stats
 
 def main():
-    csv_file = Path(__file__).parent / "pincodemapvf.csv"
+    csv_file = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(__file__).parent / "pincodemapvf.csv"
     
     if not csv_file.exists():
         logger.error(f"CSV file not found: {csv_file}")
@@ -102,4 +146,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
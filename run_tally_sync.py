@@ -8,6 +8,10 @@ Usage:
     # Full sync (default) - syncs entire financial year
     python run_tally_sync.py
     
+    # Full sync into a shadow schema, swapped in when complete
+    # (current data stays readable throughout)
+    python run_tally_sync.py --shadow
+    
     # Incremental sync - masters + last 7 days of transactions
     python run_tally_sync.py --incremental
     
@@ -17,11 +21,26 @@ Usage:
     # Sync specific date range
     python run_tally_sync.py --from-date 2024-04-01 --to-date 2024-10-31
     
+    # Reconcile transactions against Tally's GUID/AlterID manifest
+    # (fetches only new or altered vouchers, deletes vanished ones)
+    python run_tally_sync.py --reconcile --from-date 2024-04-01
+    
     # Test connection
     python run_tally_sync.py --test
     
     # Initialize database only
     python run_tally_sync.py --init-db
+    
+    # Convert transaction tables to monthly partitions (one-time)
+    python run_tally_sync.py --partition-tables
+    
+    # Verify / rebuild the materialized ledger balances
+    python run_tally_sync.py --check-ledger-balance
+    python run_tally_sync.py --refresh-ledger-balance
+    
+    # Verify / rebuild the materialized outstanding bills
+    python run_tally_sync.py --check-bills-outstanding
+    python run_tally_sync.py --refresh-bills-outstanding
 """
 import sys
 import argparse
@@ -59,6 +78,16 @@ def main():
         action="store_true",
         help="Sync only transactions",
     )
+    parser.add_argument(
+        "--reconcile",
+        action="store_true",
+        help="Reconcile transactions via a GUID/AlterID manifest (fetch only changed vouchers)",
+    )
+    parser.add_argument(
+        "--shadow",
+        action="store_true",
+        help="Full sync: load into a shadow schema and swap it in atomically",
+    )
     
     # Date range
     parser.add_argument(
@@ -83,6 +112,31 @@ def main():
         action="store_true",
         help="Initialize database schema only",
     )
+    parser.add_argument(
+        "--partition-tables",
+        action="store_true",
+        help="Convert transaction tables to monthly partitions and exit",
+    )
+    parser.add_argument(
+        "--check-ledger-balance",
+        action="store_true",
+        help="Compare materialized ledger balances with trn_accounting and exit",
+    )
+    parser.add_argument(
+        "--refresh-ledger-balance",
+        action="store_true",
+        help="Rebuild materialized ledger balances from trn_accounting and exit",
+    )
+    parser.add_argument(
+        "--check-bills-outstanding",
+        action="store_true",
+        help="Compare materialized outstanding bills with view_bills_outstanding and exit",
+    )
+    parser.add_argument(
+        "--refresh-bills-outstanding",
+        action="store_true",
+        help="Rebuild materialized outstanding bills and exit",
+    )
     parser.add_argument(
         "--batch-days",
         type=int,
@@ -150,6 +204,55 @@ def main():
                 print("✓ Database schema initialized")
                 return 0
             
+            if args.partition_tables:
+                print("Partitioning transaction tables by month...")
+                sync.partition_tables()
+                print("✓ Transaction tables partitioned")
+                return 0
+            
+            # Ledger balance maintenance
+            if args.refresh_ledger_balance:
+                print("Rebuilding ledger balances...")
+                count = sync.refresh_ledger_balance()
+                print(f"✓ Refreshed balances for {count:,} ledgers")
+                return 0
+            
+            if args.check_ledger_balance:
+                mismatches = sync.check_ledger_balance()
+                if not mismatches:
+                    print("✓ Ledger balances are consistent")
+                    return 0
+                print(f"✗ {len(mismatches)} ledgers differ from trn_accounting:")
+                for m in mismatches[:20]:
+                    print(
+                        f"  {m['ledger_lower']}: stored {m['stored_total']} "
+                        f"({m['stored_entries']} entries), live {m['live_total']} "
+                        f"({m['live_entries']} entries)"
+                    )
+                print("  Run with --refresh-ledger-balance to rebuild")
+                return 1
+            
+            # Outstanding bills maintenance
+            if args.refresh_bills_outstanding:
+                print("Rebuilding outstanding bills...")
+                count = sync.refresh_bills_outstanding()
+                print(f"✓ Refreshed {count:,} outstanding bills")
+                return 0
+            
+            if args.check_bills_outstanding:
+                mismatches = sync.check_bills_outstanding()
+                if not mismatches:
+                    print("✓ Outstanding bills are consistent")
+                    return 0
+                print(f"✗ {len(mismatches)} bills differ from view_bills_outstanding:")
+                for m in mismatches[:20]:
+                    print(
+                        f"  {m['ledger']} / {m['bill_name']}: "
+                        f"stored {m['stored_pending']}, live {m['live_pending']}"
+                    )
+                print("  Run with --refresh-bills-outstanding to rebuild")
+                return 1
+            
             # Run sync
             print("=" * 60)
             print("TALLY DATABASE LOADER")
@@ -172,6 +275,12 @@ def main():
                     to_date=args.to_date,
                     batch_days=args.batch_days,
                 )}
+            elif args.reconcile:
+                print("\nReconciling TRANSACTIONS against the Tally manifest...")
+                results = {"transactions": sync.reconcile_transactions(
+                    from_date=args.from_date,
+                    to_date=args.to_date,
+                )}
             elif args.incremental:
                 print("\nRunning INCREMENTAL SYNC (masters + last 7 days)...")
                 results = sync.run_incremental_sync()
@@ -181,6 +290,7 @@ def main():
                 results = sync.run_full_sync(
                     from_date=args.from_date,
                     to_date=args.to_date,
+                    shadow=args.shadow,
                 )
             
             # Print results
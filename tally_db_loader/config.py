@@ -51,6 +51,13 @@ class TallyLoaderConfig:
     )
     db_schema: str = field(default_factory=lambda: os.getenv("TALLY_LOADER_SCHEMA", "tally_db"))
 
+    # Shared connection pool (one per db_url, see loaders.base.get_pool)
+    db_pool_min: int = field(default_factory=lambda: int(os.getenv("DB_POOL_MIN", "1")))
+    db_pool_max: int = field(default_factory=lambda: int(os.getenv("DB_POOL_MAX", "8")))
+    db_prepare_threshold: int = field(
+        default_factory=lambda: int(os.getenv("DB_PREPARE_THRESHOLD", "2"))
+    )
+
     # Sync settings
     batch_size: int = field(default_factory=lambda: int(os.getenv("TALLY_BATCH_SIZE", "1000")))
     request_timeout: int = field(
@@ -7,13 +7,16 @@ This module contains loaders for upserting data into PostgreSQL:
 - Utility functions for batch operations
 """
 
-from .base import DatabaseLoader, get_connection
+from .base import DatabaseLoader, UpsertResult, close_pools, get_connection, get_pool
 from .masters import MasterLoader
 from .transactions import TransactionLoader
 
 __all__ = [
     "DatabaseLoader",
+    "UpsertResult",
     "get_connection",
+    "get_pool",
+    "close_pools",
     "MasterLoader",
     "TransactionLoader",
 ]
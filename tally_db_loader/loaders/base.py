@@ -4,13 +4,18 @@ Base database loader utilities.
 Provides connection management and common database operations.
 """
 from __future__ import annotations
+import threading
 import psycopg
 from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
 from contextlib import contextmanager
-from typing import Generator, Optional, Any
+from typing import Generator, NamedTuple, Optional, Any
 from loguru import logger
 from ..config import TallyLoaderConfig
 
+_pools: dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
 
 def get_connection(config: Optional[TallyLoaderConfig] = None):
     """
@@ -23,6 +28,57 @@ def get_connection(config: Optional[TallyLoaderConfig] = None):
     return conn
 
 
+def get_pool(config: Optional[TallyLoaderConfig] = None) -> ConnectionPool:
+    """
+    Get the process-wide connection pool for config.db_url.
+    
+    Loaders borrow connections from it instead of connecting per loader, so
+    the main and shadow syncs reuse the same sessions (and the statements
+    psycopg has prepared on them). Connections are configured like
+    get_connection(); SQL is schema-qualified, so one pool serves every
+    db_schema on the same database.
+    """
+    config = config or TallyLoaderConfig.from_env()
+    with _pools_lock:
+        pool = _pools.get(config.db_url)
+        if pool is None or pool.closed:
+            pool = _pools[config.db_url] = ConnectionPool(
+                config.db_url,
+                min_size=config.db_pool_min,
+                max_size=max(config.db_pool_min, config.db_pool_max),
+                kwargs={
+                    "autocommit": True,
+                    "row_factory": dict_row,
+                    "prepare_threshold": config.db_prepare_threshold,
+                },
+                check=ConnectionPool.check_connection,
+                name="tally_db_loader",
+                open=True,
+            )
+    return pool
+
+
+def close_pools():
+    """Close all shared connection pools."""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+class UpsertResult(NamedTuple):
+    """Rows written (inserted or changed) vs rows skipped as unchanged by upsert_batch."""
+    changed: int
+    unchanged: int
+    
+    @property
+    def total(self) -> int:
+        return self.changed + self.unchanged
+    
+    def __str__(self) -> str:
+        return f"{self.changed} changed, {self.unchanged} unchanged"
+
+
 @contextmanager
 def transaction(conn) -> Generator:
     """
@@ -46,22 +102,43 @@ class DatabaseLoader:
     - Logging
     """
     
-    def __init__(self, config: Optional[TallyLoaderConfig] = None):
+    def __init__(
+        self,
+        config: Optional[TallyLoaderConfig] = None,
+        share_with: Optional["DatabaseLoader"] = None,
+    ):
         self.config = config or TallyLoaderConfig.from_env()
         self._conn = None
+        # Loader whose connection this one uses instead of borrowing its own
+        self._share_with = share_with
+        self.last_upsert: UpsertResult | None = None
     
     @property
     def conn(self):
-        """Get or create database connection."""
+        """Get the database connection, borrowing one from the pool if needed."""
+        if self._share_with is not None:
+            return self._share_with.conn
         if self._conn is None or self._conn.closed:
-            self._conn = get_connection(self.config)
+            pool = get_pool(self.config)
+            if self._conn is not None:
+                pool.putconn(self._conn)  # lets the pool replace the broken one
+            self._conn = pool.getconn()
         return self._conn
     
-    def close(self):
-        """Close database connection."""
-        if self._conn and not self._conn.closed:
+    def close(self, discard: bool = False):
+        """
+        Return the connection to the pool.
+        
+        discard=True closes it instead, dropping its session state (prepared
+        statements, cached plans), e.g. after the tables it used were renamed.
+        A loader sharing another loader's connection leaves it to that loader.
+        """
+        if self._share_with is not None or self._conn is None:
+            return
+        if discard and not self._conn.closed:
             self._conn.close()
-            self._conn = None
+        get_pool(self.config).putconn(self._conn)
+        self._conn = None
     
     def __enter__(self):
         return self
@@ -76,6 +153,42 @@ class DatabaseLoader:
         with self.conn.cursor() as cur:
             cur.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
     
+    def apply_versioned_sql(self, name: str, sql: str, checksum: str, force: bool = False) -> bool:
+        """
+        Run a schema script once per checksum.
+        
+        Applied scripts are recorded in <schema>.schema_version; the script is
+        skipped when it is already recorded with the same checksum (unless
+        force=True, e.g. to recreate indexes or views dropped on purpose).
+        
+        Returns:
+            True if the script was executed
+        """
+        schema = self.config.db_schema
+        with self.conn.cursor() as cur:
+            cur.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {schema}.schema_version (
+                    name TEXT PRIMARY KEY,
+                    checksum TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+                )
+            """)
+            if not force:
+                cur.execute(f"SELECT checksum FROM {schema}.schema_version WHERE name = %s", (name,))
+                row = cur.fetchone()
+                if row and row["checksum"] == checksum:
+                    return False
+            cur.execute(sql)
+            cur.execute(
+                f"""
+                INSERT INTO {schema}.schema_version (name, checksum) VALUES (%s, %s)
+                ON CONFLICT (name) DO UPDATE SET checksum = EXCLUDED.checksum, applied_at = NOW()
+                """,
+                (name, checksum),
+            )
+        return True
+    
     def execute_ddl(self, ddl_path: str):
         """Execute DDL from a SQL file."""
         from pathlib import Path
@@ -84,11 +197,14 @@ class DatabaseLoader:
         if not ddl_file.exists():
             raise FileNotFoundError(f"DDL file not found: {ddl_path}")
         
-        ddl = ddl_file.read_text(encoding="utf-8")
-        with self.conn.cursor() as cur:
-            cur.execute(ddl)
+        self.execute_sql(ddl_file.read_text(encoding="utf-8"))
         logger.info(f"Executed DDL from {ddl_path}")
     
+    def execute_sql(self, sql: str):
+        """Execute a (possibly multi-statement) SQL script."""
+        with self.conn.cursor() as cur:
+            cur.execute(sql)
+    
     def truncate_table(self, table_name: str):
         """Truncate a table (removes all rows)."""
         with self.conn.cursor() as cur:
@@ -108,21 +224,29 @@ class DatabaseLoader:
         rows: list[dict],
         key_columns: list[str],
         update_columns: list[str] | None = None,
-    ) -> tuple[int, int]:
+        ignore_changes: list[str] | None = None,
+    ) -> UpsertResult:
         """
-        Upsert a batch of rows.
+        Upsert a batch of rows, skipping rows that would not change.
+        
+        A conflicting row is only updated when one of its update columns is
+        DISTINCT FROM the incoming value, so re-syncing unchanged masters
+        leaves no dead tuples and does not fire tr_update_updated_at.
         
         Args:
             table_name: Full table name (with schema)
             rows: List of row dictionaries
             key_columns: Columns for conflict detection
             update_columns: Columns to update on conflict (None = all non-key)
+            ignore_changes: Update columns that are written along with a
+                changed row but do not by themselves make it changed (e.g.
+                values another step overwrites)
             
         Returns:
-            Tuple of (inserted_count, updated_count)
+            UpsertResult(changed, unchanged); also kept as self.last_upsert
         """
         if not rows:
-            return 0, 0
+            return UpsertResult(0, 0)
         
         # Get all columns from first row
         all_columns = list(rows[0].keys())
@@ -130,6 +254,7 @@ class DatabaseLoader:
         # Determine update columns
         if update_columns is None:
             update_columns = [c for c in all_columns if c not in key_columns]
+        compare_columns = [c for c in update_columns if c not in (ignore_changes or [])]
         
         # Build INSERT statement
         columns_str = ", ".join(all_columns)
@@ -137,30 +262,37 @@ class DatabaseLoader:
         
         # Build ON CONFLICT clause
         key_str = ", ".join(key_columns)
-        update_str = ", ".join([f"{c} = EXCLUDED.{c}" for c in update_columns])
+        if compare_columns:
+            update_str = ", ".join([f"{c} = EXCLUDED.{c}" for c in update_columns])
+            current = ", ".join(f"t.{c}" for c in compare_columns)
+            incoming = ", ".join(f"EXCLUDED.{c}" for c in compare_columns)
+            conflict = f"DO UPDATE SET {update_str} WHERE ROW({current}) IS DISTINCT FROM ROW({incoming})"
+        else:
+            conflict = "DO NOTHING"
         
+        # Only inserted or actually updated rows come back from RETURNING
         sql = f"""
-            INSERT INTO {table_name} ({columns_str})
+            INSERT INTO {table_name} AS t ({columns_str})
             VALUES ({placeholders})
             ON CONFLICT ({key_str})
-            DO UPDATE SET {update_str}
+            {conflict}
+            RETURNING 1
         """
         
-        inserted = 0
-        updated = 0
-        
+        changed = 0
         with self.conn.cursor() as cur:
-            for row in rows:
-                cur.execute(sql, row)
-                # Note: In PostgreSQL, we can't easily distinguish insert vs update
-                # in ON CONFLICT DO UPDATE. For now, count all as processed.
-                inserted += 1
+            cur.executemany(sql, rows, returning=True)
+            while True:
+                changed += len(cur.fetchall())
+                if not cur.nextset():
+                    break
         
-        return inserted, updated
+        self.last_upsert = UpsertResult(changed, len(rows) - changed)
+        return self.last_upsert
     
     def insert_batch(self, table_name: str, rows: list[dict]) -> int:
         """
-        Insert a batch of rows (no upsert, will fail on duplicates).
+        Insert a batch of rows with COPY (no upsert, will fail on duplicates).
         
         Args:
             table_name: Full table name (with schema)
@@ -174,15 +306,257 @@ class DatabaseLoader:
         
         all_columns = list(rows[0].keys())
         columns_str = ", ".join(all_columns)
-        placeholders = ", ".join([f"%({c})s" for c in all_columns])
-        
-        sql = f"INSERT INTO {table_name} ({columns_str}) VALUES ({placeholders})"
         
+        # COPY streams the whole batch in one round trip
         with self.conn.cursor() as cur:
-            cur.executemany(sql, rows)
+            with cur.copy(f"COPY {table_name} ({columns_str}) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row([row[c] for c in all_columns])
         
         return len(rows)
     
+    def refresh_bills_outstanding(self, ledgers: list[str] | None = None) -> int:
+        """
+        Refresh the materialized bills_outstanding table from view_bills_outstanding.
+        
+        Args:
+            ledgers: Ledger names whose bills changed (None = rebuild all)
+            
+        Returns:
+            Number of outstanding bills written
+        """
+        schema = self.config.db_schema
+        columns = """
+            ledger, bill_name, bill_date, due_date, original_amount, adjusted_amount,
+            pending_amount, is_advance, last_adjusted_date, age_days, ageing_bucket, ageing_as_of
+        """
+        select = f"""
+            SELECT
+                ledger, bill_name, bill_date, due_date, original_amount, adjusted_amount,
+                pending_amount, is_advance, last_adjusted_date,
+                CURRENT_DATE - bill_date,
+                {schema}.bill_ageing_bucket(CURRENT_DATE - bill_date),
+                CURRENT_DATE
+            FROM {schema}.view_bills_outstanding
+        """
+        
+        if ledgers is not None:
+            ledgers = sorted(set(l for l in ledgers if l))
+            if not ledgers:
+                return 0
+        
+        with self.conn.transaction():
+            with self.conn.cursor() as cur:
+                if ledgers is None:
+                    cur.execute(f"DELETE FROM {schema}.bills_outstanding")
+                    cur.execute(f"INSERT INTO {schema}.bills_outstanding ({columns}) {select}")
+                else:
+                    # Restricting on ledger is pushed down into both arms of
+                    # the view, so only the affected ledgers' bills are read
+                    cur.execute(
+                        f"DELETE FROM {schema}.bills_outstanding WHERE ledger = ANY(%s)",
+                        (ledgers,),
+                    )
+                    cur.execute(
+                        f"INSERT INTO {schema}.bills_outstanding ({columns}) {select} WHERE ledger = ANY(%s)",
+                        (ledgers,),
+                    )
+                count = cur.rowcount
+                
+                # Re-age bills refreshed on an earlier day
+                cur.execute(
+                    f"""
+                    UPDATE {schema}.bills_outstanding SET
+                        age_days = CURRENT_DATE - bill_date,
+                        ageing_bucket = {schema}.bill_ageing_bucket(CURRENT_DATE - bill_date),
+                        ageing_as_of = CURRENT_DATE
+                    WHERE ageing_as_of < CURRENT_DATE
+                    """
+                )
+        
+        logger.debug(f"Refreshed {count} outstanding bills")
+        return count
+    
+    def check_bills_outstanding(self) -> list[dict]:
+        """
+        Compare bills_outstanding against view_bills_outstanding.
+        
+        Returns:
+            List of mismatching bills (empty when consistent)
+        """
+        schema = self.config.db_schema
+        with self.conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT
+                    COALESCE(m.ledger, v.ledger) AS ledger,
+                    COALESCE(m.bill_name, v.bill_name) AS bill_name,
+                    m.pending_amount AS stored_pending,
+                    v.pending_amount AS live_pending,
+                    m.original_amount AS stored_original,
+                    v.original_amount AS live_original
+                FROM {schema}.bills_outstanding m
+                FULL OUTER JOIN {schema}.view_bills_outstanding v
+                    ON v.ledger = m.ledger AND v.bill_name = m.bill_name
+                WHERE m.ledger IS NULL
+                   OR v.ledger IS NULL
+                   OR m.pending_amount IS DISTINCT FROM v.pending_amount
+                   OR m.original_amount IS DISTINCT FROM v.original_amount
+                   OR m.adjusted_amount IS DISTINCT FROM v.adjusted_amount
+                   OR m.bill_date IS DISTINCT FROM v.bill_date
+                   OR m.due_date IS DISTINCT FROM v.due_date
+                ORDER BY 1, 2
+                """
+            )
+            mismatches = cur.fetchall()
+        
+        if mismatches:
+            logger.warning(f"bills_outstanding has {len(mismatches)} mismatching bills")
+        else:
+            logger.info("bills_outstanding is consistent with view_bills_outstanding")
+        return mismatches
+    
+    def create_shadow_schema(self, shadow: str):
+        """Create an empty schema for a shadow load (dropping any leftover one)."""
+        with self.conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {shadow} CASCADE")
+            cur.execute(f"CREATE SCHEMA {shadow}")
+        logger.debug(f"Created shadow schema {shadow}")
+    
+    def drop_secondary_indexes(self, keep: list[str] | None = None) -> list[str]:
+        """
+        Drop indexes the load itself does not need, so they can be built
+        once after the load (re-applying schema.sql recreates them).
+        
+        Kept: constraint and unique indexes (used by ON CONFLICT), indexes
+        on voucher_guid (used by the per-batch replace of child rows), BRIN
+        indexes, and any index named in ``keep``.
+        
+        Returns:
+            Names of the dropped indexes
+        """
+        schema = self.config.db_schema
+        with self.conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT i.relname AS index_name
+                FROM pg_index x
+                JOIN pg_class i ON i.oid = x.indexrelid
+                JOIN pg_namespace n ON n.oid = i.relnamespace
+                WHERE n.nspname = %s
+                  AND NOT i.relispartition
+                  AND NOT x.indisunique
+                  AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)
+                  AND pg_get_indexdef(x.indexrelid) NOT LIKE '%%(voucher_guid)'
+                  AND pg_get_indexdef(x.indexrelid) NOT LIKE '%%USING brin%%'
+                  AND i.relname <> ALL(%s)
+                """,
+                (schema, keep or []),
+            )
+            names = [r["index_name"] for r in cur.fetchall()]
+            for name in names:
+                cur.execute(f"DROP INDEX {schema}.{name}")
+        
+        logger.debug(f"Dropped {len(names)} secondary indexes in {schema}")
+        return names
+    
+    def _table_columns(self, cur, schema: str, table: str) -> list[str]:
+        """Column names of a table, in definition order."""
+        cur.execute(
+            """
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = %s AND table_name = %s
+            ORDER BY ordinal_position
+            """,
+            (schema, table),
+        )
+        return [r["column_name"] for r in cur.fetchall()]
+    
+    def swap_shadow_schema(
+        self,
+        shadow: str,
+        carry_tables: list[str],
+        rebind_sql: Optional[str] = None,
+    ) -> str:
+        """
+        Replace this loader's schema with a fully loaded shadow schema.
+        
+        In one transaction, rows of ``carry_tables`` (history such as
+        sync_log) are copied from the live schema into the shadow, then the
+        two schemas swap names. Readers see the old data until the commit
+        and the new data after it; nothing is ever half loaded.
+        
+        Renaming a schema does not rewrite function bodies, which are stored
+        as text. ``rebind_sql`` (SQL rendered for the live schema name) runs
+        after the rename, in the same transaction, to redefine functions that
+        name their schema.
+        
+        Returns:
+            Name of the retired schema (drop with drop_schema)
+        """
+        schema = self.config.db_schema
+        retired = f"{schema}_retired"
+        
+        with self.conn.transaction():
+            with self.conn.cursor() as cur:
+                cur.execute(f"DROP SCHEMA IF EXISTS {retired} CASCADE")
+                
+                for table in carry_tables:
+                    # Live tables may have migrated columns in a different
+                    # order, so copy by name
+                    live = set(self._table_columns(cur, schema, table))
+                    columns = ", ".join(
+                        c for c in self._table_columns(cur, shadow, table) if c in live
+                    )
+                    cur.execute(
+                        f"""
+                        INSERT INTO {shadow}.{table} ({columns})
+                        SELECT {columns} FROM {schema}.{table}
+                        ON CONFLICT DO NOTHING
+                        """
+                    )
+                    # Keep serial ids moving forward
+                    cur.execute(
+                        "SELECT pg_get_serial_sequence(%s, 'id') AS seq",
+                        (f"{shadow}.{table}",),
+                    )
+                    seq = cur.fetchone()["seq"]
+                    if seq:
+                        cur.execute(
+                            f"SELECT setval(%s, GREATEST((SELECT MAX(id) FROM {shadow}.{table}), 1))",
+                            (seq,),
+                        )
+                
+                cur.execute(f"ALTER SCHEMA {schema} RENAME TO {retired}")
+                cur.execute(f"ALTER SCHEMA {shadow} RENAME TO {schema}")
+                if rebind_sql:
+                    cur.execute(rebind_sql)
+        
+        logger.info(f"Swapped shadow schema {shadow} in as {schema}")
+        return retired
+    
+    def analyze_schema(self):
+        """Refresh planner statistics for every table in this loader's schema."""
+        schema = self.config.db_schema
+        with self.conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT c.relname AS table_name
+                FROM pg_class c
+                JOIN pg_namespace n ON n.oid = c.relnamespace
+                WHERE n.nspname = %s AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+                """,
+                (schema,),
+            )
+            for row in cur.fetchall():
+                cur.execute(f"ANALYZE {schema}.{row['table_name']}")
+    
+    def drop_schema(self, schema: str):
+        """Drop a schema and everything in it (e.g. one retired by a swap)."""
+        with self.conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        logger.debug(f"Dropped schema {schema}")
+    
     def get_checkpoint(self, entity_name: str) -> dict | None:
         """Get sync checkpoint for an entity."""
         schema = self.config.db_schema
@@ -205,7 +579,12 @@ class DatabaseLoader:
         status: str = "completed",
         error_message: str | None = None,
     ):
-        """Update sync checkpoint for an entity."""
+        """
+        Update sync checkpoint for an entity.
+        
+        Runs as a prepared statement: it is issued after every entity and
+        batch, on a pooled connection that outlives the sync.
+        """
         schema = self.config.db_schema
         with self.conn.cursor() as cur:
             cur.execute(
@@ -221,6 +600,7 @@ class DatabaseLoader:
                     error_message = EXCLUDED.error_message
                 """,
                 (entity_name, last_alter_id, row_count, status, error_message),
+                prepare=True,
             )
     
     def log_sync(
@@ -233,7 +613,7 @@ class DatabaseLoader:
         status: str = "running",
         error_message: str | None = None,
     ) -> int:
-        """Log a sync operation and return the log ID."""
+        """Log a sync operation and return the log ID (prepared, like update_checkpoint)."""
         schema = self.config.db_schema
         with self.conn.cursor() as cur:
             cur.execute(
@@ -244,6 +624,7 @@ class DatabaseLoader:
                 RETURNING id
                 """,
                 (sync_type, entity_name, rows_processed, rows_inserted, rows_updated, status, error_message),
+                prepare=True,
             )
             result = cur.fetchone()
             return result["id"] if result else 0
@@ -29,8 +29,12 @@ class MasterLoader(DatabaseLoader):
     - Currencies
     """
     
-    def __init__(self, config: Optional[TallyLoaderConfig] = None):
-        super().__init__(config)
+    def __init__(
+        self,
+        config: Optional[TallyLoaderConfig] = None,
+        share_with: Optional[DatabaseLoader] = None,
+    ):
+        super().__init__(config, share_with)
         self.schema = self.config.db_schema
     
     def load_company(self, rows: list[dict]) -> int:
@@ -38,52 +42,60 @@ class MasterLoader(DatabaseLoader):
         if not rows:
             return 0
         
-        count, _ = self.upsert_batch(
+        result = self.upsert_batch(
             f"{self.schema}.mst_company",
             rows,
             key_columns=["guid"],
         )
-        logger.info(f"Loaded {count} companies")
-        return count
+        logger.info(f"Loaded {result.total} companies ({result})")
+        return result.total
     
     def load_groups(self, rows: list[dict]) -> int:
         """Load ledger groups."""
         if not rows:
             return 0
         
-        count, _ = self.upsert_batch(
+        result = self.upsert_batch(
             f"{self.schema}.mst_group",
             rows,
             key_columns=["guid"],
         )
-        logger.info(f"Loaded {count} groups")
-        return count
+        logger.info(f"Loaded {result.total} groups ({result})")
+        return result.total
     
     def load_ledgers(self, rows: list[dict]) -> int:
         """Load ledgers."""
         if not rows:
             return 0
         
-        count, _ = self.upsert_batch(
+        # opening_balance is recomputed from mst_opening_bill after the
+        # opening bills sync; TDL's differing value alone is not a change
+        result = self.upsert_batch(
             f"{self.schema}.mst_ledger",
             rows,
             key_columns=["guid"],
+            ignore_changes=["opening_balance"],
         )
-        logger.info(f"Loaded {count} ledgers")
-        return count
+        logger.info(f"Loaded {result.total} ledgers ({result})")
+        return result.total
     
     def load_opening_bills(self, rows: list[dict]) -> int:
-        """Load opening bill allocations from ledger masters."""
+        """
+        Load opening bill allocations from ledger masters.
+        
+        Also refreshes bills_outstanding for the affected ledgers.
+        """
         if not rows:
             return 0
         
-        count, _ = self.upsert_batch(
+        result = self.upsert_batch(
             f"{self.schema}.mst_opening_bill",
             rows,
             key_columns=["ledger", "name"],
         )
-        logger.info(f"Loaded {count} opening bills")
-        return count
+        self.refresh_bills_outstanding([r["ledger"] for r in rows])
+        logger.info(f"Loaded {result.total} opening bills ({result})")
+        return result.total
     
     def update_ledger_opening_balances_from_bills(self) -> int:
         """
@@ -95,6 +107,8 @@ class MasterLoader(DatabaseLoader):
         - Ledgers with bills in mst_opening_bill: opening_balance = SUM(bill.opening_balance)
         - Ledgers without bills: opening_balance = 0
         
+        Ledgers already at that value are left untouched.
+        
         Returns:
             Number of ledgers updated
         """
@@ -116,6 +130,7 @@ class MasterLoader(DatabaseLoader):
                 LEFT JOIN bill_totals bt ON bt.ledger_lower = ml.name_lower
             ) AS bt
             WHERE l.name_lower = bt.name_lower
+              AND l.opening_balance IS DISTINCT FROM COALESCE(bt.total_opening, 0)
         """
         
         with self.conn.cursor() as cur:
@@ -130,117 +145,117 @@ class MasterLoader(DatabaseLoader):
         if not rows:
             return 0
         
-        count, _ = self.upsert_batch(
+        result = self.upsert_batch(
             f"{self.schema}.mst_stock_group",
             rows,
             key_columns=["guid"],
         )
-        logger.info(f"Loaded {count} stock groups")
-        return count
+        logger.info(f"Loaded {result.total} stock groups ({result})")
+        return result.total
     
     def load_stock_categories(self, rows: list[dict]) -> int:
         """Load stock categories."""
         if not rows:
             return 0
         
-        count, _ = self.upsert_batch(
+        result = self.upsert_batch(
             f"{self.schema}.mst_stock_category",
             rows,
             key_columns=["guid"],
         )
-        logger.info(f"Loaded {count} stock categories")
-        return count
+        logger.info(f"Loaded {result.total} stock categories ({result})")
+        return result.total
     
     def load_units(self, rows: list[dict]) -> int:
         """Load units of measurement."""
         if not rows:
             return 0
         
-        count, _ = self.upsert_batch(
+        result = self.upsert_batch(
             f"{self.schema}.mst_unit",
             rows,
             key_columns=["guid"],
         )
-        logger.info(f"Loaded {count} units")
-        return count
+        logger.info(f"Loaded {result.total} units ({result})")
+        return result.total
     
     def load_godowns(self, rows: list[dict]) -> int:
         """Load godowns (warehouses)."""
         if not rows:
             return 0
         
-        count, _ = self.upsert_batch(
+        result = self.upsert_batch(
             f"{self.schema}.mst_godown",
             rows,
             key_columns=["guid"],
         )
-        logger.info(f"Loaded {count} godowns")
-        return count
+        logger.info(f"Loaded {result.total} godowns ({result})")
+        return result.total
     
     def load_stock_items(self, rows: list[dict]) -> int:
         """Load stock items."""
         if not rows:
             return 0
         
-        count, _ = self.upsert_batch(
+        result = self.upsert_batch(
             f"{self.schema}.mst_stock_item",
             rows,
             key_columns=["guid"],
         )
-        logger.info(f"Loaded {count} stock items")
-        return count
+        logger.info(f"Loaded {result.total} stock items ({result})")
+        return result.total
     
     def load_cost_categories(self, rows: list[dict]) -> int:
         """Load cost categories."""
         if not rows:
             return 0
         
-        count, _ = self.upsert_batch(
+        result = self.upsert_batch(
             f"{self.schema}.mst_cost_category",
             rows,
             key_columns=["guid"],
         )
-        logger.info(f"Loaded {count} cost categories")
-        return count
+        logger.info(f"Loaded {result.total} cost categories ({result})")
+        return result.total
     
     def load_cost_centres(self, rows: list[dict]) -> int:
         """Load cost centres."""
         if not rows:
             return 0
         
-        count, _ = self.upsert_batch(
+        result = self.upsert_batch(
             f"{self.schema}.mst_cost_centre",
             rows,
             key_columns=["guid"],
         )
-        logger.info(f"Loaded {count} cost centres")
-        return count
+        logger.info(f"Loaded {result.total} cost centres ({result})")
+        return result.total
     
     def load_voucher_types(self, rows: list[dict]) -> int:
         """Load voucher types."""
         if not rows:
             return 0
         
-        count, _ = self.upsert_batch(
+        result = self.upsert_batch(
             f"{self.schema}.mst_voucher_type",
             rows,
             key_columns=["guid"],
         )
-        logger.info(f"Loaded {count} voucher types")
-        return count
+        logger.info(f"Loaded {result.total} voucher types ({result})")
+        return result.total
     
     def load_currencies(self, rows: list[dict]) -> int:
         """Load currencies."""
         if not rows:
             return 0
         
-        count, _ = self.upsert_batch(
+        result = self.upsert_batch(
             f"{self.schema}.mst_currency",
             rows,
             key_columns=["guid"],
         )
-        logger.info(f"Loaded {count} currencies")
-        return count
+        logger.info(f"Loaded {result.total} currencies ({result})")
+        return result.total
     
     def get_max_alter_id(self, table_name: str) -> int | None:
         """Get maximum alter_id from a table."""
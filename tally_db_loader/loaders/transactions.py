@@ -4,13 +4,87 @@ Transaction data loaders.
 Handles upserting of all Tally transaction data into PostgreSQL.
 """
 from __future__ import annotations
-from datetime import date
+from datetime import date, timedelta
 from typing import Optional
 from loguru import logger
 from .base import DatabaseLoader
 from ..config import TallyLoaderConfig
 
 
+# Tables hanging off trn_voucher, in an order safe for deletes
+TRN_CHILD_TABLES = [
+    "trn_batch",
+    "trn_cost_centre",
+    "trn_bill",
+    "trn_inventory",
+    "trn_accounting",
+]
+
+
+def split_month_ranges(from_date: date, to_date: date) -> tuple[list[date], list[tuple[date, date]]]:
+    """
+    Split a date range into whole calendar months and partial edges.
+    
+    Returns:
+        Tuple of (first days of months fully inside the range,
+        list of (from, to) ranges covering the remainder)
+    """
+    whole_months: list[date] = []
+    partial: list[tuple[date, date]] = []
+    
+    current = from_date
+    while current <= to_date:
+        month_start = current.replace(day=1)
+        next_month = (month_start + timedelta(days=32)).replace(day=1)
+        month_end = next_month - timedelta(days=1)
+        
+        if current == month_start and month_end <= to_date:
+            whole_months.append(month_start)
+        else:
+            partial.append((current, min(month_end, to_date)))
+        current = next_month
+    
+    return whole_months, partial
+
+
+def diff_voucher_manifest(
+    manifest: list[dict],
+    stored: dict[str, dict],
+    from_date: date,
+    to_date: date,
+) -> tuple[list[dict], list[str]]:
+    """
+    Compare Tally's voucher manifest for a date range with trn_voucher.
+    
+    Args:
+        manifest: parse_voucher_manifest() rows (guid, alter_id, date)
+        stored: guid -> {"alter_id", "date"} from trn_voucher, covering the
+            range and any manifest GUID stored under another date
+        
+    Returns:
+        Tuple of (manifest rows to fetch in full: new, or with a different
+        AlterID or date; stored GUIDs dated in the range that Tally no longer
+        has)
+    """
+    wanted = []
+    for row in manifest:
+        known = stored.get(row["guid"])
+        if (
+            known is None
+            or row["alter_id"] is None  # cannot tell, fetch it
+            or known["alter_id"] != row["alter_id"]
+            or known["date"] != row["date"]
+        ):
+            wanted.append(row)
+    
+    in_tally = {row["guid"] for row in manifest}
+    missing = [
+        guid for guid, known in stored.items()
+        if guid not in in_tally and known["date"] is not None and from_date <= known["date"] <= to_date
+    ]
+    return wanted, missing
+
+
 class TransactionLoader(DatabaseLoader):
     """
     Loader for Tally transaction data.
@@ -25,28 +99,108 @@ class TransactionLoader(DatabaseLoader):
     - Closing stock
     """
     
-    def __init__(self, config: Optional[TallyLoaderConfig] = None):
-        super().__init__(config)
+    def __init__(
+        self,
+        config: Optional[TallyLoaderConfig] = None,
+        share_with: Optional[DatabaseLoader] = None,
+    ):
+        super().__init__(config, share_with)
         self.schema = self.config.db_schema
+        self._partitioned: bool | None = None
+    
+    @property
+    def is_partitioned(self) -> bool:
+        """Whether trn_voucher has been converted to monthly partitions."""
+        if self._partitioned is None:
+            with self.conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT EXISTS (
+                        SELECT 1
+                        FROM pg_partitioned_table pt
+                        JOIN pg_class c ON c.oid = pt.partrelid
+                        JOIN pg_namespace n ON n.oid = c.relnamespace
+                        WHERE n.nspname = %s AND c.relname = 'trn_voucher'
+                    ) AS partitioned
+                    """,
+                    (self.schema,),
+                )
+                self._partitioned = cur.fetchone()["partitioned"]
+        return self._partitioned
+    
+    def partition_tables(self) -> None:
+        """
+        Convert the trn_* tables to monthly range partitions.
+        
+        Runs models/partitioning.sql (a no-op if already partitioned).
+        schema.sql must be re-applied afterwards to recreate views.
+        """
+        from ..models import get_partitioning_sql
+        
+        self.execute_sql(get_partitioning_sql(self.schema))
+        self._partitioned = None
     
     def load_vouchers(self, rows: list[dict]) -> int:
         """Load voucher headers."""
         if not rows:
             return 0
         
-        count, _ = self.upsert_batch(
+        key_columns = ["guid"]
+        if self.is_partitioned:
+            self._prepare_partitions(rows)
+            key_columns = ["guid", "date"]
+        
+        result = self.upsert_batch(
             f"{self.schema}.trn_voucher",
             rows,
-            key_columns=["guid"],
+            key_columns=key_columns,
         )
-        logger.info(f"Loaded {count} vouchers")
-        return count
+        logger.info(f"Loaded {result.total} vouchers ({result})")
+        return result.total
+    
+    def _prepare_partitions(self, rows: list[dict]) -> None:
+        """
+        Make partitioned trn_* tables ready for a batch of vouchers.
+        
+        Creates any missing month partitions, and removes vouchers whose date
+        changed in Tally: the primary key includes the date, so an upsert
+        would otherwise leave the old row behind in its previous partition.
+        """
+        dates = [r["date"] for r in rows if r.get("date")]
+        if not dates:
+            return
+        new_dates = {r["guid"]: r["date"] for r in rows}
+        
+        with self.conn.cursor() as cur:
+            cur.execute(
+                f"SELECT {self.schema}.ensure_trn_partitions(%s, %s) AS created",
+                (min(dates), max(dates)),
+            )
+            created = cur.fetchone()["created"]
+            if created:
+                logger.debug(f"Created {created} transaction partitions")
+            
+            cur.execute(
+                f"SELECT guid, date FROM {self.schema}.trn_voucher WHERE guid = ANY(%s)",
+                (list(new_dates),),
+            )
+            moved = [r["guid"] for r in cur.fetchall() if r["date"] != new_dates[r["guid"]]]
+        
+        if moved:
+            with self.conn.transaction():
+                with self.conn.cursor() as cur:
+                    _, bill_ledgers = self._delete_vouchers(cur, "v.guid = ANY(%s)", [moved])
+                self.refresh_bills_outstanding(bill_ledgers)
+            logger.info(f"Removed {len(moved)} vouchers whose date changed")
     
     def load_accounting_entries(self, rows: list[dict]) -> int:
         """
         Load accounting (ledger) entries.
         
         Note: These are linked to vouchers via voucher_guid.
+        
+        The replaced and inserted amounts are applied as deltas to the
+        materialized ledger_balance table in the same transaction.
         """
         if not rows:
             return 0
@@ -56,22 +210,209 @@ class TransactionLoader(DatabaseLoader):
         # First, delete existing entries for the vouchers being loaded
         voucher_guids = list(set(r["voucher_guid"] for r in rows))
         
+        with self.conn.transaction():
+            with self.conn.cursor() as cur:
+                # Delete in batches to avoid very long IN clauses
+                batch_size = 100
+                for i in range(0, len(voucher_guids), batch_size):
+                    batch = voucher_guids[i:i + batch_size]
+                    placeholders = ", ".join(["%s"] * len(batch))
+                    self._remove_accounting_entries(
+                        cur, f"a.voucher_guid IN ({placeholders})", batch
+                    )
+            
+            # Insert new entries
+            count = self.insert_batch(f"{self.schema}.trn_accounting", rows)
+            self._add_ledger_balance(voucher_guids)
+        
+        logger.info(f"Loaded {count} accounting entries")
+        return count
+    
+    def _remove_accounting_entries(
+        self,
+        cur,
+        where_sql: str,
+        params: list,
+        using_sql: str = "",
+    ) -> None:
+        """
+        Delete accounting entries and subtract them from ledger_balance.
+        
+        Args:
+            cur: Open cursor
+            where_sql: Filter on trn_accounting (aliased as ``a``)
+            params: Parameters for where_sql
+            using_sql: Optional USING clause for joins (e.g. to trn_voucher)
+        """
+        self._subtract_ledger_balance(
+            cur,
+            f"""
+            DELETE FROM {self.schema}.trn_accounting a
+            {using_sql}
+            WHERE {where_sql}
+            RETURNING a.ledger_lower, a.amount, a.amount_debit, a.amount_credit
+            """,
+            params,
+        )
+    
+    def _subtract_ledger_balance(self, cur, removed_sql: str, params: list) -> None:
+        """
+        Subtract accounting rows from ledger_balance.
+        
+        Args:
+            cur: Open cursor
+            removed_sql: Query (or DELETE ... RETURNING) yielding ledger_lower,
+                amount, amount_debit and amount_credit of the removed rows
+            params: Parameters for removed_sql
+        """
+        cur.execute(
+            f"""
+            WITH removed AS (
+                {removed_sql}
+            ),
+            delta AS (
+                SELECT
+                    ledger_lower,
+                    COALESCE(SUM(amount_debit), 0) AS total_debit,
+                    COALESCE(SUM(amount_credit), 0) AS total_credit,
+                    COALESCE(SUM(amount), 0) AS transaction_total,
+                    COUNT(*) AS entry_count
+                FROM removed
+                WHERE ledger_lower IS NOT NULL
+                GROUP BY ledger_lower
+            )
+            UPDATE {self.schema}.ledger_balance lb SET
+                total_debit = lb.total_debit - d.total_debit,
+                total_credit = lb.total_credit - d.total_credit,
+                transaction_total = lb.transaction_total - d.transaction_total,
+                entry_count = lb.entry_count - d.entry_count,
+                updated_at = NOW()
+            FROM delta d
+            WHERE lb.ledger_lower = d.ledger_lower
+            """,
+            params,
+        )
+        cur.execute(f"DELETE FROM {self.schema}.ledger_balance WHERE entry_count <= 0")
+    
+    def _add_ledger_balance(self, voucher_guids: list[str]) -> None:
+        """Add the accounting entries of the given vouchers to ledger_balance."""
         with self.conn.cursor() as cur:
-            # Delete in batches to avoid very long IN clauses
             batch_size = 100
             for i in range(0, len(voucher_guids), batch_size):
                 batch = voucher_guids[i:i + batch_size]
                 placeholders = ", ".join(["%s"] * len(batch))
                 cur.execute(
-                    f"DELETE FROM {self.schema}.trn_accounting WHERE voucher_guid IN ({placeholders})",
+                    f"""
+                    INSERT INTO {self.schema}.ledger_balance
+                        (ledger_lower, ledger, total_debit, total_credit, transaction_total, entry_count)
+                    SELECT
+                        ledger_lower,
+                        MIN(ledger),
+                        COALESCE(SUM(amount_debit), 0),
+                        COALESCE(SUM(amount_credit), 0),
+                        COALESCE(SUM(amount), 0),
+                        COUNT(*)
+                    FROM {self.schema}.trn_accounting
+                    WHERE voucher_guid IN ({placeholders})
+                      AND ledger_lower IS NOT NULL
+                    GROUP BY ledger_lower
+                    ON CONFLICT (ledger_lower) DO UPDATE SET
+                        ledger = EXCLUDED.ledger,
+                        total_debit = ledger_balance.total_debit + EXCLUDED.total_debit,
+                        total_credit = ledger_balance.total_credit + EXCLUDED.total_credit,
+                        transaction_total = ledger_balance.transaction_total + EXCLUDED.transaction_total,
+                        entry_count = ledger_balance.entry_count + EXCLUDED.entry_count,
+                        updated_at = NOW()
+                    """,
                     batch,
                 )
+    
+    def refresh_ledger_balance(self) -> int:
+        """
+        Rebuild ledger_balance from trn_accounting.
         
-        # Insert new entries
-        count = self.insert_batch(f"{self.schema}.trn_accounting", rows)
-        logger.info(f"Loaded {count} accounting entries")
+        Fallback for when the incrementally maintained totals are suspected
+        to have drifted (e.g. after manual edits to trn_accounting).
+        
+        Returns:
+            Number of ledgers in the rebuilt table
+        """
+        with self.conn.transaction():
+            with self.conn.cursor() as cur:
+                cur.execute(f"LOCK TABLE {self.schema}.ledger_balance IN EXCLUSIVE MODE")
+                cur.execute(f"DELETE FROM {self.schema}.ledger_balance")
+                cur.execute(
+                    f"""
+                    INSERT INTO {self.schema}.ledger_balance
+                        (ledger_lower, ledger, total_debit, total_credit, transaction_total, entry_count)
+                    SELECT
+                        ledger_lower,
+                        MIN(ledger),
+                        COALESCE(SUM(amount_debit), 0),
+                        COALESCE(SUM(amount_credit), 0),
+                        COALESCE(SUM(amount), 0),
+                        COUNT(*)
+                    FROM {self.schema}.trn_accounting
+                    WHERE ledger_lower IS NOT NULL
+                    GROUP BY ledger_lower
+                    """
+                )
+                count = cur.rowcount
+        
+        logger.info(f"Refreshed ledger_balance for {count} ledgers")
         return count
     
+    def check_ledger_balance(self) -> list[dict]:
+        """
+        Compare ledger_balance against totals computed from trn_accounting.
+        
+        Returns:
+            List of mismatching ledgers (empty when consistent). Each dict has
+            ledger_lower plus stored_* and live_* totals and entry counts.
+        """
+        with self.conn.cursor() as cur:
+            cur.execute(
+                f"""
+                WITH live AS (
+                    SELECT
+                        ledger_lower,
+                        COALESCE(SUM(amount_debit), 0) AS total_debit,
+                        COALESCE(SUM(amount_credit), 0) AS total_credit,
+                        COALESCE(SUM(amount), 0) AS transaction_total,
+                        COUNT(*) AS entry_count
+                    FROM {self.schema}.trn_accounting
+                    WHERE ledger_lower IS NOT NULL
+                    GROUP BY ledger_lower
+                )
+                SELECT
+                    COALESCE(lb.ledger_lower, live.ledger_lower) AS ledger_lower,
+                    lb.total_debit AS stored_debit,
+                    live.total_debit AS live_debit,
+                    lb.total_credit AS stored_credit,
+                    live.total_credit AS live_credit,
+                    lb.transaction_total AS stored_total,
+                    live.transaction_total AS live_total,
+                    lb.entry_count AS stored_entries,
+                    live.entry_count AS live_entries
+                FROM {self.schema}.ledger_balance lb
+                FULL OUTER JOIN live ON live.ledger_lower = lb.ledger_lower
+                WHERE lb.ledger_lower IS NULL
+                   OR live.ledger_lower IS NULL
+                   OR lb.total_debit <> live.total_debit
+                   OR lb.total_credit <> live.total_credit
+                   OR lb.transaction_total <> live.transaction_total
+                   OR lb.entry_count <> live.entry_count
+                ORDER BY 1
+                """
+            )
+            mismatches = cur.fetchall()
+        
+        if mismatches:
+            logger.warning(f"ledger_balance has {len(mismatches)} mismatching ledgers")
+        else:
+            logger.info("ledger_balance is consistent with trn_accounting")
+        return mismatches
+    
     def load_inventory_entries(self, rows: list[dict]) -> int:
         """
         Load inventory entries.
@@ -103,24 +444,32 @@ class TransactionLoader(DatabaseLoader):
         Load bill allocations.
         
         Note: These are linked to vouchers via voucher_guid.
+        
+        bills_outstanding is refreshed for every ledger that had a bill
+        replaced or inserted.
         """
         if not rows:
             return 0
         
         # Delete existing entries for vouchers being loaded
         voucher_guids = list(set(r["voucher_guid"] for r in rows))
+        ledgers = set(r["ledger"] for r in rows)
+        
+        with self.conn.transaction():
+            with self.conn.cursor() as cur:
+                batch_size = 100
+                for i in range(0, len(voucher_guids), batch_size):
+                    batch = voucher_guids[i:i + batch_size]
+                    placeholders = ", ".join(["%s"] * len(batch))
+                    cur.execute(
+                        f"DELETE FROM {self.schema}.trn_bill WHERE voucher_guid IN ({placeholders}) RETURNING ledger",
+                        batch,
+                    )
+                    ledgers.update(r["ledger"] for r in cur.fetchall())
+            
+            count = self.insert_batch(f"{self.schema}.trn_bill", rows)
+            self.refresh_bills_outstanding(list(ledgers))
         
-        with self.conn.cursor() as cur:
-            batch_size = 100
-            for i in range(0, len(voucher_guids), batch_size):
-                batch = voucher_guids[i:i + batch_size]
-                placeholders = ", ".join(["%s"] * len(batch))
-                cur.execute(
-                    f"DELETE FROM {self.schema}.trn_bill WHERE voucher_guid IN ({placeholders})",
-                    batch,
-                )
-        
-        count = self.insert_batch(f"{self.schema}.trn_bill", rows)
         logger.info(f"Loaded {count} bill allocations")
         return count
     
@@ -181,13 +530,13 @@ class TransactionLoader(DatabaseLoader):
         if not rows:
             return 0
         
-        count, _ = self.upsert_batch(
+        result = self.upsert_batch(
             f"{self.schema}.trn_closing_stock",
             rows,
             key_columns=["as_of_date", "stock_item", "godown"],
         )
-        logger.info(f"Loaded {count} closing stock entries")
-        return count
+        logger.info(f"Loaded {result.total} closing stock entries ({result})")
+        return result.total
     
     def load_all_transaction_data(self, parsed_data: dict) -> dict:
         """
@@ -219,52 +568,254 @@ class TransactionLoader(DatabaseLoader):
         
         return counts
     
-    def delete_vouchers_in_range(self, from_date: date, to_date: date) -> int:
+    def replace_voucher_window(self, parsed_data: dict, from_date: date, to_date: date) -> dict:
         """
-        Delete vouchers (and related entries via CASCADE) in a date range.
+        Make the stored vouchers dated from_date..to_date match parsed_data.
         
-        Useful for re-syncing a specific period.
+        Vouchers whose content_hash matches the stored one are skipped along
+        with their child rows. Changed vouchers are deleted (children and
+        materialized totals included) and loaded again. Stored vouchers in the
+        window that Tally no longer returns are deleted.
         
+        Args:
+            parsed_data: Dict from parse_vouchers() for the same date range
+            
         Returns:
-            Number of vouchers deleted
+            Dict with counts for each entity type written (as
+            load_all_transaction_data), plus "unchanged" and "deleted" voucher
+            counts
+        """
+        vouchers = parsed_data.get("vouchers", [])
+        incoming = {v["guid"]: v.get("content_hash") for v in vouchers}
+        
+        with self.conn.cursor() as cur:
+            # Also look up incoming GUIDs stored under another date
+            cur.execute(
+                f"""
+                SELECT guid, content_hash FROM {self.schema}.trn_voucher
+                WHERE (date >= %s AND date <= %s) OR guid = ANY(%s)
+                """,
+                (from_date, to_date, list(incoming)),
+            )
+            stored = {r["guid"]: r["content_hash"] for r in cur.fetchall()}
+        
+        unchanged = {g for g, h in incoming.items() if h is not None and stored.get(g) == h}
+        stale = [g for g in stored if g not in unchanged]
+        deleted = len([g for g in stale if g not in incoming])
+        
+        self.delete_vouchers(stale)
+        
+        changed = {
+            key: [r for r in rows if r["guid" if key == "vouchers" else "voucher_guid"] not in unchanged]
+            for key, rows in parsed_data.items()
+        }
+        counts = self.load_all_transaction_data(changed)
+        logger.info(
+            f"Vouchers {from_date} to {to_date}: {len(vouchers) - len(unchanged)} written, "
+            f"{len(unchanged)} unchanged, {deleted} deleted"
+        )
+        return {**counts, "unchanged": len(unchanged), "deleted": deleted}
+    
+    def get_voucher_manifest(self, from_date: date, to_date: date, guids: list[str]) -> dict[str, dict]:
+        """
+        Stored GUID -> {"alter_id", "date"} for vouchers dated in the range
+        plus the given GUIDs wherever they are dated (see diff_voucher_manifest).
         """
         with self.conn.cursor() as cur:
             cur.execute(
                 f"""
-                DELETE FROM {self.schema}.trn_voucher
-                WHERE date >= %s AND date <= %s
+                SELECT guid, alter_id, date FROM {self.schema}.trn_voucher
+                WHERE (date >= %s AND date <= %s) OR guid = ANY(%s)
                 """,
-                (from_date, to_date),
+                (from_date, to_date, guids),
             )
-            deleted = cur.rowcount
+            return {r["guid"]: {"alter_id": r["alter_id"], "date": r["date"]} for r in cur.fetchall()}
+    
+    def reload_vouchers(self, parsed_data: dict) -> dict:
+        """
+        Replace the parsed vouchers wholesale: any stored copy is deleted
+        (children and materialized totals included) before loading.
+        
+        Returns:
+            Dict with counts for each entity type (as load_all_transaction_data)
+        """
+        self.delete_vouchers([v["guid"] for v in parsed_data.get("vouchers", [])])
+        return self.load_all_transaction_data(parsed_data)
+    
+    def delete_vouchers(self, guids: list[str]) -> int:
+        """
+        Delete vouchers by GUID, keeping ledger_balance and bills_outstanding
+        in step.
+        
+        Returns:
+            Number of vouchers deleted
+        """
+        if not guids:
+            return 0
+        with self.conn.transaction():
+            with self.conn.cursor() as cur:
+                deleted, bill_ledgers = self._delete_vouchers(cur, "v.guid = ANY(%s)", [guids])
+            self.refresh_bills_outstanding(bill_ledgers)
+        return deleted
+    
+    def delete_vouchers_in_range(self, from_date: date, to_date: date) -> int:
+        """
+        Delete vouchers (and related entries via CASCADE) in a date range.
+        
+        Useful for re-syncing a specific period. When the trn_* tables are
+        partitioned, months fully inside the range are dropped partition by
+        partition (no row deletes, no bloat); only partial months at the
+        edges are deleted row by row.
+        
+        Returns:
+            Number of vouchers deleted
+        """
+        if self.is_partitioned:
+            whole_months, partial_ranges = split_month_ranges(from_date, to_date)
+        else:
+            whole_months, partial_ranges = [], [(from_date, to_date)]
+        
+        deleted = 0
+        bill_ledgers: set[str] = set()
+        
+        with self.conn.transaction():
+            with self.conn.cursor() as cur:
+                for month_start in whole_months:
+                    count, ledgers = self._drop_month_partitions(cur, month_start)
+                    deleted += count
+                    bill_ledgers.update(ledgers)
+                
+                for range_from, range_to in partial_ranges:
+                    count, ledgers = self._delete_vouchers(
+                        cur,
+                        "v.date >= %s AND v.date <= %s",
+                        [range_from, range_to],
+                    )
+                    deleted += count
+                    bill_ledgers.update(ledgers)
+            
+            self.refresh_bills_outstanding(list(bill_ledgers))
         
         logger.info(f"Deleted {deleted} vouchers from {from_date} to {to_date}")
         return deleted
     
+    def _delete_vouchers(self, cur, where_sql: str, params: list) -> tuple[int, list[str]]:
+        """
+        Delete vouchers row by row, keeping the materialized tables in step.
+        
+        Args:
+            cur: Open cursor (caller owns the transaction)
+            where_sql: Filter on trn_voucher (aliased as ``v``)
+            params: Parameters for where_sql
+            
+        Returns:
+            Tuple of (vouchers deleted, ledgers whose bills were removed)
+        """
+        # Ledgers whose bills go away with the vouchers
+        cur.execute(
+            f"""
+            SELECT DISTINCT b.ledger
+            FROM {self.schema}.trn_bill b
+            JOIN {self.schema}.trn_voucher v ON v.guid = b.voucher_guid
+            WHERE {where_sql}
+            """,
+            params,
+        )
+        bill_ledgers = [r["ledger"] for r in cur.fetchall()]
+        
+        # Remove accounting entries explicitly (rather than via CASCADE)
+        # so their amounts come off ledger_balance
+        self._remove_accounting_entries(
+            cur,
+            f"a.voucher_guid = v.guid AND {where_sql}",
+            params,
+            using_sql=f"USING {self.schema}.trn_voucher v",
+        )
+        cur.execute(f"DELETE FROM {self.schema}.trn_voucher v WHERE {where_sql}", params)
+        return cur.rowcount, bill_ledgers
+    
+    def _drop_month_partitions(self, cur, month_start: date) -> tuple[int, list[str]]:
+        """
+        Replace one month's partitions of every trn_* table with empty ones.
+        
+        Args:
+            cur: Open cursor (caller owns the transaction)
+            month_start: First day of the month
+            
+        Returns:
+            Tuple of (vouchers dropped, ledgers whose bills were removed)
+        """
+        partitions = {}
+        for table in ["trn_voucher"] + TRN_CHILD_TABLES:
+            cur.execute(
+                f"SELECT {self.schema}.trn_partition_name(%s, %s) AS name",
+                (table, month_start),
+            )
+            partitions[table] = cur.fetchone()["name"]
+        
+        cur.execute(
+            "SELECT to_regclass(%s) IS NOT NULL AS present",
+            (f"{self.schema}.{partitions['trn_voucher']}",),
+        )
+        if not cur.fetchone()["present"]:
+            return 0, []
+        
+        cur.execute(f"SELECT COUNT(*) AS cnt FROM {self.schema}.{partitions['trn_voucher']}")
+        dropped = cur.fetchone()["cnt"]
+        cur.execute(f"SELECT DISTINCT ledger FROM {self.schema}.{partitions['trn_bill']}")
+        bill_ledgers = [r["ledger"] for r in cur.fetchall()]
+        
+        self._subtract_ledger_balance(
+            cur,
+            f"""
+            SELECT ledger_lower, amount, amount_debit, amount_credit
+            FROM {self.schema}.{partitions['trn_accounting']}
+            """,
+            [],
+        )
+        
+        # Children before the voucher header: detaching a referenced
+        # partition requires that nothing still points at it
+        for table in TRN_CHILD_TABLES + ["trn_voucher"]:
+            cur.execute(
+                f"ALTER TABLE {self.schema}.{table} DETACH PARTITION {self.schema}.{partitions[table]}"
+            )
+            cur.execute(f"DROP TABLE {self.schema}.{partitions[table]}")
+        
+        cur.execute(
+            f"SELECT {self.schema}.ensure_trn_partitions(%s, %s)",
+            (month_start, month_start),
+        )
+        logger.debug(f"Dropped partitions for {month_start:%Y-%m} ({dropped} vouchers)")
+        return dropped, bill_ledgers
+    
     def clear_all_transactions(self) -> dict:
         """
         Clear ALL transaction data. Use before full sync.
         
-        Deletes in order to respect foreign key constraints.
+        Counts each table, then empties them all with a single TRUNCATE
+        (which also covers every partition when trn_* is partitioned).
         
         Returns:
             Dict with counts per table
         """
-        tables = [
-            "trn_batch",
-            "trn_cost_centre", 
-            "trn_bill",
-            "trn_inventory",
-            "trn_accounting",
+        tables = TRN_CHILD_TABLES + [
             "trn_voucher",
             "trn_closing_stock",
+            "ledger_balance",
         ]
         
         counts = {}
         with self.conn.cursor() as cur:
             for table in tables:
-                cur.execute(f"DELETE FROM {self.schema}.{table}")
-                counts[table] = cur.rowcount
+                cur.execute(f"SELECT COUNT(*) AS cnt FROM {self.schema}.{table}")
+                counts[table] = cur.fetchone()["cnt"]
+            cur.execute(
+                f"TRUNCATE TABLE {', '.join(f'{self.schema}.{t}' for t in tables)}"
+            )
+        
+        # Opening bills survive a clear, so rebuild rather than empty
+        self.refresh_bills_outstanding()
         
         logger.info(f"Cleared all transactions: {counts}")
         return counts
@@ -3,13 +3,35 @@ Database models for Tally Database Loader.
 
 This module contains the PostgreSQL schema definition and related utilities.
 """
+import hashlib
+import re
 from pathlib import Path
 
 # Path to schema file
 SCHEMA_FILE = Path(__file__).parent / "schema.sql"
 
+# One-time conversion of trn_* tables to monthly partitions
+PARTITIONING_FILE = Path(__file__).parent / "partitioning.sql"
 
-def get_schema_sql() -> str:
-    """Get the full schema SQL."""
-    return SCHEMA_FILE.read_text(encoding="utf-8")
+
+def _for_schema(sql: str, schema: str) -> str:
+    """Retarget SQL written against tally_db at another schema."""
+    if schema == "tally_db":
+        return sql
+    return re.sub(r"\btally_db\b", schema, sql)
+
+
+def get_schema_sql(schema: str = "tally_db") -> str:
+    """Get the full schema SQL (optionally for a schema other than tally_db)."""
+    return _for_schema(SCHEMA_FILE.read_text(encoding="utf-8"), schema)
+
+
+def get_schema_checksum() -> str:
+    """Checksum of schema.sql as written (the same for every target schema)."""
+    return hashlib.sha256(SCHEMA_FILE.read_bytes()).hexdigest()
+
+
+def get_partitioning_sql(schema: str = "tally_db") -> str:
+    """Get the partitioning migration SQL (optionally for a schema other than tally_db)."""
+    return _for_schema(PARTITIONING_FILE.read_text(encoding="utf-8"), schema)
 
@@ -0,0 +1,165 @@
+-- =============================================================================
+-- Tally Database Loader - Monthly range partitioning for transaction tables
+-- =============================================================================
+-- Converts trn_voucher and its child tables (trn_accounting, trn_inventory,
+-- trn_bill, trn_cost_centre, trn_batch) into tables partitioned by voucher
+-- date, one partition per financial-year month, with BRIN indexes on the date
+-- columns. Range reloads then drop whole month partitions instead of
+-- deleting rows (see TransactionLoader.delete_vouchers_in_range).
+--
+-- Run once, after schema.sql, with:
+--     python run_tally_sync.py --partition-tables
+-- Safe to re-run: the conversion is skipped if trn_voucher is already
+-- partitioned. schema.sql must be re-applied afterwards to recreate the views
+-- and secondary indexes (run_tally_sync.py does this).
+--
+-- Layout differences from the heap tables:
+--   - trn_voucher primary key is (guid, date); children reference it through
+--     (voucher_guid, voucher_date) and have primary key (id, voucher_date)
+--   - trn_cost_centre.accounting_id / trn_batch.inventory_id are plain
+--     columns (no foreign key; the parser never populates them)
+-- =============================================================================
+
+-- Partition naming: <table>_fy<FY start year>_m<FY month, April = 01>
+CREATE OR REPLACE FUNCTION tally_db.trn_partition_name(base TEXT, month_start DATE)
+RETURNS TEXT AS $$
+    SELECT format(
+        '%s_fy%s_m%s',
+        base,
+        EXTRACT(YEAR FROM month_start)::INT - CASE WHEN EXTRACT(MONTH FROM month_start) < 4 THEN 1 ELSE 0 END,
+        LPAD((((EXTRACT(MONTH FROM month_start)::INT + 8) % 12) + 1)::TEXT, 2, '0')
+    );
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION tally_db.trn_is_partitioned()
+RETURNS BOOLEAN AS $$
+    SELECT EXISTS (
+        SELECT 1
+        FROM pg_partitioned_table pt
+        JOIN pg_class c ON c.oid = pt.partrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'tally_db' AND c.relname = 'trn_voucher'
+    );
+$$ LANGUAGE sql STABLE;
+
+-- Create any missing month partitions covering [from_date, to_date]
+CREATE OR REPLACE FUNCTION tally_db.ensure_trn_partitions(from_date DATE, to_date DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    m DATE;
+    t TEXT;
+    pname TEXT;
+    created INTEGER := 0;
+BEGIN
+    IF NOT tally_db.trn_is_partitioned() OR from_date IS NULL OR to_date IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    m := date_trunc('month', from_date)::DATE;
+    WHILE m <= to_date LOOP
+        -- Parent first so child foreign keys can resolve the new partition
+        FOREACH t IN ARRAY ARRAY['trn_voucher', 'trn_accounting', 'trn_inventory', 'trn_bill', 'trn_cost_centre', 'trn_batch']
+        LOOP
+            pname := tally_db.trn_partition_name(t, m);
+            IF to_regclass(format('tally_db.%I', pname)) IS NULL THEN
+                EXECUTE format(
+                    'CREATE TABLE tally_db.%I PARTITION OF tally_db.%I FOR VALUES FROM (%L) TO (%L)',
+                    pname, t, m, (m + INTERVAL '1 month')::DATE
+                );
+                created := created + 1;
+            END IF;
+        END LOOP;
+        m := (m + INTERVAL '1 month')::DATE;
+    END LOOP;
+
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- One-time conversion of the heap tables
+DO $$
+DECLARE
+    t TEXT;
+    min_date DATE;
+    max_date DATE;
+    children TEXT[] := ARRAY['trn_accounting', 'trn_inventory', 'trn_bill', 'trn_cost_centre', 'trn_batch'];
+BEGIN
+    IF tally_db.trn_is_partitioned() THEN
+        RAISE NOTICE 'tally_db.trn_voucher is already partitioned, skipping conversion';
+        RETURN;
+    END IF;
+
+    -- Views are recreated by schema.sql
+    DROP VIEW IF EXISTS tally_db.view_bills_outstanding CASCADE;
+    DROP VIEW IF EXISTS tally_db.view_ledger_balance_live CASCADE;
+    DROP VIEW IF EXISTS tally_db.view_daily_summary CASCADE;
+
+    -- Move the heap tables aside, keeping their id sequences
+    ALTER TABLE tally_db.trn_voucher RENAME TO trn_voucher_unpartitioned;
+    ALTER TABLE tally_db.trn_voucher_unpartitioned RENAME CONSTRAINT trn_voucher_pkey TO trn_voucher_unpartitioned_pkey;
+    FOREACH t IN ARRAY children LOOP
+        EXECUTE format('ALTER TABLE tally_db.%I RENAME TO %I', t, t || '_unpartitioned');
+        EXECUTE format('ALTER TABLE tally_db.%I RENAME CONSTRAINT %I TO %I', t || '_unpartitioned', t || '_pkey', t || '_unpartitioned_pkey');
+        EXECUTE format('ALTER SEQUENCE tally_db.%I OWNED BY NONE', t || '_id_seq');
+    END LOOP;
+
+    -- Partitioned parents (same columns and defaults as the heap tables)
+    CREATE TABLE tally_db.trn_voucher (
+        LIKE tally_db.trn_voucher_unpartitioned INCLUDING DEFAULTS,
+        PRIMARY KEY (guid, date)
+    ) PARTITION BY RANGE (date);
+
+    FOREACH t IN ARRAY children LOOP
+        EXECUTE format('
+            CREATE TABLE tally_db.%I (
+                LIKE tally_db.%I INCLUDING DEFAULTS,
+                PRIMARY KEY (id, voucher_date)
+            ) PARTITION BY RANGE (voucher_date)
+        ', t, t || '_unpartitioned');
+        EXECUTE format('ALTER SEQUENCE tally_db.%I OWNED BY tally_db.%I.id', t || '_id_seq', t);
+    END LOOP;
+
+    -- Month partitions for existing data, plus a default partition per table
+    SELECT MIN(date), MAX(date) INTO min_date, max_date FROM tally_db.trn_voucher_unpartitioned;
+    PERFORM tally_db.ensure_trn_partitions(min_date, max_date);
+    FOREACH t IN ARRAY ARRAY['trn_voucher'] || children LOOP
+        EXECUTE format('CREATE TABLE tally_db.%I PARTITION OF tally_db.%I DEFAULT', t || '_default', t);
+    END LOOP;
+
+    -- Copy data (children get voucher_date from their voucher)
+    INSERT INTO tally_db.trn_voucher SELECT * FROM tally_db.trn_voucher_unpartitioned;
+    FOREACH t IN ARRAY children LOOP
+        EXECUTE format('
+            UPDATE tally_db.%I c SET voucher_date = v.date
+            FROM tally_db.trn_voucher_unpartitioned v
+            WHERE c.voucher_guid = v.guid AND c.voucher_date IS DISTINCT FROM v.date
+        ', t || '_unpartitioned');
+        EXECUTE format('INSERT INTO tally_db.%I SELECT * FROM tally_db.%I', t, t || '_unpartitioned');
+    END LOOP;
+
+    -- Foreign keys to the voucher header
+    FOREACH t IN ARRAY children LOOP
+        EXECUTE format('
+            ALTER TABLE tally_db.%I ADD CONSTRAINT %I
+            FOREIGN KEY (voucher_guid, voucher_date)
+            REFERENCES tally_db.trn_voucher (guid, date) ON DELETE CASCADE
+        ', t, t || '_voucher_fkey');
+    END LOOP;
+
+    -- Drop the heap tables (children first)
+    DROP TABLE tally_db.trn_batch_unpartitioned;
+    DROP TABLE tally_db.trn_cost_centre_unpartitioned;
+    DROP TABLE tally_db.trn_bill_unpartitioned;
+    DROP TABLE tally_db.trn_inventory_unpartitioned;
+    DROP TABLE tally_db.trn_accounting_unpartitioned;
+    DROP TABLE tally_db.trn_voucher_unpartitioned;
+
+    -- BRIN indexes on the partition keys. idx_trn_voucher_date takes the name
+    -- of schema.sql's B-tree date index so that re-running it skips that one.
+    CREATE INDEX idx_trn_voucher_date ON tally_db.trn_voucher USING BRIN (date);
+    FOREACH t IN ARRAY children LOOP
+        EXECUTE format('CREATE INDEX %I ON tally_db.%I USING BRIN (voucher_date)', 'idx_' || t || '_voucher_date', t);
+    END LOOP;
+
+    RAISE NOTICE 'Partitioned tally_db transaction tables (% to %)', min_date, max_date;
+END $$;
@@ -447,6 +447,7 @@ CREATE TABLE IF NOT EXISTS tally_db.trn_voucher (
     
     -- Source/tracking
     master_id TEXT,
+    content_hash TEXT,  -- fingerprint of the voucher and its child rows (resyncs skip unchanged)
     
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ DEFAULT NOW()
@@ -465,6 +466,7 @@ CREATE INDEX IF NOT EXISTS idx_trn_voucher_alter_id ON tally_db.trn_voucher(alte
 CREATE TABLE IF NOT EXISTS tally_db.trn_accounting (
     id BIGSERIAL PRIMARY KEY,
     voucher_guid TEXT NOT NULL REFERENCES tally_db.trn_voucher(guid) ON DELETE CASCADE,
+    voucher_date DATE,  -- copy of trn_voucher.date (partition key when partitioned)
     
     -- Ledger details
     ledger TEXT NOT NULL,
@@ -502,6 +504,7 @@ CREATE INDEX IF NOT EXISTS idx_trn_accounting_ledger ON tally_db.trn_accounting(
 CREATE TABLE IF NOT EXISTS tally_db.trn_inventory (
     id BIGSERIAL PRIMARY KEY,
     voucher_guid TEXT NOT NULL REFERENCES tally_db.trn_voucher(guid) ON DELETE CASCADE,
+    voucher_date DATE,  -- copy of trn_voucher.date (partition key when partitioned)
     
     -- Stock item
     stock_item TEXT NOT NULL,
@@ -543,6 +546,7 @@ CREATE INDEX IF NOT EXISTS idx_trn_inventory_godown ON tally_db.trn_inventory(go
 CREATE TABLE IF NOT EXISTS tally_db.trn_bill (
     id BIGSERIAL PRIMARY KEY,
     voucher_guid TEXT NOT NULL REFERENCES tally_db.trn_voucher(guid) ON DELETE CASCADE,
+    voucher_date DATE,  -- copy of trn_voucher.date (partition key when partitioned)
     
     -- Ledger for bill
     ledger TEXT NOT NULL,
@@ -560,6 +564,7 @@ CREATE TABLE IF NOT EXISTS tally_db.trn_bill (
 CREATE INDEX IF NOT EXISTS idx_trn_bill_voucher ON tally_db.trn_bill(voucher_guid);
 CREATE INDEX IF NOT EXISTS idx_trn_bill_ledger ON tally_db.trn_bill(ledger_lower);
 CREATE INDEX IF NOT EXISTS idx_trn_bill_name ON tally_db.trn_bill(name);
+CREATE INDEX IF NOT EXISTS idx_trn_bill_ledger_name ON tally_db.trn_bill(ledger, name);
 
 -- =============================================================================
 -- COST CENTRE ALLOCATIONS
@@ -568,6 +573,7 @@ CREATE INDEX IF NOT EXISTS idx_trn_bill_name ON tally_db.trn_bill(name);
 CREATE TABLE IF NOT EXISTS tally_db.trn_cost_centre (
     id BIGSERIAL PRIMARY KEY,
     voucher_guid TEXT NOT NULL REFERENCES tally_db.trn_voucher(guid) ON DELETE CASCADE,
+    voucher_date DATE,  -- copy of trn_voucher.date (partition key when partitioned)
     accounting_id BIGINT REFERENCES tally_db.trn_accounting(id) ON DELETE CASCADE,
     
     -- Cost centre details
@@ -592,6 +598,7 @@ CREATE INDEX IF NOT EXISTS idx_trn_cost_centre_name ON tally_db.trn_cost_centre(
 CREATE TABLE IF NOT EXISTS tally_db.trn_batch (
     id BIGSERIAL PRIMARY KEY,
     voucher_guid TEXT NOT NULL REFERENCES tally_db.trn_voucher(guid) ON DELETE CASCADE,
+    voucher_date DATE,  -- copy of trn_voucher.date (partition key when partitioned)
     inventory_id BIGINT REFERENCES tally_db.trn_inventory(id) ON DELETE CASCADE,
     
     -- Stock item and godown
@@ -713,6 +720,132 @@ SET
     amount_credit = CASE WHEN amount > 0 THEN amount ELSE 0 END
 WHERE amount_debit = 0 AND amount_credit = 0 AND amount <> 0;
 
+-- =============================================================================
+-- MIGRATION: Add voucher_date to transaction child tables (for existing databases)
+-- Carries the voucher date onto every child row so the tables can be range
+-- partitioned by month (see models/partitioning.sql).
+-- =============================================================================
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['trn_accounting', 'trn_inventory', 'trn_bill', 'trn_cost_centre', 'trn_batch']
+    LOOP
+        IF NOT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = 'tally_db'
+            AND table_name = t
+            AND column_name = 'voucher_date'
+        ) THEN
+            EXECUTE format('ALTER TABLE tally_db.%I ADD COLUMN voucher_date DATE', t);
+        END IF;
+
+        -- Backfill from the parent voucher
+        EXECUTE format('
+            UPDATE tally_db.%I c SET voucher_date = v.date
+            FROM tally_db.trn_voucher v
+            WHERE c.voucher_guid = v.guid AND c.voucher_date IS NULL
+        ', t);
+    END LOOP;
+END $$;
+
+-- =============================================================================
+-- MIGRATION: Add content_hash to trn_voucher (for existing databases)
+-- Vouchers loaded before this column existed have no hash and are rewritten
+-- once by the next resync of their dates.
+-- =============================================================================
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'tally_db'
+        AND table_name = 'trn_voucher'
+        AND column_name = 'content_hash'
+    ) THEN
+        ALTER TABLE tally_db.trn_voucher ADD COLUMN content_hash TEXT;
+    END IF;
+END $$;
+
+-- =============================================================================
+-- MATERIALIZED LEDGER BALANCE
+-- Per-ledger transaction totals maintained by TransactionLoader: every batch
+-- subtracts the accounting rows it replaces and adds the rows it inserts.
+-- Rebuild with TransactionLoader.refresh_ledger_balance() if it ever drifts.
+-- =============================================================================
+
+CREATE TABLE IF NOT EXISTS tally_db.ledger_balance (
+    ledger_lower TEXT PRIMARY KEY,
+    ledger TEXT,
+
+    total_debit NUMERIC(17, 2) NOT NULL DEFAULT 0,
+    total_credit NUMERIC(17, 2) NOT NULL DEFAULT 0,
+    transaction_total NUMERIC(17, 2) NOT NULL DEFAULT 0,
+    entry_count BIGINT NOT NULL DEFAULT 0,
+
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Seed from existing accounting entries (only when the table is new/empty)
+INSERT INTO tally_db.ledger_balance
+    (ledger_lower, ledger, total_debit, total_credit, transaction_total, entry_count)
+SELECT
+    ledger_lower,
+    MIN(ledger),
+    COALESCE(SUM(amount_debit), 0),
+    COALESCE(SUM(amount_credit), 0),
+    COALESCE(SUM(amount), 0),
+    COUNT(*)
+FROM tally_db.trn_accounting
+WHERE ledger_lower IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM tally_db.ledger_balance)
+GROUP BY ledger_lower;
+
+-- =============================================================================
+-- MATERIALIZED BILLS OUTSTANDING
+-- Snapshot of view_bills_outstanding with precomputed ageing. Refreshed per
+-- ledger by TransactionLoader.load_bill_allocations and
+-- MasterLoader.load_opening_bills; view_bills_outstanding remains the
+-- verification path (see DatabaseLoader.check_bills_outstanding).
+-- =============================================================================
+
+CREATE TABLE IF NOT EXISTS tally_db.bills_outstanding (
+    ledger TEXT NOT NULL,
+    bill_name TEXT NOT NULL,
+    bill_date DATE,
+    due_date DATE,
+    original_amount NUMERIC(17, 2),
+    adjusted_amount NUMERIC(17, 2),
+    pending_amount NUMERIC(17, 2),
+    is_advance BOOLEAN,
+    last_adjusted_date DATE,
+
+    -- Ageing relative to ageing_as_of (days since bill_date)
+    age_days INTEGER,
+    ageing_bucket TEXT,  -- '0-30', '31-60', '61-90', '90+', 'No Date'
+    ageing_as_of DATE NOT NULL DEFAULT CURRENT_DATE,
+
+    refreshed_at TIMESTAMPTZ DEFAULT NOW(),
+
+    PRIMARY KEY (ledger, bill_name)
+);
+
+CREATE INDEX IF NOT EXISTS idx_bills_outstanding_bucket ON tally_db.bills_outstanding(ageing_bucket);
+CREATE INDEX IF NOT EXISTS idx_bills_outstanding_bill_date ON tally_db.bills_outstanding(bill_date);
+CREATE INDEX IF NOT EXISTS idx_bills_outstanding_due_date ON tally_db.bills_outstanding(due_date);
+CREATE INDEX IF NOT EXISTS idx_bills_outstanding_as_of ON tally_db.bills_outstanding(ageing_as_of);
+CREATE INDEX IF NOT EXISTS idx_bills_outstanding_ledger_lower ON tally_db.bills_outstanding(LOWER(ledger));
+
+CREATE OR REPLACE FUNCTION tally_db.bill_ageing_bucket(age_days INTEGER)
+RETURNS TEXT AS $$
+    SELECT CASE
+        WHEN age_days IS NULL THEN 'No Date'
+        WHEN age_days <= 30 THEN '0-30'
+        WHEN age_days <= 60 THEN '31-60'
+        WHEN age_days <= 90 THEN '61-90'
+        ELSE '90+'
+    END;
+$$ LANGUAGE sql IMMUTABLE;
+
 -- =============================================================================
 -- COMPUTED VIEWS
 -- =============================================================================
@@ -815,8 +948,22 @@ FROM bill_summary
 -- Only show bills with non-zero pending balance
 WHERE ABS(opening_balance + new_ref_total + advance_total + adjusted_total) > 0.01;
 
+-- Seed the materialized snapshot (only when the table is new/empty)
+INSERT INTO tally_db.bills_outstanding
+    (ledger, bill_name, bill_date, due_date, original_amount, adjusted_amount,
+     pending_amount, is_advance, last_adjusted_date, age_days, ageing_bucket, ageing_as_of)
+SELECT
+    ledger, bill_name, bill_date, due_date, original_amount, adjusted_amount,
+    pending_amount, is_advance, last_adjusted_date,
+    CURRENT_DATE - bill_date,
+    tally_db.bill_ageing_bucket(CURRENT_DATE - bill_date),
+    CURRENT_DATE
+FROM tally_db.view_bills_outstanding
+WHERE NOT EXISTS (SELECT 1 FROM tally_db.bills_outstanding);
+
 -- Drop existing views first to allow column type changes
 DROP VIEW IF EXISTS tally_db.view_ledger_balance CASCADE;
+DROP VIEW IF EXISTS tally_db.view_ledger_balance_live CASCADE;
 DROP VIEW IF EXISTS tally_db.view_ledger_opening_balance CASCADE;
 
 -- View to aggregate opening balances from bill allocations per ledger
@@ -833,7 +980,29 @@ GROUP BY ob.ledger;
 -- Ledger balance view (uses opening balance from bill allocations when available)
 -- Falls back to ledger's opening_balance if no bill allocations exist
 -- Following open source tally-database-loader approach with separate debit/credit columns
+--
+-- Reads transaction totals from the materialized ledger_balance table, so a
+-- trial balance is a primary-key lookup per ledger instead of a scan of
+-- trn_accounting.
 CREATE OR REPLACE VIEW tally_db.view_ledger_balance AS
+SELECT
+    l.name AS ledger,
+    l.parent AS group_name,
+    l.primary_group,
+    COALESCE(ob.opening_balance_from_bills, l.opening_balance, 0)::NUMERIC(17,2) AS opening_balance,
+    l.opening_balance AS ledger_opening_balance,
+    ob.opening_balance_from_bills AS bills_opening_balance,
+    COALESCE(lb.total_debit, 0)::NUMERIC(17,2) AS total_debit,
+    COALESCE(lb.total_credit, 0)::NUMERIC(17,2) AS total_credit,
+    COALESCE(lb.transaction_total, 0)::NUMERIC(17,2) AS transaction_total,
+    (COALESCE(ob.opening_balance_from_bills, l.opening_balance, 0) + COALESCE(lb.transaction_total, 0))::NUMERIC(17,2) AS closing_balance
+FROM tally_db.mst_ledger l
+LEFT JOIN tally_db.view_ledger_opening_balance ob ON ob.ledger_lower = l.name_lower
+LEFT JOIN tally_db.ledger_balance lb ON lb.ledger_lower = l.name_lower;
+
+-- Same columns computed directly from trn_accounting (verification path for
+-- the materialized ledger_balance table)
+CREATE OR REPLACE VIEW tally_db.view_ledger_balance_live AS
 SELECT
     l.name AS ledger,
     l.parent AS group_name,
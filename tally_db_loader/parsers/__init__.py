@@ -24,6 +24,7 @@ from .masters import (
 )
 from .transactions import (
     parse_vouchers,
+    parse_voucher_manifest,
     parse_accounting_entries,
     parse_inventory_entries,
     parse_bill_allocations,
@@ -55,6 +56,7 @@ __all__ = [
     "parse_opening_bill_allocations",
     # Transactions
     "parse_vouchers",
+    "parse_voucher_manifest",
     "parse_accounting_entries",
     "parse_inventory_entries",
     "parse_bill_allocations",
@@ -9,6 +9,8 @@ Handles vouchers and all related entries:
 - Batch allocations
 """
 from __future__ import annotations
+import hashlib
+import json
 from typing import Generator
 from lxml import etree
 from .base import (
@@ -37,7 +39,8 @@ def parse_vouchers(xml_text: str) -> dict:
     - Batch allocations
     
     Returns dict with keys:
-    - vouchers: list of voucher header dicts
+    - vouchers: list of voucher header dicts (each with a content_hash,
+      see voucher_content_hash)
     - accounting: list of accounting entry dicts
     - inventory: list of inventory entry dicts
     - bills: list of bill allocation dicts
@@ -110,22 +113,30 @@ def parse_vouchers(xml_text: str) -> dict:
         if voucher["party_name"]:
             voucher["party_name_lower"] = voucher["party_name"].lower()
         
+        children = {
+            # Accounting (ledger) entries
+            "accounting": _parse_accounting_entries(elem, guid),
+            "inventory": _parse_inventory_entries(elem, guid),
+            # Bill allocations (from all ledger entries)
+            "bills": _parse_bill_allocations(elem, guid),
+            "cost_centres": _parse_cost_centre_allocations(elem, guid),
+            "batches": _parse_batch_allocations(elem, guid),
+        }
+        voucher["content_hash"] = voucher_content_hash(voucher, children)
         vouchers.append(voucher)
         
-        # Parse accounting (ledger) entries
-        accounting.extend(_parse_accounting_entries(elem, guid))
-        
-        # Parse inventory entries
-        inventory.extend(_parse_inventory_entries(elem, guid))
-        
-        # Parse bill allocations (from all ledger entries)
-        bills.extend(_parse_bill_allocations(elem, guid))
-        
-        # Parse cost centre allocations
-        cost_centres.extend(_parse_cost_centre_allocations(elem, guid))
-        
-        # Parse batch allocations
-        batches.extend(_parse_batch_allocations(elem, guid))
+        accounting.extend(children["accounting"])
+        inventory.extend(children["inventory"])
+        bills.extend(children["bills"])
+        cost_centres.extend(children["cost_centres"])
+        batches.extend(children["batches"])
+    
+    # Stamp child rows with their voucher's date (partition key for the
+    # child tables when trn_* is partitioned by month)
+    voucher_dates = {v["guid"]: v["date"] for v in vouchers}
+    for rows in (accounting, inventory, bills, cost_centres, batches):
+        for row in rows:
+            row["voucher_date"] = voucher_dates.get(row["voucher_guid"])
     
     logger.debug(
         f"Parsed {len(vouchers)} vouchers, {len(accounting)} accounting entries, "
@@ -143,6 +154,46 @@ def parse_vouchers(xml_text: str) -> dict:
     }
 
 
+def parse_voucher_manifest(xml_text: str) -> list[dict]:
+    """
+    Parse the lean voucher manifest (requests/voucher_manifest.xml.j2).
+    
+    Returns list of dicts with guid, alter_id and date, one per voucher.
+    Vouchers without a GUID cannot be matched to trn_voucher and are left out.
+    """
+    parser = TallyXMLParser(xml_text)
+    
+    manifest = []
+    seen = set()
+    for elem in parser.find_all(".//VOUCHER"):
+        guid = attr(elem, "GUID") or text(elem, "GUID")
+        if not guid or guid in seen:
+            continue
+        seen.add(guid)
+        manifest.append({
+            "guid": guid,
+            "alter_id": extract_alter_id(elem),
+            "date": parse_tally_date(text(elem, "DATE")),
+        })
+    
+    logger.debug(f"Parsed manifest of {len(manifest)} vouchers")
+    return manifest
+
+
+def voucher_content_hash(voucher: dict, children: dict[str, list[dict]]) -> str:
+    """
+    Fingerprint a parsed voucher: GUID, AlterID and every header field, plus
+    its child rows in document order.
+    
+    Stored in trn_voucher.content_hash; a voucher whose hash matches the
+    stored one would be rewritten with identical rows, so resyncs skip it.
+    """
+    payload = json.dumps(
+        [voucher, children], sort_keys=True, default=str, separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
 def _extract_voucher_amount(elem: etree._Element) -> float:
     """Extract total amount from voucher, trying multiple sources."""
     # Try direct amount field
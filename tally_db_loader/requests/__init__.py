@@ -24,6 +24,8 @@ TEMPLATES = {
     "currencies": "currencies.xml.j2",
     "vouchers": "vouchers.xml.j2",
     "vouchers_detailed": "vouchers_detailed.xml.j2",
+    "voucher_manifest": "voucher_manifest.xml.j2",
+    "vouchers_by_guid": "vouchers_by_guid.xml.j2",
     "closing_stock": "closing_stock.xml.j2",
 }
 
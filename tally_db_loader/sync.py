@@ -8,6 +8,7 @@ Provides:
 - Date range sync: Transactions in a date range
 """
 from __future__ import annotations
+import dataclasses
 import sys
 from datetime import date, timedelta
 from pathlib import Path
@@ -15,10 +16,12 @@ from typing import Optional
 from jinja2 import Template
 from loguru import logger
 from time import sleep
+from xml.sax.saxutils import escape
 
 from .config import TallyLoaderConfig
 from .client import TallyLoaderClient, TallyConnectionError, TallyResponseError
-from .loaders import MasterLoader, TransactionLoader
+from .loaders import MasterLoader, TransactionLoader, UpsertResult
+from .loaders.transactions import diff_voucher_manifest
 from .parsers.masters import (
     parse_company,
     parse_groups,
@@ -34,12 +37,16 @@ from .parsers.masters import (
     parse_currencies,
     parse_opening_bill_allocations,
 )
-from .parsers.transactions import parse_vouchers, parse_closing_stock
+from .parsers.transactions import parse_vouchers, parse_voucher_manifest, parse_closing_stock
+from .models import get_partitioning_sql, get_schema_checksum, get_schema_sql
 
 
 # Request templates directory
 REQUESTS_DIR = Path(__file__).parent / "requests"
 
+# Vouchers fetched per GUID-filtered request in reconcile_transactions
+MANIFEST_GUID_BATCH = 100
+
 
 class TallySync:
     """
@@ -144,7 +151,10 @@ class TallySync:
         self.config = config or TallyLoaderConfig.from_env()
         self.client = TallyLoaderClient(self.config)
         self.master_loader = MasterLoader(self.config)
-        self.transaction_loader = TransactionLoader(self.config)
+        # Masters and transactions load one after the other: one connection
+        self.transaction_loader = TransactionLoader(self.config, share_with=self.master_loader)
+        # Per master entity: rows written vs skipped as unchanged this run
+        self.master_changes: dict[str, UpsertResult] = {}
     
     def _load_template(self, template_name: str) -> str:
         """Load a request template."""
@@ -159,8 +169,9 @@ class TallySync:
         company: Optional[str] = None,
         from_date: Optional[date] = None,
         to_date: Optional[date] = None,
+        **extra,
     ) -> str:
-        """Render a request template with variables."""
+        """Render a request template with variables (extra: template-specific ones)."""
         template_str = self._load_template(template_name)
         template = Template(template_str)
         
@@ -172,6 +183,7 @@ class TallySync:
             context["from_date"] = from_date.strftime("%d-%b-%Y")
         if to_date:
             context["to_date"] = to_date.strftime("%d-%b-%Y")
+        context.update(extra)
         
         return template.render(**context)
     
@@ -179,17 +191,41 @@ class TallySync:
         """Test connection to Tally."""
         return self.client.test_connection()
     
-    def initialize_schema(self):
-        """Create database schema and tables if they don't exist."""
+    def initialize_schema(self, force: bool = False):
+        """
+        Create database schema and tables if they don't exist.
+        
+        schema.sql is applied once per version of the file (tracked in
+        <schema>.schema_version), so syncs don't re-run its view, trigger and
+        backfill DDL every time. force=True re-applies it, e.g. to recreate
+        indexes or views that were dropped on purpose.
+        """
         schema_file = Path(__file__).parent / "models" / "schema.sql"
         if schema_file.exists():
-            self.master_loader.execute_ddl(str(schema_file))
-            logger.info("Database schema initialized")
+            applied = self.master_loader.apply_versioned_sql(
+                "schema.sql", get_schema_sql(self.config.db_schema), get_schema_checksum(), force=force
+            )
+            if applied:
+                logger.info(f"Database schema {self.config.db_schema} initialized")
+            else:
+                logger.debug(f"Database schema {self.config.db_schema} up to date")
         else:
             # Just create the schema
             self.master_loader.ensure_schema()
             logger.warning(f"Schema file not found at {schema_file}, only created schema")
     
+    def partition_tables(self):
+        """
+        Convert trn_* tables to monthly range partitions (one-time migration).
+        
+        Applies schema.sql before (so child tables carry voucher_date) and
+        after (to recreate the views dropped by the conversion).
+        """
+        self.initialize_schema()
+        self.transaction_loader.partition_tables()
+        self.initialize_schema(force=True)
+        logger.info("Transaction tables partitioned by month")
+    
     def sync_master(self, entity_name: str, save_xml: bool = False) -> int:
         """
         Sync a single master entity.
@@ -224,10 +260,12 @@ class TallySync:
             parsed_data = parser(xml_response)
             
             # Handle ledgers special case (returns tuple)
+            self.master_loader.last_upsert = None
             if entity_config.get("has_opening_bills"):
                 ledgers, opening_bills = parsed_data
                 loader_method = getattr(self.master_loader, entity_config["loader_method"])
                 count = loader_method(ledgers)
+                changes = self.master_loader.last_upsert
                 
                 # Also load opening bills
                 if opening_bills:
@@ -236,6 +274,7 @@ class TallySync:
             else:
                 loader_method = getattr(self.master_loader, entity_config["loader_method"])
                 count = loader_method(parsed_data)
+                changes = self.master_loader.last_upsert
             
             # Update checkpoint
             self.master_loader.update_checkpoint(
@@ -244,7 +283,11 @@ class TallySync:
                 status="completed",
             )
             
-            logger.info(f"  Synced {count} {entity_name}")
+            if changes is not None:
+                self.master_changes[entity_name] = changes
+                logger.info(f"  Synced {count} {entity_name} ({changes})")
+            else:
+                logger.info(f"  Synced {count} {entity_name}")
             return count
             
         except Exception as e:
@@ -278,6 +321,14 @@ class TallySync:
         
         return results
     
+    def _master_rows_changed(self) -> int:
+        """Master rows written (inserted or changed) by sync_master so far."""
+        changed = sum(c.changed for c in self.master_changes.values())
+        unchanged = sum(c.unchanged for c in self.master_changes.values())
+        if self.master_changes:
+            logger.info(f"Masters: {changed} rows changed, {unchanged} unchanged")
+        return changed
+    
     def sync_opening_bills(self, save_xml: bool = False) -> int:
         """
         Sync opening bill allocations from ledger masters.
@@ -341,7 +392,10 @@ class TallySync:
             from_date: Start date (defaults to company's books_from, or current FY start)
             to_date: End date (defaults to today)
             batch_days: Days per batch to avoid timeout
-            delete_existing: Whether to delete existing data in range first
+            delete_existing: Whether to replace data already stored in the
+                range: unchanged vouchers (same content_hash) are skipped,
+                changed ones rewritten and vanished ones deleted. False when
+                the tables start empty.
             
         Returns:
             Dict with counts by entity type
@@ -365,11 +419,6 @@ class TallySync:
         
         logger.info(f"Syncing transactions from {from_date} to {to_date}")
         
-        # Optionally delete existing data in range
-        if delete_existing:
-            deleted = self.transaction_loader.delete_vouchers_in_range(from_date, to_date)
-            logger.info(f"Deleted {deleted} existing vouchers in range")
-        
         # Process in batches
         total_counts = {
             "vouchers": 0,
@@ -380,6 +429,8 @@ class TallySync:
             "batches": 0,
         }
         
+        unchanged = deleted = 0
+        
         current_date = from_date
         batch_num = 0
         
@@ -402,7 +453,14 @@ class TallySync:
                 parsed_data = parse_vouchers(xml_response)
                 
                 # Load into database
-                batch_counts = self.transaction_loader.load_all_transaction_data(parsed_data)
+                if delete_existing:
+                    batch_counts = self.transaction_loader.replace_voucher_window(
+                        parsed_data, current_date, batch_end
+                    )
+                    unchanged += batch_counts.pop("unchanged")
+                    deleted += batch_counts.pop("deleted")
+                else:
+                    batch_counts = self.transaction_loader.load_all_transaction_data(parsed_data)
                 
                 # Accumulate counts
                 for key, val in batch_counts.items():
@@ -427,9 +485,101 @@ class TallySync:
             status="completed",
         )
         
+        if delete_existing:
+            logger.info(f"Skipped {unchanged} unchanged vouchers, deleted {deleted} no longer in Tally")
         logger.info(f"Transaction sync complete: {total_counts}")
         return total_counts
     
+    def reconcile_transactions(
+        self,
+        from_date: Optional[date] = None,
+        to_date: Optional[date] = None,
+        batch_days: int = 31,
+    ) -> dict:
+        """
+        Bring stored vouchers in line with Tally using a GUID/AlterID manifest.
+        
+        Per window, a lean request lists (GUID, AlterID, date) for every
+        voucher and is diffed against trn_voucher. Only new or altered
+        vouchers are then fetched in full (by GUID, MANIFEST_GUID_BATCH at a
+        time), and vouchers Tally no longer has are deleted. A year with few
+        edits costs about one small request per window instead of a full
+        export.
+        
+        Args:
+            from_date: Start date (defaults to company's books_from, or current FY start)
+            to_date: End date (defaults to today)
+            batch_days: Days per manifest request
+            
+        Returns:
+            Dict with counts by entity type written, plus "deleted" and
+            "unchanged" voucher counts
+        """
+        if from_date is None:
+            from_date = self._get_books_from_date()
+            if from_date is None:
+                today = date.today()
+                from_date = date(today.year if today.month >= 4 else today.year - 1, 4, 1)
+        if to_date is None:
+            to_date = date.today()
+        
+        logger.info(f"Reconciling transactions from {from_date} to {to_date}")
+        
+        total_counts = {
+            "vouchers": 0,
+            "accounting": 0,
+            "inventory": 0,
+            "bills": 0,
+            "cost_centres": 0,
+            "batches": 0,
+            "deleted": 0,
+            "unchanged": 0,
+        }
+        
+        current_date = from_date
+        while current_date <= to_date:
+            batch_end = min(current_date + timedelta(days=batch_days - 1), to_date)
+            
+            xml_request = self._render_template(
+                "voucher_manifest.xml.j2", from_date=current_date, to_date=batch_end
+            )
+            manifest = parse_voucher_manifest(self.client.post_xml(xml_request))
+            stored = self.transaction_loader.get_voucher_manifest(
+                current_date, batch_end, [row["guid"] for row in manifest]
+            )
+            wanted, missing = diff_voucher_manifest(manifest, stored, current_date, batch_end)
+            
+            total_counts["deleted"] += self.transaction_loader.delete_vouchers(missing)
+            total_counts["unchanged"] += len(manifest) - len(wanted)
+            
+            for i in range(0, len(wanted), MANIFEST_GUID_BATCH):
+                chunk = wanted[i:i + MANIFEST_GUID_BATCH]
+                dates = [row["date"] for row in chunk if row["date"]]
+                xml_request = self._render_template(
+                    "vouchers_by_guid.xml.j2",
+                    from_date=min(dates, default=current_date),
+                    to_date=max(dates, default=batch_end),
+                    guid_filter=escape(" OR ".join(f'$GUID = "{row["guid"]}"' for row in chunk)),
+                )
+                parsed_data = parse_vouchers(self.client.post_xml(xml_request))
+                for key, val in self.transaction_loader.reload_vouchers(parsed_data).items():
+                    total_counts[key] += val
+            
+            logger.info(
+                f"  {current_date} to {batch_end}: {len(manifest)} vouchers in Tally, "
+                f"{len(wanted)} fetched, {len(missing)} deleted"
+            )
+            current_date = batch_end + timedelta(days=1)
+        
+        self.transaction_loader.update_checkpoint(
+            "transactions",
+            row_count=total_counts["vouchers"],
+            status="completed",
+        )
+        
+        logger.info(f"Transaction reconcile complete: {total_counts}")
+        return total_counts
+    
     def sync_closing_stock(self, as_of_date: Optional[date] = None) -> int:
         """
         Sync closing stock as of a specific date.
@@ -458,6 +608,22 @@ class TallySync:
         logger.info(f"Synced {count} closing stock entries")
         return count
     
+    def refresh_ledger_balance(self) -> int:
+        """Rebuild the materialized ledger_balance table from trn_accounting."""
+        return self.transaction_loader.refresh_ledger_balance()
+
+    def check_ledger_balance(self) -> list[dict]:
+        """Return ledgers whose materialized balance disagrees with trn_accounting."""
+        return self.transaction_loader.check_ledger_balance()
+
+    def refresh_bills_outstanding(self) -> int:
+        """Rebuild the materialized bills_outstanding table from view_bills_outstanding."""
+        return self.transaction_loader.refresh_bills_outstanding()
+
+    def check_bills_outstanding(self) -> list[dict]:
+        """Return bills whose materialized snapshot disagrees with view_bills_outstanding."""
+        return self.transaction_loader.check_bills_outstanding()
+
     def _get_books_from_date(self) -> Optional[date]:
         """
         Get the books_from date for transaction sync.
@@ -482,6 +648,7 @@ class TallySync:
         to_date: Optional[date] = None,
         include_transactions: bool = True,
         include_closing_stock: bool = True,
+        shadow: bool = False,
     ) -> dict:
         """
         Run a complete full sync of all data.
@@ -491,61 +658,40 @@ class TallySync:
             to_date: Transaction end date (defaults to today)
             include_transactions: Whether to sync transactions
             include_closing_stock: Whether to sync closing stock
+            shadow: Load into a shadow schema and swap it in atomically at the
+                end, so the current data stays readable during the sync
             
         Returns:
             Dict with sync results
         """
+        if shadow and not include_transactions:
+            raise ValueError("Shadow full sync must include transactions")
+        
         log_id = self.master_loader.log_sync("full", status="running")
         
         try:
-            results = {
-                "masters": {},
-                "opening_bills": 0,
-                "transactions": {},
-                "closing_stock": 0,
-            }
-            
             # Initialize schema
             self.initialize_schema()
             
-            # Clear all existing transaction data before full sync to prevent duplicates
-            logger.info("=== Clearing Existing Transaction Data ===")
-            self.transaction_loader.clear_all_transactions()
-            
-            # Sync all masters
-            logger.info("=== Syncing Master Data ===")
-            results["masters"] = self.sync_masters()
-            
-            # Sync opening bills (separate step using "List of Accounts")
-            logger.info("=== Syncing Opening Bill Allocations ===")
-            results["opening_bills"] = self.sync_opening_bills()
-            
-            # Determine transaction date range
-            # For full sync: use company's books_from date as default start
-            # This ensures transactions are loaded from the same date as opening balances
-            if from_date is None:
-                from_date = self._get_books_from_date()
-                if from_date:
-                    logger.info(f"Using company books_from date as transaction start: {from_date}")
-            
-            # Sync transactions
-            if include_transactions:
-                logger.info("=== Syncing Transactions ===")
-                # Don't delete_existing since we already cleared all
-                results["transactions"] = self.sync_transactions(
-                    from_date, to_date, delete_existing=False
+            if shadow:
+                results = self._run_shadow_full_sync(
+                    from_date, to_date, include_closing_stock
+                )
+            else:
+                # Clear all existing transaction data before full sync to prevent duplicates
+                logger.info("=== Clearing Existing Transaction Data ===")
+                self.transaction_loader.clear_all_transactions()
+                
+                results = self._full_sync_steps(
+                    from_date, to_date, include_transactions, include_closing_stock
                 )
-            
-            # Sync closing stock
-            if include_closing_stock:
-                logger.info("=== Syncing Closing Stock ===")
-                results["closing_stock"] = self.sync_closing_stock(to_date)
             
             # Update log
             total_rows = sum(results["masters"].values()) + sum(results["transactions"].values())
             self.master_loader.update_sync_log(
                 log_id,
                 rows_processed=total_rows,
+                rows_updated=self._master_rows_changed(),
                 status="completed",
             )
             
@@ -560,6 +706,118 @@ class TallySync:
             )
             raise
     
+    def _full_sync_steps(
+        self,
+        from_date: Optional[date],
+        to_date: Optional[date],
+        include_transactions: bool,
+        include_closing_stock: bool,
+    ) -> dict:
+        """Load masters, opening bills, transactions and closing stock into empty tables."""
+        results = {
+            "masters": {},
+            "opening_bills": 0,
+            "transactions": {},
+            "closing_stock": 0,
+        }
+        
+        # Sync all masters
+        logger.info("=== Syncing Master Data ===")
+        results["masters"] = self.sync_masters()
+        
+        # Sync opening bills (separate step using "List of Accounts")
+        logger.info("=== Syncing Opening Bill Allocations ===")
+        results["opening_bills"] = self.sync_opening_bills()
+        
+        # Determine transaction date range
+        # For full sync: use company's books_from date as default start
+        # This ensures transactions are loaded from the same date as opening balances
+        if from_date is None:
+            from_date = self._get_books_from_date()
+            if from_date:
+                logger.info(f"Using company books_from date as transaction start: {from_date}")
+        
+        # Sync transactions
+        if include_transactions:
+            logger.info("=== Syncing Transactions ===")
+            # Don't delete_existing since the tables start empty
+            results["transactions"] = self.sync_transactions(
+                from_date, to_date, delete_existing=False
+            )
+        
+        # Sync closing stock
+        if include_closing_stock:
+            logger.info("=== Syncing Closing Stock ===")
+            results["closing_stock"] = self.sync_closing_stock(to_date)
+        
+        return results
+    
+    def _run_shadow_full_sync(
+        self,
+        from_date: Optional[date],
+        to_date: Optional[date],
+        include_closing_stock: bool,
+    ) -> dict:
+        """
+        Full sync into <schema>_shadow, then swap it in for <schema>.
+        
+        The shadow schema gets the same layout as the live one (partitioned
+        or not). Secondary indexes are dropped before the load and built once
+        afterwards. The swap renames the two schemas in one transaction, so
+        readers see either the old data or the new, never an empty or partly
+        loaded set, and the live tables accumulate no dead tuples.
+        """
+        schema = self.config.db_schema
+        shadow_schema = f"{schema}_shadow"
+        
+        logger.info(f"=== Preparing Shadow Schema {shadow_schema} ===")
+        self.master_loader.create_shadow_schema(shadow_schema)
+        shadow = TallySync(dataclasses.replace(self.config, db_schema=shadow_schema))
+        
+        try:
+            shadow.initialize_schema()
+            if self.transaction_loader.is_partitioned:
+                shadow.transaction_loader.partition_tables()
+            shadow.master_loader.drop_secondary_indexes(keep=["idx_trn_bill_ledger_name"])
+            
+            results = shadow._full_sync_steps(
+                from_date, to_date, True, include_closing_stock
+            )
+            self.master_changes.update(shadow.master_changes)
+            
+            # Build the dropped indexes (and views) once, over the loaded data
+            logger.info("=== Building Shadow Indexes ===")
+            shadow.initialize_schema(force=True)
+            shadow.master_loader.analyze_schema()
+        except Exception:
+            shadow.close(discard=True)
+            self.master_loader.drop_schema(shadow_schema)
+            raise
+        shadow.close(discard=True)
+        
+        # History lives only in the live schema; closing stock is kept as-is
+        # when it was not reloaded
+        carry_tables = ["sync_log", "sync_checkpoint"]
+        if not include_closing_stock:
+            carry_tables.append("trn_closing_stock")
+        
+        # The partition functions were created naming the shadow schema;
+        # redefine them for the live name as part of the swap
+        rebind_sql = None
+        if self.transaction_loader.is_partitioned:
+            rebind_sql = get_partitioning_sql(schema)
+        
+        logger.info(f"=== Swapping {shadow_schema} in as {schema} ===")
+        retired = self.master_loader.swap_shadow_schema(shadow_schema, carry_tables, rebind_sql)
+        
+        # Reconnect so nothing cached (or prepared) on the old connection
+        # refers to the retired tables
+        self.master_loader.close(discard=True)
+        self.transaction_loader._partitioned = None
+        self.master_loader.drop_schema(retired)
+        
+        return results
+    
     def run_incremental_sync(self) -> dict:
         """
         Run an incremental sync (only changed data).
@@ -601,6 +859,7 @@ class TallySync:
             self.master_loader.update_sync_log(
                 log_id,
                 rows_processed=total_rows,
+                rows_updated=self._master_rows_changed(),
                 status="completed",
             )
             
@@ -615,11 +874,11 @@ class TallySync:
             )
             raise
     
-    def close(self):
-        """Close all connections."""
+    def close(self, discard: bool = False):
+        """Close the Tally client and return the connection to the pool."""
         self.client.close()
-        self.master_loader.close()
-        self.transaction_loader.close()
+        self.master_loader.close(discard=discard)
+        self.transaction_loader.close(discard=discard)
     
     def __enter__(self):
         return self
@@ -635,6 +894,7 @@ def run_sync(
     from_date: Optional[date] = None,
     to_date: Optional[date] = None,
     config: Optional[TallyLoaderConfig] = None,
+    shadow: bool = False,
 ) -> dict:
     """
     Convenience function to run sync.
@@ -645,13 +905,14 @@ def run_sync(
         from_date: Start date for transactions
         to_date: End date for transactions
         config: Optional config override
+        shadow: For 'full' mode, load into a shadow schema and swap it in
         
     Returns:
         Dict with sync results
     """
     with TallySync(config) as sync:
         if mode == "full":
-            return sync.run_full_sync(from_date, to_date)
+            return sync.run_full_sync(from_date, to_date, shadow=shadow)
         elif mode == "incremental":
             return sync.run_incremental_sync()
         elif mode == "masters":
@@ -721,7 +982,7 @@ if __name__ == "__main__":
                 sys.exit(0 if result["status"] == "connected" else 1)
             
             if args.init_only:
-                sync.initialize_schema()
+                sync.initialize_schema(force=True)
                 print("Schema initialized successfully")
                 sys.exit(0)
             
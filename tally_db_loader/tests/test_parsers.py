@@ -17,7 +17,7 @@ from tally_db_loader.parsers.masters import (
     parse_ledgers,
     parse_stock_items,
 )
-from tally_db_loader.parsers.transactions import parse_vouchers
+from tally_db_loader.parsers.transactions import parse_voucher_manifest, parse_vouchers
 
 
 class TestBaseParsers:
@@ -264,6 +264,30 @@ class TestTransactionParsers:
         assert bill["name"] == "INV-2024-001"
         assert bill["bill_type"] == "New Ref"
         assert bill["amount"] == -11800
+    
+    def test_voucher_content_hash(self):
+        """The fingerprint is stable and covers child rows."""
+        first = parse_vouchers(self.SAMPLE_VOUCHER_XML)["vouchers"][0]["content_hash"]
+        again = parse_vouchers(self.SAMPLE_VOUCHER_XML)["vouchers"][0]["content_hash"]
+        edited = parse_vouchers(
+            self.SAMPLE_VOUCHER_XML.replace("<RATE>1000</RATE>", "<RATE>999</RATE>")
+        )["vouchers"][0]["content_hash"]
+        
+        assert first == again
+        assert edited != first
+    
+    def test_parse_voucher_manifest(self):
+        """The manifest keeps GUID, AlterID and date only."""
+        xml = """
+        <ENVELOPE><BODY><DATA><COLLECTION>
+            <VOUCHER><GUID>g1</GUID><ALTERID> 1 204</ALTERID><DATE>20240415</DATE></VOUCHER>
+            <VOUCHER><GUID>g1</GUID><ALTERID>1204</ALTERID><DATE>20240415</DATE></VOUCHER>
+            <VOUCHER><ALTERID>7</ALTERID><DATE>20240416</DATE></VOUCHER>
+        </COLLECTION></DATA></BODY></ENVELOPE>
+        """
+        assert parse_voucher_manifest(xml) == [
+            {"guid": "g1", "alter_id": 1204, "date": date(2024, 4, 15)},
+        ]
 
 
 # Run tests directly
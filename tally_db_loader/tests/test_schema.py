@@ -0,0 +1,197 @@
+"""
+Static checks for tally_db schema DDL.
+
+These do not connect to a database; they guard against accidental edits to
+models/schema.sql that would break the loaders relying on it.
+"""
+from datetime import date
+from unittest.mock import MagicMock
+
+from tally_db_loader.config import TallyLoaderConfig
+from tally_db_loader.loaders.base import DatabaseLoader
+from tally_db_loader.loaders.transactions import split_month_ranges
+from tally_db_loader.models import get_partitioning_sql, get_schema_sql
+
+
+class TestLedgerBalanceSchema:
+    """Tests for the materialized ledger balance table."""
+
+    def test_table_present(self):
+        sql = get_schema_sql()
+        assert "CREATE TABLE IF NOT EXISTS tally_db.ledger_balance" in sql
+        for fragment in [
+            "ledger_lower TEXT PRIMARY KEY",
+            "total_debit NUMERIC(17, 2)",
+            "total_credit NUMERIC(17, 2)",
+            "transaction_total NUMERIC(17, 2)",
+            "entry_count BIGINT",
+        ]:
+            assert fragment in sql, f"Expected column fragment missing: {fragment}"
+
+    def test_view_reads_materialized_table(self):
+        sql = get_schema_sql()
+        view = sql.split("CREATE OR REPLACE VIEW tally_db.view_ledger_balance AS", 1)[1]
+        view = view.split(";", 1)[0]
+        assert "tally_db.ledger_balance" in view
+        assert "trn_accounting" not in view
+
+    def test_live_view_kept_for_verification(self):
+        sql = get_schema_sql()
+        live = sql.split("CREATE OR REPLACE VIEW tally_db.view_ledger_balance_live AS", 1)[1]
+        live = live.split(";", 1)[0]
+        assert "tally_db.trn_accounting" in live
+
+
+class TestBillsOutstandingSchema:
+    """Tests for the materialized outstanding bills snapshot."""
+
+    def test_table_present(self):
+        sql = get_schema_sql()
+        assert "CREATE TABLE IF NOT EXISTS tally_db.bills_outstanding" in sql
+        for fragment in [
+            "pending_amount NUMERIC(17, 2)",
+            "age_days INTEGER",
+            "ageing_bucket TEXT",
+            "PRIMARY KEY (ledger, bill_name)",
+        ]:
+            assert fragment in sql, f"Expected column fragment missing: {fragment}"
+        for idx in [
+            "idx_bills_outstanding_bucket",
+            "idx_bills_outstanding_due_date",
+            "idx_trn_bill_ledger_name",
+        ]:
+            assert idx in sql, f"Expected index missing: {idx}"
+
+    def test_ageing_buckets(self):
+        sql = get_schema_sql()
+        func = sql.split("CREATE OR REPLACE FUNCTION tally_db.bill_ageing_bucket", 1)[1]
+        func = func.split("LANGUAGE sql", 1)[0]
+        for bucket in ["'0-30'", "'31-60'", "'61-90'", "'90+'"]:
+            assert bucket in func
+
+    def test_view_kept_for_verification(self):
+        sql = get_schema_sql()
+        assert "CREATE OR REPLACE VIEW tally_db.view_bills_outstanding AS" in sql
+
+
+class TestPartitioning:
+    """Tests for the monthly partitioning migration and range splitting."""
+
+    def test_child_tables_carry_voucher_date(self):
+        sql = get_schema_sql()
+        for table in ["trn_accounting", "trn_inventory", "trn_bill", "trn_cost_centre", "trn_batch"]:
+            create = sql.split(f"CREATE TABLE IF NOT EXISTS tally_db.{table} (", 1)[1].split(");", 1)[0]
+            assert "voucher_date DATE" in create, f"{table} must have voucher_date"
+
+    def test_partitioning_migration(self):
+        sql = get_partitioning_sql()
+        assert "PARTITION BY RANGE (date)" in sql
+        assert "PARTITION BY RANGE (voucher_date)" in sql
+        assert "PRIMARY KEY (guid, date)" in sql
+        assert "USING BRIN (date)" in sql
+        assert "FUNCTION tally_db.ensure_trn_partitions" in sql
+        assert "FUNCTION tally_db.trn_partition_name" in sql
+
+    def test_split_month_ranges(self):
+        whole, partial = split_month_ranges(date(2024, 4, 15), date(2024, 6, 10))
+        assert whole == [date(2024, 5, 1)]
+        assert partial == [
+            (date(2024, 4, 15), date(2024, 4, 30)),
+            (date(2024, 6, 1), date(2024, 6, 10)),
+        ]
+
+    def test_split_month_ranges_full_year(self):
+        whole, partial = split_month_ranges(date(2024, 4, 1), date(2025, 3, 31))
+        assert len(whole) == 12
+        assert whole[0] == date(2024, 4, 1) and whole[-1] == date(2025, 3, 1)
+        assert partial == []
+
+
+class TestShadowSchema:
+    """Tests for rendering the schema into a shadow schema."""
+
+    def test_schema_retargeted(self):
+        sql = get_schema_sql("tally_db_shadow")
+        assert "CREATE SCHEMA IF NOT EXISTS tally_db_shadow;" in sql
+        assert "CREATE TABLE IF NOT EXISTS tally_db_shadow.trn_voucher" in sql
+        assert "table_schema = 'tally_db_shadow'" in sql
+        assert "tally_db." not in sql
+
+    def test_default_schema_unchanged(self):
+        assert get_schema_sql() == get_schema_sql("tally_db")
+
+    def test_partitioning_retargeted(self):
+        sql = get_partitioning_sql("tally_db_shadow")
+        assert "n.nspname = 'tally_db_shadow'" in sql
+        assert "tally_db." not in sql
+
+    def test_partition_functions_rebound_on_swap(self):
+        """Function bodies keep the shadow name through a schema rename."""
+        loader = DatabaseLoader(TallyLoaderConfig(tally_url="", db_url="", db_schema="tally_db"))
+        loader._conn = MagicMock(closed=False)
+        cur = loader._conn.cursor.return_value.__enter__.return_value
+
+        loader.swap_shadow_schema("tally_db_shadow", [], get_partitioning_sql("tally_db"))
+
+        executed = [c.args[0] for c in cur.execute.call_args_list]
+        rename = executed.index("ALTER SCHEMA tally_db_shadow RENAME TO tally_db")
+        rebound = executed[rename + 1:]
+        assert rebound == [get_partitioning_sql("tally_db")]
+        assert "tally_db_shadow" not in rebound[0]
+        assert "CREATE OR REPLACE FUNCTION tally_db.ensure_trn_partitions" in rebound[0]
+        assert "n.nspname = 'tally_db'" in rebound[0]
+
+
+class TestSchemaVersion:
+    """Tests for applying schema.sql once per checksum."""
+
+    def _loader(self, recorded):
+        loader = DatabaseLoader(TallyLoaderConfig(tally_url="", db_url="", db_schema="tally_db"))
+        loader._conn = MagicMock(closed=False)
+        cur = loader._conn.cursor.return_value.__enter__.return_value
+        cur.fetchone.return_value = {"checksum": recorded} if recorded else None
+        return loader, cur
+
+    def _executed(self, cur, sql):
+        return any(c.args[0] == sql for c in cur.execute.call_args_list)
+
+    def test_applied_when_new_or_changed(self):
+        for recorded in (None, "old"):
+            loader, cur = self._loader(recorded)
+            assert loader.apply_versioned_sql("schema.sql", "SELECT 1", "new") is True
+            assert self._executed(cur, "SELECT 1")
+
+    def test_skipped_when_recorded(self):
+        loader, cur = self._loader("same")
+        assert loader.apply_versioned_sql("schema.sql", "SELECT 1", "same") is False
+        assert not self._executed(cur, "SELECT 1")
+        assert loader.apply_versioned_sql("schema.sql", "SELECT 1", "same", force=True) is True
+
+
+class TestUpsertBatch:
+    """Tests for the no-op-aware upsert."""
+
+    def _loader(self, returned):
+        loader = DatabaseLoader(TallyLoaderConfig(tally_url="", db_url="", db_schema="tally_db"))
+        loader._conn = MagicMock(closed=False)
+        cur = loader._conn.cursor.return_value.__enter__.return_value
+        cur.fetchall.side_effect = [[(1,)] * n for n in returned]
+        cur.nextset.side_effect = [True] * (len(returned) - 1) + [None]
+        return loader, cur
+
+    def test_counts_changed_and_unchanged(self):
+        loader, cur = self._loader([1, 0, 1])
+        rows = [{"guid": g, "name": g, "opening_balance": 0} for g in "abc"]
+        result = loader.upsert_batch("tally_db.mst_ledger", rows, ["guid"], ignore_changes=["opening_balance"])
+
+        assert (result.changed, result.unchanged, result.total) == (2, 1, 3)
+        assert loader.last_upsert == result
+        sql = " ".join(cur.executemany.call_args.args[0].split())
+        assert "opening_balance = EXCLUDED.opening_balance" in sql
+        assert "WHERE ROW(t.name) IS DISTINCT FROM ROW(EXCLUDED.name)" in sql
+
+    def test_key_only_rows_do_nothing(self):
+        loader, cur = self._loader([0])
+        result = loader.upsert_batch("tally_db.mst_company", [{"guid": "a"}], ["guid"])
+        assert "DO NOTHING" in cur.executemany.call_args.args[0]
+        assert result.unchanged == 1
@@ -6,8 +6,10 @@ Use pytest markers to skip when resources are unavailable.
 """
 import pytest
 from datetime import date, timedelta
-from unittest.mock import Mock, patch
+from unittest.mock import MagicMock, Mock, patch
 from tally_db_loader.config import TallyLoaderConfig
+from tally_db_loader.loaders import MasterLoader, TransactionLoader
+from tally_db_loader.loaders.transactions import diff_voucher_manifest
 from tally_db_loader.sync import TallySync, run_sync
 
 
@@ -58,6 +60,129 @@ class TestTallySyncUnit:
         mock_loader_instance.load_groups.assert_called_once()
 
 
+    @patch("tally_db_loader.sync.TallyLoaderClient")
+    @patch("tally_db_loader.sync.MasterLoader")
+    @patch("tally_db_loader.sync.TransactionLoader")
+    def test_shadow_full_sync_requires_transactions(self, mock_trn_loader, mock_mst_loader, mock_client):
+        """A shadow sync without transactions would swap in empty trn tables."""
+        sync = TallySync()
+        with pytest.raises(ValueError):
+            sync.run_full_sync(include_transactions=False, shadow=True)
+        mock_mst_loader.return_value.create_shadow_schema.assert_not_called()
+
+
+class TestSharedConnection:
+    """Loaders borrow pooled connections instead of connecting themselves."""
+    
+    @patch("tally_db_loader.loaders.base.get_pool")
+    def test_transaction_loader_shares_master_connection(self, mock_get_pool):
+        pool = mock_get_pool.return_value
+        pool.getconn.return_value = Mock(closed=False)
+        config = TallyLoaderConfig(tally_url="", db_url="postgresql://test")
+        masters = MasterLoader(config)
+        transactions = TransactionLoader(config, share_with=masters)
+        
+        assert transactions.conn is masters.conn
+        pool.getconn.assert_called_once()
+        
+        transactions.close()
+        pool.putconn.assert_not_called()
+        masters.close()
+        pool.putconn.assert_called_once()
+    
+    @patch("tally_db_loader.loaders.base.get_pool")
+    def test_discard_closes_before_returning(self, mock_get_pool):
+        pool = mock_get_pool.return_value
+        conn = pool.getconn.return_value = Mock(closed=False)
+        loader = MasterLoader(TallyLoaderConfig(tally_url="", db_url="postgresql://test"))
+        loader.conn
+        loader.close(discard=True)
+        conn.close.assert_called_once()
+        pool.putconn.assert_called_once_with(conn)
+
+
+class TestReplaceVoucherWindow:
+    """Resyncs rewrite only vouchers whose content_hash changed."""
+    
+    def test_unchanged_skipped_changed_and_vanished_deleted(self):
+        loader = TransactionLoader(TallyLoaderConfig(tally_url="", db_url=""))
+        loader._conn = MagicMock(closed=False)
+        cur = loader._conn.cursor.return_value.__enter__.return_value
+        cur.fetchall.return_value = [
+            {"guid": "same", "content_hash": "h1"},
+            {"guid": "edited", "content_hash": "old"},
+            {"guid": "gone", "content_hash": "h3"},
+        ]
+        parsed = {
+            "vouchers": [
+                {"guid": "same", "content_hash": "h1"},
+                {"guid": "edited", "content_hash": "h2"},
+                {"guid": "new", "content_hash": "h4"},
+            ],
+            "accounting": [{"voucher_guid": "same"}, {"voucher_guid": "edited"}],
+        }
+        
+        with patch.object(loader, "_delete_vouchers", return_value=(2, [])) as delete, \
+                patch.object(loader, "refresh_bills_outstanding"), \
+                patch.object(loader, "load_all_transaction_data", return_value={"vouchers": 2}) as load:
+            counts = loader.replace_voucher_window(parsed, date(2024, 4, 1), date(2024, 4, 15))
+        
+        assert delete.call_args.args[2] == [["edited", "gone"]]
+        written = load.call_args.args[0]
+        assert [v["guid"] for v in written["vouchers"]] == ["edited", "new"]
+        assert written["accounting"] == [{"voucher_guid": "edited"}]
+        assert counts == {"vouchers": 2, "unchanged": 1, "deleted": 1}
+
+
+class TestReconcileTransactions:
+    """Manifest-based reconcile fetches only new or altered vouchers."""
+    
+    def test_diff_voucher_manifest(self):
+        manifest = [
+            {"guid": "same", "alter_id": 5, "date": date(2024, 4, 2)},
+            {"guid": "altered", "alter_id": 9, "date": date(2024, 4, 3)},
+            {"guid": "moved", "alter_id": 4, "date": date(2024, 4, 4)},
+            {"guid": "new", "alter_id": 1, "date": date(2024, 4, 5)},
+        ]
+        stored = {
+            "same": {"alter_id": 5, "date": date(2024, 4, 2)},
+            "altered": {"alter_id": 8, "date": date(2024, 4, 3)},
+            "moved": {"alter_id": 4, "date": date(2024, 3, 30)},
+            "gone": {"alter_id": 3, "date": date(2024, 4, 6)},
+        }
+        wanted, missing = diff_voucher_manifest(manifest, stored, date(2024, 4, 1), date(2024, 4, 30))
+        assert [row["guid"] for row in wanted] == ["altered", "moved", "new"]
+        assert missing == ["gone"]
+    
+    @patch("tally_db_loader.sync.TallyLoaderClient")
+    @patch("tally_db_loader.sync.MasterLoader")
+    @patch("tally_db_loader.sync.TransactionLoader")
+    def test_fetches_changed_guids_only(self, mock_trn_loader, mock_mst_loader, mock_client):
+        manifest_xml = """
+            <ENVELOPE><BODY><DATA><COLLECTION>
+                <VOUCHER><GUID>same</GUID><ALTERID>5</ALTERID><DATE>20240402</DATE></VOUCHER>
+                <VOUCHER><GUID>new</GUID><ALTERID>1</ALTERID><DATE>20240405</DATE></VOUCHER>
+            </COLLECTION></DATA></BODY></ENVELOPE>
+        """
+        client = mock_client.return_value
+        client.post_xml.side_effect = [manifest_xml, "<ENVELOPE/>"]
+        loader = mock_trn_loader.return_value
+        loader.get_voucher_manifest.return_value = {
+            "same": {"alter_id": 5, "date": date(2024, 4, 2)},
+            "gone": {"alter_id": 2, "date": date(2024, 4, 9)},
+        }
+        loader.delete_vouchers.return_value = 1
+        loader.reload_vouchers.return_value = {"vouchers": 1}
+        
+        counts = TallySync().reconcile_transactions(date(2024, 4, 1), date(2024, 4, 30))
+        
+        assert client.post_xml.call_count == 2
+        full_request = client.post_xml.call_args.args[0]
+        assert '$GUID = "new"' in full_request and "same" not in full_request
+        loader.delete_vouchers.assert_called_once_with(["gone"])
+        assert (counts["vouchers"], counts["unchanged"], counts["deleted"]) == (1, 1, 1)
+
+
 class TestTallySyncIntegration:
     """Integration tests (require running Tally and DB)."""
     
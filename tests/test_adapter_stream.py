@@ -0,0 +1,101 @@
+"""
+Tests for the streaming TallyHTTPAdapter API (no Tally needed).
+"""
+from datetime import date
+
+import asyncio
+
+import pytest
+from pydantic import ValidationError
+
+from adapters.adapter_types import Invoice, Receipt, VoucherLine, validated
+from adapters.tally_http.adapter import TallyHTTPAdapter, route_records
+
+WINDOW = (date(2024, 4, 1), date(2024, 4, 1))
+
+DAYBOOK = """<ENVELOPE><BODY><DATA><TALLYMESSAGE>
+<VOUCHER VCHTYPE="Sales" VCHNUMBER="S-1" GUID="g-s1">
+  <DATE>20240401</DATE><PARTYLEDGERNAME>Acme</PARTYLEDGERNAME>
+  <LEDGERENTRIES.LIST><LEDGERNAME>Acme</LEDGERNAME><AMOUNT>-118.00</AMOUNT></LEDGERENTRIES.LIST>
+  <ALLINVENTORYENTRIES.LIST><STOCKITEMNAME>Widget</STOCKITEMNAME><BILLEDQTY>2 Nos</BILLEDQTY>
+    <RATE>50.00/Nos</RATE><AMOUNT>100.00</AMOUNT></ALLINVENTORYENTRIES.LIST>
+</VOUCHER>
+<VOUCHER VCHTYPE="Receipt" VCHNUMBER="R-1" GUID="g-r1">
+  <DATE>20240401</DATE><PARTYLEDGERNAME>Acme</PARTYLEDGERNAME>
+  <ALLLEDGERENTRIES.LIST><LEDGERNAME>Acme</LEDGERNAME><AMOUNT>118.00</AMOUNT></ALLLEDGERENTRIES.LIST>
+</VOUCHER>
+</TALLYMESSAGE></DATA></BODY></ENVELOPE>"""
+
+
+class FakeClient:
+    company = "Demo"
+
+    def __init__(self):
+        self.requests = 0
+
+    def post_xml(self, xml):
+        self.requests += 1
+        return DAYBOOK
+
+
+def _adapter(include_types=None):
+    adapter = TallyHTTPAdapter("http://tally", "Demo", "{{from_date}}", include_types=include_types)
+    adapter.client = FakeClient()
+    return adapter
+
+
+def test_stream_yields_typed_records_in_voucher_order():
+    records = list(_adapter().stream_vouchers(*WINDOW, lines=True))
+    assert [type(r) for r in records] == [Invoice, VoucherLine, Receipt]
+    invoice, line, receipt = records
+    assert (invoice.invoice_id, invoice.total) == ("g-s1", 118.0)
+    assert (line.invoice_id, line.stock_item_name, line.amount) == ("g-s1", "Widget", 100.0)
+    assert (receipt.receipt_key, receipt.amount) == ("g-r1", 118.0)
+
+
+def test_route_records_to_sinks():
+    invoices, receipts = [], []
+    adapter = _adapter(include_types=set())  # all types, so the receipt is an invoice too
+    counts = route_records(
+        adapter.stream_vouchers(*WINDOW, lines=True),
+        invoice=invoices.append,
+        receipt=receipts.append,
+    )
+    assert counts == {"invoices": 2, "receipts": 1, "lines": 0}
+    assert [r.receipt_key for r in receipts] == ["g-r1"]
+    assert adapter.client.requests == 1
+
+
+def test_fetch_invoices_keeps_receipts_only():
+    adapter = _adapter()
+    assert [i.invoice_id for i in adapter.fetch_invoices(*WINDOW)] == ["g-s1"]
+    assert [r.receipt_key for r in adapter.get_receipts_from_last_fetch()] == ["g-r1"]
+    assert adapter.client.requests == 1
+
+
+
+def test_strict_mode_validates_records():
+    invoice, _, receipt = _adapter(include_types=None).stream_vouchers(*WINDOW, lines=True)
+    assert invoice.customer_gstin is None and receipt.customer_id == "Acme"
+    assert validated(invoice) == invoice
+
+    invoice.total = "not a number"
+    with pytest.raises(ValidationError):
+        validated(invoice)
+
+    strict = _adapter()
+    strict.strict = True
+    assert [type(r) for r in strict.stream_vouchers(*WINDOW)] == [Invoice, Receipt]
+
+
+def test_tally_adapter_batches():
+    adapter = _adapter()
+
+    async def collect():
+        return [b async for b in adapter.fetch_batches(*WINDOW, lines=True)]
+
+    batches = asyncio.run(collect())
+    by_type = {b.schema.record_type.__name__: b for b in batches}
+    assert sorted(by_type) == ["Invoice", "Receipt", "VoucherLine"]
+    assert by_type["Invoice"].columns["customer_id"] == ["Acme"]
+    assert adapter.client.requests == 1
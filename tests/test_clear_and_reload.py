@@ -0,0 +1,61 @@
+"""
+Tests for the shadow reload swap, using a minimal fake connection.
+"""
+from contextlib import nullcontext
+from datetime import date, timedelta
+
+import agent.clear_and_reload as reload
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self._rows = []
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        sql = " ".join(sql.split())
+        self.conn.executed.append(sql)
+        self._rows = next((rows for prefix, rows in self.conn.results.items() if sql.startswith(prefix)), [])
+
+    def fetchall(self):
+        return self._rows
+
+
+class FakeConn:
+    def __init__(self, results=None):
+        self.results = results or {}
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def transaction(self):
+        return nullcontext()
+
+
+def test_swap_refreshes_old_dates_of_moved_invoices(monkeypatch):
+    refreshed = []
+    monkeypatch.setattr(reload, "refresh_sales_rollups", lambda conn, dates: refreshed.append(set(dates)))
+    conn = FakeConn({"select distinct f.date from fact_invoice f": [(date(2024, 3, 30),), (date(2024, 4, 2),)]})
+
+    reload.swap_in_staged(conn, date(2024, 4, 1), date(2024, 4, 3))
+
+    assert refreshed == [{date(2024, 3, 30)} | {date(2024, 4, 1) + timedelta(days=i) for i in range(3)}]
+    # Stored dates are read before the upsert moves them
+    lookup = next(i for i, sql in enumerate(conn.executed) if sql.startswith("select distinct f.date"))
+    upsert = next(i for i, sql in enumerate(conn.executed) if sql.startswith("insert into fact_invoice"))
+    assert lookup < upsert
+
+
+def test_stage_tables_recreated_on_reused_connection():
+    conn = FakeConn()
+    reload._create_stage_tables(conn)
+    assert conn.executed[0] == "drop table if exists stage_invoice, stage_receipt"
+    assert not any("if not exists" in sql for sql in conn.executed)
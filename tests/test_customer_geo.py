@@ -0,0 +1,12 @@
+"""
+Static checks for the customer geo enrichment migration.
+"""
+from pathlib import Path
+
+
+def test_customer_geo_migration_present():
+    path = Path(__file__).resolve().parents[1] / "warehouse" / "migrations" / "0016_customer_geo.sql"
+    sql = path.read_text().lower()
+    for column in ["state", "district", "lat", "lon", "geo_pincode", "geo_updated_at"]:
+        assert f"add column if not exists {column} " in sql, f"Expected column missing: {column}"
+    assert "where pincode is distinct from geo_pincode" in sql
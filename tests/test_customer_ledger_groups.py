@@ -0,0 +1,85 @@
+"""
+Tests for propagating ledger groups to dim_customer.
+
+The UPDATEs run against an in-memory SQLite database behind a minimal fake
+connection (TRUNCATE and the Postgres-only UPDATE alias form are rewritten,
+COPY becomes inserts), so the join and precedence logic is exercised without
+a Postgres server.
+"""
+import re
+import sqlite3
+
+from agent.ledger_masters import update_customer_ledger_groups
+
+
+class FakeCopy:
+    def __init__(self, db, sql):
+        table, columns = re.match(r"COPY (\w+) \(([^)]*)\) FROM STDIN", sql).groups()
+        self.insert = f"INSERT INTO {table} ({columns}) VALUES ({', '.join('?' for _ in columns.split(','))})"
+        self.db = db
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def write_row(self, row):
+        self.db.execute(self.insert, row)
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        sql = " ".join(sql.split())
+        sql = re.sub(r"^TRUNCATE TABLE", "DELETE FROM", sql)
+        sql = re.sub(r"^UPDATE (\w+) (\w+) SET", r"UPDATE \1 AS \2 SET", sql)
+        self.rowcount = self.db.execute(sql, params or ()).rowcount
+
+    def copy(self, sql):
+        return FakeCopy(self.db, sql)
+
+
+class FakeConn:
+    def __init__(self, customers):
+        self.db = sqlite3.connect(":memory:")
+        self.db.execute("CREATE TABLE dim_customer (customer_id text PRIMARY KEY, name text, ledger_group_name text)")
+        self.db.executemany("INSERT INTO dim_customer VALUES (?, ?, ?)", customers)
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+    def groups(self):
+        return dict(self.db.execute("SELECT customer_id, ledger_group_name FROM dim_customer"))
+
+
+def test_customer_id_match_wins_over_name_match():
+    conn = FakeConn([
+        # id matches ledger "Acme", name matches ledger "Acme Distributors"
+        ("Acme", "Acme Distributors", None),
+        # only the name matches a ledger
+        ("C-2", "Beta Traders", None),
+        # already in the right group
+        ("Gamma", "Gamma", "South Zone"),
+    ])
+    ledgers = [
+        {"name": "Acme", "parent_name": "North Zone"},
+        {"name": "Acme Distributors", "parent_name": "West Zone"},
+        {"name": "Beta Traders", "parent_name": "East Zone"},
+        {"name": "Gamma", "parent_name": "South Zone"},
+    ]
+
+    assert update_customer_ledger_groups(conn, ledgers) == 2
+    assert conn.groups() == {"Acme": "North Zone", "C-2": "East Zone", "Gamma": "South Zone"}
+
+    # Nothing left to change
+    assert update_customer_ledger_groups(conn, ledgers) == 0
@@ -0,0 +1,30 @@
+"""
+Tests for the shared connection pool (no database needed).
+"""
+import agent.db as db
+
+
+class FakePool:
+    check_connection = None
+
+    def __init__(self, conninfo, **kwargs):
+        self.conninfo = conninfo
+        self.kwargs = kwargs
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_one_pool_per_url(monkeypatch):
+    monkeypatch.setattr(db, "ConnectionPool", FakePool)
+    monkeypatch.setattr(db, "_pools", {})
+
+    pool = db.get_pool("postgresql://a")
+    assert db.get_pool("postgresql://a") is pool
+    assert db.get_pool("postgresql://b") is not pool
+    assert pool.kwargs["kwargs"]["autocommit"] is True
+
+    db.close_pools()
+    assert pool.closed
+    assert db.get_pool("postgresql://a") is not pool
@@ -0,0 +1,93 @@
+"""
+Tests for the dimension lookup cache, using a minimal fake connection.
+"""
+from pathlib import Path
+
+from agent.dimensions import DimensionCache
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conn.executed.append((" ".join(sql.split()), params))
+        for prefix, rows in self.conn.results.items():
+            if " ".join(sql.split()).startswith(prefix):
+                self._rows = rows
+                return
+        self._rows = []
+
+    def fetchall(self):
+        return self._rows
+
+
+class FakeConn:
+    def __init__(self, results=None):
+        self.results = results or {}
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def writes(self):
+        return [sql for sql, _ in self.executed if sql.startswith("insert")]
+
+
+def test_customer_upserted_only_when_new_or_changed():
+    conn = FakeConn({"select customer_id": [("Acme", "27AAA", None, "Pune")]})
+    cache = DimensionCache()
+
+    assert cache.ensure_customer(conn, "Acme") is False
+    assert cache.ensure_customer(conn, "Acme", "27AAA", None, "Pune") is False
+    assert cache.ensure_customer(conn, "Acme", pincode="411001") is True
+    assert cache.ensure_customer(conn, "Acme", pincode="411001") is False
+    assert cache.ensure_customer(conn, "Beta") is True
+    assert cache.ensure_customer(conn, "Beta") is False
+
+    assert len(conn.writes()) == 2
+    assert cache.customers["Acme"] == ("27AAA", "411001", "Pune")
+    # dim_customer is read once
+    assert sum(sql.startswith("select") for sql, _ in conn.executed) == 1
+
+
+def test_item_ids_loaded_once_and_updated():
+    conn = FakeConn({"select lower(name), item_id": [("widget", "guid-1")]})
+    cache = DimensionCache()
+
+    cache.note_items([("guid-0", "Ignored")])  # not loaded yet
+    assert cache.item_ids(conn) == {"widget": "guid-1"}
+    cache.note_items([("guid-2", "Gadget Pro")])
+    assert cache.item_ids(conn)["gadget pro"] == "guid-2"
+    assert len(conn.executed) == 1
+
+    cache.invalidate("items")
+    cache.item_ids(conn)
+    assert len(conn.executed) == 2
+
+
+def test_ledger_group_lookup_by_guid_then_name():
+    conn = FakeConn({"select ledger_group_id": [(1, "g-1", "Sundry Debtors"), (2, None, "North Zone")]})
+    cache = DimensionCache()
+
+    assert cache.ledger_group_id(conn, guid="g-1", name="anything") == 1
+    assert cache.ledger_group_id(conn, guid="g-9", name="North Zone") is None
+    assert cache.ledger_group_id(conn, name="North Zone") == 2
+
+    cache.note_ledger_group(3, "g-3", "South Zone")
+    assert cache.ledger_group_id(conn, guid="g-3") == 3
+
+
+def test_name_index_migration_present():
+    path = Path(__file__).resolve().parents[1] / "warehouse" / "migrations" / "0013_dimension_name_indexes.sql"
+    sql = path.read_text().lower()
+    assert "on dim_item (lower(name))" in sql
+    assert "on dim_customer (lower(name))" in sql
+    assert "on dim_ledger_group (lower(name))" in sql
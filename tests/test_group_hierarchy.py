@@ -0,0 +1,50 @@
+"""
+Tests for the in-process stock group hierarchy used to compute brands.
+"""
+from agent.stock_masters import GroupHierarchy, _compute_group_roots, _filter_by_brands
+
+
+def _g(name, parent=None):
+    return {"name": name, "parent_name": parent}
+
+
+GROUPS = [
+    _g("Havells"),
+    _g("Fans", "Havells"),
+    _g("Ceiling Fans", "Fans"),
+    _g("Orphan", "Missing Parent"),
+    _g("Loop A", "Loop B"),
+    _g("Loop B", "Loop A"),
+]
+
+
+def test_roots_and_paths():
+    h = GroupHierarchy.from_groups(GROUPS)
+    assert h.root("Ceiling Fans") == "Havells"
+    assert h.path("Ceiling Fans") == ("Havells", "Fans", "Ceiling Fans")
+    assert h.path("Fans") == ("Havells", "Fans")  # memoised on the way up
+    assert h.root("Orphan") == "Missing Parent"
+    assert h.root("Loop A") is None and h.path("Loop B") == ()
+
+
+def test_item_brand_fallbacks():
+    h = GroupHierarchy.from_groups(GROUPS)
+    assert h.item_brand("Ceiling Fans") == ("Havells", "Havells", ["Havells", "Fans", "Ceiling Fans"])
+    assert h.item_brand("Unknown Group") == ("Unknown Group", "Unknown Group", ["Unknown Group"])
+    assert h.item_brand("Loop A") == ("Loop A", None, None)
+    assert h.item_brand(None) == (None, None, None)
+
+
+def test_extend_keeps_known_groups():
+    h = GroupHierarchy.from_groups(GROUPS)
+    h.extend({"Fans": "Other", "Missing Parent": "Legacy"})
+    assert h.root("Fans") == "Havells"
+    assert h.root("Orphan") == "Legacy"
+
+
+def test_compute_group_roots_and_filter():
+    assert _compute_group_roots(GROUPS)["Ceiling Fans"] == "Havells"
+    items = [{"name": "Fan 1200", "parent_name": "Ceiling Fans"}, {"name": "X", "parent_name": "Orphan"}]
+    groups, kept = _filter_by_brands(GROUPS, items, ["havells"])
+    assert [g["name"] for g in groups] == ["Havells", "Fans", "Ceiling Fans"]
+    assert [i["name"] for i in kept] == ["Fan 1200"]
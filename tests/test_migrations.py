@@ -0,0 +1,52 @@
+"""
+Tests for the warehouse migration runner, using a minimal fake connection.
+"""
+from agent.migrations import MIGRATIONS_DIR, checksum, ensure_migrations
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conn.executed.append(sql)
+
+    def fetchall(self):
+        return list(self.conn.recorded.items())
+
+
+class FakeConn:
+    def __init__(self, recorded):
+        self.recorded = recorded
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+def _sql(name):
+    return (MIGRATIONS_DIR / name).read_text(encoding="utf-8")
+
+
+def test_applies_only_new_or_changed_files():
+    current = "0012_sales_rollups.sql"
+    changed = "0013_dimension_name_indexes.sql"
+    new = "0016_customer_geo.sql"
+    conn = FakeConn({current: checksum(_sql(current)), changed: "stale"})
+
+    assert ensure_migrations(conn, current, changed, new) == [changed, new]
+    assert _sql(current) not in conn.executed
+    assert _sql(changed) in conn.executed and _sql(new) in conn.executed
+
+
+def test_force_reapplies():
+    name = "0012_sales_rollups.sql"
+    conn = FakeConn({name: checksum(_sql(name))})
+    assert ensure_migrations(conn, name) == []
+    assert ensure_migrations(conn, name, force=True) == [name]
@@ -1,7 +1,7 @@
 from pathlib import Path
 import pytest
 from adapters.tally_http.parser import parse_daybook
-from adapters.tally_http.validators import ensure_status_ok, TallyHTTPError
+from adapters.tally_http.validators import ensure_status_ok, TallyHTTPError, TallyResponse
 
 FIX = Path(__file__).parent / "fixtures"
 
@@ -28,3 +28,16 @@ def test_status_error_raises():
     with pytest.raises(TallyHTTPError):
         ensure_status_ok(xml)
 
+
+def test_response_parsed_once(monkeypatch):
+    from adapters.tally_http import validators
+    calls = []
+    real = validators.sanitize_xml
+    monkeypatch.setattr(validators, "sanitize_xml", lambda x: calls.append(1) or real(x))
+
+    xml = TallyResponse(read("daybook_success.xml"))
+    ensure_status_ok(xml)
+    rows = parse_daybook(xml)
+    assert xml == read("daybook_success.xml")
+    assert rows[0]["vchnumber"] == "S-101"
+    assert len(calls) == 1
@@ -36,3 +36,51 @@ def test_parse_daybook_without_customer_details():
     assert r["party_pincode"] is None
     assert r["party_city"] is None
 
+
+def test_parse_daybook_lookup_precedence():
+    """Direct children win over nested fields; ledger lines checked in voucher-type order"""
+    xml = """<ENVELOPE><BODY><DATA><TALLYMESSAGE>
+    <VOUCHER VCHTYPE="Sales" VCHNUMBER="S-7" REMOTEID="r-7">
+      <DATE>20240402</DATE>
+      <PARTYLEDGERNAME>Acme Distributors</PARTYLEDGERNAME>
+      <ALLLEDGERENTRIES.LIST><LEDGERNAME>Acme Distributors</LEDGERNAME><AMOUNT>-1.00</AMOUNT>
+        <PARTYGSTIN>NESTED</PARTYGSTIN></ALLLEDGERENTRIES.LIST>
+      <LEDGERENTRIES.LIST><LEDGERNAME>Acme Distributors</LEDGERNAME><AMOUNT>(1,180.00)</AMOUNT></LEDGERENTRIES.LIST>
+      <PARTYGSTIN>27AABCU9603R1ZM</PARTYGSTIN>
+      <PARTYPINCODE></PARTYPINCODE>
+      <BASICBUYERPINCODE>400001</BASICBUYERPINCODE>
+      <ALLINVENTORYENTRIES.LIST><STOCKITEMNAME>Widget</STOCKITEMNAME><BILLEDQTY>2 Nos</BILLEDQTY>
+        <RATE>500.00/Nos</RATE><AMOUNT>1000.00</AMOUNT>
+        <BATCHALLOCATIONS.LIST><AMOUNT>1000.00</AMOUNT></BATCHALLOCATIONS.LIST></ALLINVENTORYENTRIES.LIST>
+      <ALLINVENTORYENTRIES.LIST><AMOUNT>5.00</AMOUNT></ALLINVENTORYENTRIES.LIST>
+    </VOUCHER>
+    </TALLYMESSAGE></DATA></BODY></ENVELOPE>"""
+    (r,) = parse_daybook(xml)
+    assert r["guid"] == "r-7"
+    assert r["party_gstin"] == "27AABCU9603R1ZM"
+    assert r["party_pincode"] == "400001"
+    assert r["total"] == -1180.0
+    assert r["subtotal"] == 1005.0
+    assert [e["stock_item_name"] for e in r["inventory_entries"]] == ["Widget"]
+
+
+def test_parse_daybook_ignores_elements_outside_vouchers():
+    """The single document walk attributes fields only to the voucher they are under"""
+    xml = """<ENVELOPE><BODY><DATA><TALLYMESSAGE>
+    <VOUCHER VCHTYPE="Receipt" VCHNUMBER="R-1" GUID="g-1">
+      <DATE>20240405</DATE>
+      <PARTYLEDGERNAME>Acme Distributors</PARTYLEDGERNAME>
+      <ALLLEDGERENTRIES.LIST><LEDGERNAME>Bank</LEDGERNAME><AMOUNT>-500.00</AMOUNT></ALLLEDGERENTRIES.LIST>
+    </VOUCHER>
+    <COMPANY><PARTYGSTIN>OUTSIDE</PARTYGSTIN>
+      <ALLLEDGERENTRIES.LIST><LEDGERNAME>Acme Distributors</LEDGERNAME><AMOUNT>9999.00</AMOUNT></ALLLEDGERENTRIES.LIST>
+    </COMPANY>
+    </TALLYMESSAGE><TALLYMESSAGE>
+    <VOUCHER VCHTYPE="Journal" VCHNUMBER="J-1" GUID="g-2"><DATE>20240406</DATE><AMOUNT>42.00</AMOUNT></VOUCHER>
+    </TALLYMESSAGE></DATA></BODY></ENVELOPE>"""
+    first, second = parse_daybook(xml)
+    assert first["party_gstin"] is None
+    assert first["total"] == -500.0
+    assert second["guid"] == "g-2"
+    assert second["total"] == 42.0
+    assert second["inventory_entries"] == []
@@ -0,0 +1,47 @@
+"""
+Tests for the targeted party ledger request and parser.
+"""
+from adapters.tally_http.ledgers_parser import parse_party_ledgers
+from adapters.tally_http.party_ledgers import name_filter, render_party_ledgers_request
+
+PARTY_LEDGERS_XML = """<ENVELOPE><BODY><DATA><COLLECTION>
+<LEDGER NAME="Acme Distributors" RESERVEDNAME="">
+  <GUID>guid-acme</GUID>
+  <PARENT>Sundry Debtors</PARENT>
+  <ALTERID> 42</ALTERID>
+  <PARTYGSTIN>27AABCU9603R1ZM</PARTYGSTIN>
+  <LEDGERSTATENAME>Maharashtra</LEDGERSTATENAME>
+  <PINCODE>400001</PINCODE>
+  <ADDRESS.LIST TYPE="String"><ADDRESS>12 MG Road</ADDRESS><ADDRESS>Fort</ADDRESS></ADDRESS.LIST>
+</LEDGER>
+<LEDGER NAME="R &amp; S Traders" RESERVEDNAME="">
+  <PARENT>North Zone Debtors</PARENT>
+  <LEDGSTREGDETAILS.LIST><GSTIN>07OLDGSTIN0000Z</GSTIN></LEDGSTREGDETAILS.LIST>
+  <LEDGSTREGDETAILS.LIST><GSTIN>07AAACR5055K1Z5</GSTIN></LEDGSTREGDETAILS.LIST>
+  <LEDMAILINGDETAILS.LIST><STATE>Delhi</STATE><PINCODE>110001</PINCODE></LEDMAILINGDETAILS.LIST>
+</LEDGER>
+</COLLECTION></DATA></BODY></ENVELOPE>"""
+
+
+def test_parse_party_ledgers():
+    acme, rs = parse_party_ledgers(PARTY_LEDGERS_XML)
+    assert acme == {
+        "name": "Acme Distributors",
+        "guid": "guid-acme",
+        "parent_name": "Sundry Debtors",
+        "alter_id": 42,
+        "gstin": "27AABCU9603R1ZM",
+        "state": "Maharashtra",
+        "pincode": "400001",
+        "address": "12 MG Road, Fort",
+    }
+    assert rs["name"] == "R & S Traders"
+    assert rs["gstin"] == "07AAACR5055K1Z5"
+    assert (rs["state"], rs["pincode"], rs["address"]) == ("Delhi", "110001", None)
+
+
+def test_request_filters_by_escaped_names():
+    assert name_filter(["A & B", "C"]) == '$Name = "A &amp; B" OR $Name = "C"'
+    xml = render_party_ledgers_request(["Acme Distributors"], "Demo Co")
+    assert '<SYSTEM TYPE="Formulae" NAME="OnlyRequestedParties">$Name = "Acme Distributors"</SYSTEM>' in xml
+    assert "<SVCURRENTCOMPANY>Demo Co</SVCURRENTCOMPANY>" in xml
@@ -0,0 +1,31 @@
+"""
+Tests for the pincode CSV reader and row hashing (no database needed).
+"""
+from load_pincode_data import read_pincodes, row_hash
+
+CSV = """pincode,district,statename,latitude,longitude
+110001,NEW DELHI,DELHI,28.63,77.21
+110001,DUPLICATE,DELHI,1,1
+400001,mumbai,MAHARASHTRA,NA,
+"""
+
+
+def test_read_pincodes(tmp_path):
+    path = tmp_path / "pincodes.csv"
+    path.write_text(CSV, encoding="utf-8")
+    stats = {}
+    rows = list(read_pincodes(path, stats))
+
+    assert [r[:5] for r in rows] == [
+        ("110001", "New Delhi", "Delhi", 28.63, 77.21),
+        ("400001", "Mumbai", "Maharashtra", None, None),
+    ]
+    assert stats["duplicates"] == 1
+    assert rows[0][5] == row_hash("New Delhi", "Delhi", 28.63, 77.21)
+
+
+def test_row_hash_changes_with_content():
+    base = row_hash("Pune", "Maharashtra", 18.52, 73.85)
+    assert base == row_hash("Pune", "Maharashtra", 18.52, 73.85)
+    assert base != row_hash("Pune", "Maharashtra", None, 73.85)
+    assert base != row_hash("Pune City", "Maharashtra", 18.52, 73.85)
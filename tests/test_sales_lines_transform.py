@@ -0,0 +1,63 @@
+"""
+Tests for the Python-side sales line transform (no database needed).
+"""
+from datetime import date
+from decimal import Decimal
+
+from agent.sales_lines_from_vreg import LINE_COLUMNS, StagedHeader, StagedLine, transform_lines
+
+
+def _header(guid, tax):
+    return StagedHeader(guid=guid, vch_no="S-1", vch_date=date(2024, 4, 1), party="Acme",
+                        basic_amount=0.0, tax_amount=tax, total_amount=0.0)
+
+
+def _line(guid, name, qty, rate, amount):
+    return StagedLine(voucher_guid=guid, stock_item_name=name, billed_qty=qty, rate=rate,
+                      amount=amount, discount=None)
+
+
+def test_tax_allocated_pro_rata():
+    headers = [_header("g1", 18.0)]
+    lines = [
+        _line("g1", "Widget", "2 Nos", "25.00/Nos", 50.0),
+        _line("g1", "Gadget", "1 Box", "1,050.00/Box", 50.0),
+    ]
+    rows, problems = transform_lines(headers, lines, {"widget": "SKU-W"})
+    assert problems == []
+    first, second = (dict(zip(LINE_COLUMNS, r)) for r in rows)
+
+    assert first["invoice_id"] == "g1"
+    assert first["sku_id"] == "SKU-W" and second["sku_id"] is None
+    assert (first["qty"], first["uom"], first["rate"]) == (2.0, "Nos", 25.0)
+    assert second["rate"] == 1050.0
+    assert first["line_tax"] == second["line_tax"] == Decimal("9.00")
+    assert first["line_total"] == Decimal("59.00")
+
+
+def test_rounding_matches_numeric_round():
+    rows, _ = transform_lines([_header("g1", 10.0)], [
+        _line("g1", "A", "1 Nos", "1", 1.0),
+        _line("g1", "B", "1 Nos", "1", 1.0),
+        _line("g1", "C", "1 Nos", "1", 1.0),
+    ])
+    assert [r[LINE_COLUMNS.index("line_tax")] for r in rows] == [Decimal("3.33")] * 3
+    assert rows[0][LINE_COLUMNS.index("line_total")] == Decimal("4.33")
+
+
+def test_zero_basic_gets_no_tax():
+    rows, _ = transform_lines([_header("g1", 5.0)], [_line("g1", "Free", "1 Nos", "0", 0.0)])
+    assert rows[0][LINE_COLUMNS.index("line_tax")] == Decimal("0")
+
+
+def test_unparseable_and_orphan_lines_dropped():
+    lines = [
+        _line("g1", "Challan item", "", "", 10.0),      # no billed qty
+        _line("g1", "No rate", "3 Nos", "", 30.0),      # kept, rate null
+        _line(None, "Orphan", "1 Nos", "10", 10.0),     # no voucher guid
+        _line("g9", "Unknown", "1 Nos", "10", 10.0),    # voucher not in batch
+    ]
+    rows, problems = transform_lines([_header("g1", 0.0)], lines)
+    assert [r[LINE_COLUMNS.index("sku_name")] for r in rows] == ["No rate"]
+    assert rows[0][LINE_COLUMNS.index("rate")] is None
+    assert [p.stock_item_name for p in problems] == ["Challan item", "No rate"]
@@ -0,0 +1,108 @@
+"""
+Tests for the sales rollup tables.
+
+Static checks on the migration, the pure date helpers and the touched-date
+bookkeeping (against a minimal fake connection); no database needed.
+"""
+from contextlib import nullcontext
+from datetime import date, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+import agent.run
+import agent.sales_lines_from_vreg as sales_lines
+from agent.dimensions import DimensionCache
+from agent.rollups import _months
+from agent.run import load_invoices
+
+
+def test_sales_rollups_migration_present():
+    path = Path(__file__).resolve().parents[1] / "warehouse" / "migrations" / "0012_sales_rollups.sql"
+    assert path.exists(), "Migration 0012_sales_rollups.sql must exist"
+    sql = path.read_text().lower()
+
+    for table in ["agg_invoice_daily", "agg_sales_daily", "agg_invoice_monthly", "agg_sales_monthly"]:
+        assert f"create table if not exists {table}" in sql, f"Expected table missing: {table}"
+
+    assert "primary key (date, vchtype, customer_id, sku_name)" in sql
+    assert "primary key (month, vchtype, customer_id, sku_name)" in sql
+
+
+def test_months_cover_touched_dates():
+    days = [date(2024, 4, 30), date(2024, 5, 1), date(2024, 5, 17), date(2024, 4, 2)]
+    assert _months(days) == [date(2024, 4, 1), date(2024, 5, 1)]
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        sql = " ".join(sql.split())
+        self.conn.executed.append((sql, params))
+        self._rows = next((rows for prefix, rows in self.conn.results.items() if sql.startswith(prefix)), [])
+
+    def fetchall(self):
+        return self._rows
+
+
+class FakeConn:
+    def __init__(self, results):
+        self.results = results
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+def _invoice(invoice_id, day):
+    return SimpleNamespace(
+        invoice_id=invoice_id, voucher_key=invoice_id, vchtype="Sales", date=day,
+        customer_id="Acme", sp_id=None, subtotal=100, tax=18, total=118, roundoff=0,
+        customer_gstin=None, customer_pincode=None, customer_city=None,
+    )
+
+
+def test_redated_invoice_touches_old_and_new_dates(monkeypatch):
+    monkeypatch.setattr(agent.run, "dimension_cache", DimensionCache())
+    conn = FakeConn({
+        "select distinct date from fact_invoice": [(date(2024, 4, 30),)],
+        "select customer_id": [("Acme", None, None, None)],
+    })
+
+    count, touched = load_invoices(conn, [_invoice("inv-1", date(2024, 5, 2)), _invoice("inv-2", date(2024, 5, 2))])
+
+    assert count == 2
+    assert touched == {date(2024, 4, 30), date(2024, 5, 2)}
+    assert _months(touched) == [date(2024, 4, 1), date(2024, 5, 1)]
+    # Stored dates are read once for the batch, before the upserts
+    lookups = [i for i, (sql, _) in enumerate(conn.executed) if sql.startswith("select distinct date")]
+    assert lookups == [0]
+    assert sorted(conn.executed[0][1][0]) == ["inv-1", "inv-2"]
+
+
+def test_concurrent_sales_lines_refresh_union_of_touched_dates(monkeypatch):
+    """Dates a batch touched outside the range (stored invoice dates) are refreshed too."""
+    outside = date(2024, 3, 28)
+
+    def fake_batch(start, end, **kwargs):
+        assert kwargs["refresh_rollups"] is False
+        return 1, 2, {outside} if start == date(2024, 4, 1) else {start}
+
+    refreshed = []
+    monkeypatch.setattr(sales_lines, "_ensure_migration", lambda conn: None)
+    monkeypatch.setattr(sales_lines, "connection", lambda: nullcontext(object()))
+    monkeypatch.setattr(sales_lines, "_process_batch", fake_batch)
+    monkeypatch.setattr(sales_lines, "refresh_sales_rollups", lambda conn, dates: refreshed.append(set(dates)))
+
+    sales_lines.load_sales_lines(date(2024, 4, 1), date(2024, 4, 30), workers=2)
+
+    range_days = {date(2024, 4, 1) + timedelta(days=i) for i in range(30)}
+    assert refreshed == [range_days | {outside}]
@@ -0,0 +1,21 @@
+"""
+Tests for folding duplicate stock items before the bulk dim_item upsert.
+"""
+from agent.stock_masters import _merge_item_rows
+
+
+def _item(guid, name, parent=None, uom=None, hsn=None):
+    return {"guid": guid, "name": name, "parent_name": parent, "base_units": uom, "hsn": hsn}
+
+
+def test_item_id_is_guid_else_name():
+    rows = _merge_item_rows([_item("g-1", "Fan"), _item(None, "Cooler")])
+    assert list(rows) == ["g-1", "Cooler"]
+
+
+def test_duplicates_fold_like_successive_upserts():
+    rows = _merge_item_rows([
+        _item("g-1", "Fan", parent="Havells", uom="Nos", hsn="8414"),
+        _item("g-1", "Fan 1200mm", parent=None, uom="", hsn=None),
+    ])
+    assert rows == {"g-1": ("g-1", "g-1", "Fan 1200mm", "Havells", "Nos", "8414")}
@@ -0,0 +1,76 @@
+"""
+Tests for the shared DayBook voucher stream.
+
+The single-pass parser must produce exactly what the per-consumer parsers
+(parse_daybook / parse_trn_bill_allocations) produce for the same XML.
+"""
+from datetime import date
+from pathlib import Path
+
+from adapters.tally_http.parser import parse_daybook
+from adapters.tally_http.ar_ap.parser import parse_trn_bill_allocations
+from adapters.tally_http.voucher_stream import VoucherWindow, date_windows, parse_daybook_window
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+BILLS_XML = """<?xml version="1.0"?>
+<ENVELOPE>
+    <BODY>
+        <DATA>
+            <VOUCHER VCHTYPE="Sales" VCHNUMBER="S-1">
+                <GUID>guid-1</GUID>
+                <DATE>20250401</DATE>
+                <PARTYLEDGERNAME>Customer A</PARTYLEDGERNAME>
+                <ALLLEDGERENTRIES.LIST>
+                    <LEDGERNAME>Customer A</LEDGERNAME>
+                    <AMOUNT>-11800.00</AMOUNT>
+                    <BILLALLOCATIONS.LIST>
+                        <NAME>S-1</NAME>
+                        <AMOUNT>-11800.00</AMOUNT>
+                        <BILLTYPE>New Ref</BILLTYPE>
+                    </BILLALLOCATIONS.LIST>
+                </ALLLEDGERENTRIES.LIST>
+            </VOUCHER>
+            <VOUCHER VCHTYPE="Receipt" VCHNUMBER="R-1">
+                <GUID>guid-2</GUID>
+                <DATE>20250402</DATE>
+                <PARTYLEDGERNAME>Customer A</PARTYLEDGERNAME>
+                <ALLLEDGERENTRIES.LIST>
+                    <LEDGERNAME>Customer A</LEDGERNAME>
+                    <AMOUNT>5000.00</AMOUNT>
+                    <BILLALLOCATIONS.LIST>
+                        <NAME>S-1</NAME>
+                        <AMOUNT>5000.00</AMOUNT>
+                        <BILLTYPE>Agst Ref</BILLTYPE>
+                    </BILLALLOCATIONS.LIST>
+                </ALLLEDGERENTRIES.LIST>
+            </VOUCHER>
+        </DATA>
+    </BODY>
+</ENVELOPE>
+"""
+
+
+def test_single_pass_matches_separate_parsers():
+    for xml in [BILLS_XML] + [p.read_text(encoding="utf-8") for p in sorted(FIXTURES.glob("daybook_*.xml"))]:
+        vouchers, bills = parse_daybook_window(xml)
+        assert vouchers == parse_daybook(xml)
+        assert bills == parse_trn_bill_allocations(xml)
+
+
+def test_window_fans_out_invoices_and_receipts():
+    vouchers, bills = parse_daybook_window(BILLS_XML)
+    window = VoucherWindow(date(2025, 4, 1), date(2025, 4, 2), vouchers, bills)
+
+    assert [i.vchtype for i in window.invoices()] == ["Sales", "Receipt"]
+    assert [i.vchtype for i in window.invoices({"Sales"})] == ["Sales"]
+    assert [r.amount for r in window.receipts()] == [5000.0]
+    assert [b["billtype"] for b in window.bills] == ["New Ref", "Agst Ref"]
+
+
+def test_date_windows_cover_range():
+    windows = list(date_windows(date(2024, 4, 1), date(2024, 4, 20), 15))
+    assert windows == [
+        (date(2024, 4, 1), date(2024, 4, 15)),
+        (date(2024, 4, 16), date(2024, 4, 20)),
+    ]
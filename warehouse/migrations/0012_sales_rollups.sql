@@ -0,0 +1,77 @@
+-- Pre-aggregated sales rollups for dashboards.
+-- Maintained by agent/rollups.py for exactly the dates each load touches
+-- (agent.run, agent.backfill, sales-lines-from-vreg). Rebuild a range with:
+--   python -m agent.rollups --from 2024-04-01 --to 2025-03-31
+--
+-- Dimension columns are stored as '' instead of NULL so they can be part of
+-- the primary key.
+
+-- Invoice-level totals per day (all vouchers in fact_invoice)
+create table if not exists agg_invoice_daily (
+  date          date not null,
+  vchtype       text not null default '',
+  customer_id   text not null default '',
+  invoice_count int not null default 0,
+  subtotal      numeric(14,2) not null default 0,
+  tax           numeric(14,2) not null default 0,
+  total         numeric(14,2) not null default 0,
+  refreshed_at  timestamptz default now(),
+  primary key (date, vchtype, customer_id)
+);
+
+create index if not exists idx_agg_invoice_daily_customer on agg_invoice_daily (customer_id);
+
+-- Line-level totals per day and item (brand denormalized from dim_item)
+create table if not exists agg_sales_daily (
+  date          date not null,
+  vchtype       text not null default '',
+  customer_id   text not null default '',
+  sku_name      text not null default '',
+  sku_id        text,
+  brand         text,
+  invoice_count int not null default 0,
+  line_count    int not null default 0,
+  qty           numeric(14,3) not null default 0,
+  line_basic    numeric(14,2) not null default 0,
+  line_tax      numeric(14,2) not null default 0,
+  line_total    numeric(14,2) not null default 0,
+  refreshed_at  timestamptz default now(),
+  primary key (date, vchtype, customer_id, sku_name)
+);
+
+create index if not exists idx_agg_sales_daily_customer on agg_sales_daily (customer_id);
+create index if not exists idx_agg_sales_daily_brand on agg_sales_daily (brand);
+create index if not exists idx_agg_sales_daily_sku on agg_sales_daily (sku_id);
+
+-- Monthly rollups (month = first day of month), derived from the daily tables
+create table if not exists agg_invoice_monthly (
+  month         date not null,
+  vchtype       text not null default '',
+  customer_id   text not null default '',
+  invoice_count int not null default 0,
+  subtotal      numeric(14,2) not null default 0,
+  tax           numeric(14,2) not null default 0,
+  total         numeric(14,2) not null default 0,
+  refreshed_at  timestamptz default now(),
+  primary key (month, vchtype, customer_id)
+);
+
+create table if not exists agg_sales_monthly (
+  month         date not null,
+  vchtype       text not null default '',
+  customer_id   text not null default '',
+  sku_name      text not null default '',
+  sku_id        text,
+  brand         text,
+  invoice_count int not null default 0,
+  line_count    int not null default 0,
+  qty           numeric(14,3) not null default 0,
+  line_basic    numeric(14,2) not null default 0,
+  line_tax      numeric(14,2) not null default 0,
+  line_total    numeric(14,2) not null default 0,
+  refreshed_at  timestamptz default now(),
+  primary key (month, vchtype, customer_id, sku_name)
+);
+
+create index if not exists idx_agg_sales_monthly_customer on agg_sales_monthly (customer_id);
+create index if not exists idx_agg_sales_monthly_brand on agg_sales_monthly (brand);
@@ -0,0 +1,19 @@
+-- Functional lower(name) indexes for the SQL paths that still match
+-- dimensions by case-insensitive name. Fact loaders resolve keys through the
+-- in-process cache in agent/dimensions.py, which reads each table once per run.
+
+create index if not exists idx_dim_item_lower_name on dim_item (lower(name));
+create index if not exists idx_dim_item_lower_brand on dim_item (lower(brand));
+create index if not exists idx_dim_customer_lower_name on dim_customer (lower(name));
+
+-- Created by the stock / ledger master migrations (0004, 0007), which may not
+-- have been applied yet
+do $$
+begin
+  if to_regclass('dim_stock_group') is not null then
+    create index if not exists idx_dim_stock_group_lower_name on dim_stock_group (lower(name));
+  end if;
+  if to_regclass('dim_ledger_group') is not null then
+    create index if not exists idx_dim_ledger_group_lower_name on dim_ledger_group (lower(name));
+  end if;
+end $$;
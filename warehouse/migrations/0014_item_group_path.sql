@@ -0,0 +1,7 @@
+-- Root stock group and ancestry path per item, computed in-process by
+-- agent/stock_masters.py (GroupHierarchy) alongside dim_item.brand.
+alter table dim_item
+  add column if not exists root_group text,      -- top of the stock group chain (NULL if the chain loops)
+  add column if not exists group_path text[];    -- root group .. immediate parent group
+
+create index if not exists idx_dim_item_root_group on dim_item(root_group);
@@ -0,0 +1,5 @@
+-- Content hash per pincode row so load_pincode_data.py only writes rows
+-- whose city/state/lat/lon changed since the last refresh.
+alter table dim_pincode
+  add column if not exists row_hash text,
+  add column if not exists updated_at timestamptz default now();
@@ -0,0 +1,18 @@
+-- Geo enrichment denormalized onto dim_customer, maintained by
+-- agent/customer_geo.py after customer upserts. geo_pincode records the
+-- pincode the geo columns were resolved from, so only customers whose
+-- pincode changed since are re-enriched.
+alter table dim_customer
+  add column if not exists state          text,
+  add column if not exists district       text,
+  add column if not exists lat            numeric,
+  add column if not exists lon            numeric,
+  add column if not exists geo_pincode    text,
+  add column if not exists geo_updated_at timestamptz;
+
+create index if not exists idx_dim_customer_state on dim_customer(state);
+create index if not exists idx_dim_customer_district on dim_customer(district);
+
+-- Customers still to be (re-)enriched
+create index if not exists idx_dim_customer_geo_pending on dim_customer(customer_id)
+  where pincode is distinct from geo_pincode;